@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import logging
 import subprocess
 from pathlib import Path
@@ -23,25 +24,45 @@ def run_tests() -> ToolResult:
     return ToolResult(output=output, ok=proc.returncode == 0)
 
 
-def auto_correct(goal: str, max_iters: int = 3) -> None:
+async def auto_correct(goal: str, max_iters: int = 3, run_id: str | None = None) -> None:
+    """Run, test, and on failure resume the same run with the test output as feedback.
+
+    Retries continue from the checkpoint, so the plan, retrieval and earlier acts are
+    not paid for again. Without checkpointing every attempt starts from scratch.
+    """
     orchestrator = AgentOrchestrator()
+    state = None
     for i in range(max_iters):
         logger.info("iteration %s", i + 1)
-        state = orchestrator.run(goal=goal, max_iters=2)
-        test_result = run_tests()
+        if state is None and run_id is not None:
+            state = await orchestrator.aresume(run_id)
+        elif state is None or not orchestrator.checkpointing:
+            state = await orchestrator.arun(goal=goal, max_iters=2)
+        else:
+            state = await orchestrator.aresume(state.run_id, feedback=feedback(test_result), extra_iters=1)
+        logger.info("run %s after %s iterations", state.run_id, state.iterations)
+        test_result = await asyncio.to_thread(run_tests)
         logger.info("tests ok? %s", test_result.ok)
         if test_result.ok and state.completed:
             logger.info("goal achieved with passing tests")
             break
-        logger.info("retrying with new context")
+        logger.info("retrying with test feedback")
+
+
+def feedback(result: ToolResult, limit: int = 4000) -> str:
+    """The tail of the test output, where pytest puts its failure summary."""
+    if result.ok:
+        return "Tests passed, but the goal is not reached yet:\n" + result.output[-limit:]
+    return "Tests failed:\n" + result.output[-limit:]
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("goal")
     parser.add_argument("--max-iters", type=int, default=3)
+    parser.add_argument("--resume", default=None, metavar="RUN_ID", help="continue a checkpointed run")
     args = parser.parse_args()
-    auto_correct(goal=args.goal, max_iters=args.max_iters)
+    asyncio.run(auto_correct(goal=args.goal, max_iters=args.max_iters, run_id=args.resume))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from uj0e.batch import BatchRunner
+from uj0e.orchestrator import AgentOrchestrator, state_payload
+
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+logger = logging.getLogger(__name__)
+
+
+def read_goals(goals: list[str], path: str | None) -> list[str]:
+    if path:
+        with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+            goals = goals + [line.strip() for line in f]
+    return [goal for goal in goals if goal]
+
+
+async def run_batch(goals: list[str], max_iters: int, parallel: bool | None, concurrency: int | None) -> int:
+    """Run ``goals`` as one batch job, printing one JSON line per goal as it finishes."""
+    runner = BatchRunner(AgentOrchestrator(), concurrency=concurrency)
+    job = runner.submit(goals, max_iters=max_iters, parallel=parallel)
+    async for event in runner.stream(job):
+        line = {"index": event["index"], "goal": event["goal"]}
+        if "error" in event:
+            line["error"] = event["error"]
+        else:
+            line["result"] = state_payload(event["state"])
+        print(json.dumps(line), flush=True)
+    logger.info("batch %s: %s goals, %s failed", job.id, len(goals), job.failed)
+    return 1 if job.failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many agent goals, streaming JSONL results to stdout.")
+    parser.add_argument("goals", nargs="*")
+    parser.add_argument("--file", default=None, help="one goal per line ('-' for stdin)")
+    parser.add_argument("--max-iters", type=int, default=3)
+    parser.add_argument("--parallel", action="store_true", default=None, help="fan out plan steps")
+    parser.add_argument("--concurrency", type=int, default=None, help="goals in flight (BATCH_CONCURRENCY)")
+    args = parser.parse_args()
+    goals = read_goals(args.goals, args.file)
+    if not goals:
+        parser.error("no goals given")
+    sys.exit(asyncio.run(run_batch(goals, args.max_iters, args.parallel, args.concurrency)))
+
+
+if __name__ == "__main__":
+    main()
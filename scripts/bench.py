@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from uj0e.config import settings
+from uj0e.model_client import AsyncModelClient, ModelClient
+from uj0e.stub_model import StubConfig, StubModelServer
+from uj0e.tools import SandboxTool
+
+# The sibling script, importable whether this file runs as a script, with -m or from elsewhere.
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_chunking import run as run_chunking  # noqa: E402
+from bench_chunking import synthetic_markdown  # noqa: E402
+
+logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+logger = logging.getLogger(__name__)
+
+SECTIONS = ("chunking", "model", "ingest", "query", "orchestrator", "sandbox")
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """Latency summary in milliseconds."""
+    ordered = sorted(samples) or [0.0]
+
+    def at(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000
+
+    return {"p50_ms": at(0.5), "p95_ms": at(0.95), "p99_ms": at(0.99), "mean_ms": sum(ordered) / len(ordered) * 1000}
+
+
+def bench_chunking(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    texts = [synthetic_markdown(int(args.chunk_mb * 1e6))]
+    return run_chunking(texts, settings.chunk_tokens, settings.chunk_overlap_tokens)
+
+
+def bench_model(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    """Client-side overhead on top of the stub's fixed cost, uncached, at several concurrencies."""
+    expected = stub.config.latency + stub.config.completion_tokens / max(stub.config.tokens_per_sec, 1e-9)
+
+    async def measure(concurrency: int) -> dict:
+        client = AsyncModelClient(endpoint=stub.url)
+        limit = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+
+        async def call(i: int) -> None:
+            async with limit:
+                start = time.perf_counter()
+                await client.chat([{"role": "user", "content": f"bench {concurrency} {i}"}], use_cache=False)
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(i) for i in range(max(args.runs, concurrency))))
+        elapsed = time.perf_counter() - start
+        await client.aclose()
+        return {"calls_per_sec": len(latencies) / elapsed, **percentiles(latencies)}
+
+    report: dict[str, Any] = {"expected_ms": expected * 1000, "model_concurrency": settings.model_concurrency}
+    for concurrency in args.concurrency:
+        report[f"concurrency_{concurrency}"] = asyncio.run(measure(concurrency))
+    return report
+
+
+def _stub_store(stub: StubModelServer, workdir: Path) -> Any:
+    """A vector store in ``workdir`` that embeds through the stub instead of a local model."""
+    from uj0e.vector import VectorRegistry, VectorStore
+
+    client = ModelClient(endpoint=stub.url)
+
+    class StubRegistry(VectorRegistry):
+        def embedder(self, model_name: str) -> Callable[[list[str]], Any]:
+            return client.embed
+
+    return VectorStore(collection="bench", persist_directory=str(workdir / "vectors"), registry=StubRegistry())
+
+
+def _corpus(workdir: Path, files: int) -> Path:
+    corpus = workdir / "corpus"
+    corpus.mkdir(exist_ok=True)
+    for i in range(files):
+        (corpus / f"doc_{i:05d}.md").write_text(synthetic_markdown(8000, seed=i))
+    return corpus
+
+
+def bench_ingest(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    from uj0e.pipeline import iter_paths
+
+    corpus = _corpus(workdir, args.files)
+    store = _stub_store(stub, workdir)
+    start = time.perf_counter()
+    chunks = store.ingest_files(iter_paths(corpus))
+    elapsed = time.perf_counter() - start
+    start = time.perf_counter()
+    store.ingest_files(iter_paths(corpus))
+    unchanged = time.perf_counter() - start
+    return {
+        "files": args.files,
+        "chunks": chunks,
+        "seconds": elapsed,
+        "files_per_sec": args.files / elapsed,
+        "chunks_per_sec": chunks / elapsed,
+        "unchanged_rescan_seconds": unchanged,
+    }
+
+
+def bench_query(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    from uj0e.pipeline import iter_paths
+
+    store = _stub_store(stub, workdir)
+    if not len(store.lexical):
+        store.ingest_files(iter_paths(_corpus(workdir, args.files)))
+    report: dict[str, Any] = {}
+    for mode in ("lexical", "vector", "hybrid"):
+        latencies = []
+        for i in range(args.queries):
+            # Distinct queries, so every lookup misses the result and embedding caches.
+            text = f"{mode} retry worker cache {i} parser_{i % 13} query error"
+            start = time.perf_counter()
+            store.query(text, k=4, mode=mode)
+            latencies.append(time.perf_counter() - start)
+        cached = []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            store.query(text, k=4, mode=mode)
+            cached.append(time.perf_counter() - start)
+        report[mode] = {**percentiles(latencies), "cached_p50_ms": percentiles(cached)["p50_ms"]}
+    return report
+
+
+@contextmanager
+def overridden(**values: Any) -> Iterator[None]:
+    """Set ``settings`` fields for the duration of a bench and restore them afterwards."""
+    saved = {name: getattr(settings, name) for name in values}
+    for name, value in values.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(settings, name, value)
+
+
+def bench_orchestrator(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    """Whole plan/act/reflect runs per second against the stub, one event loop per level."""
+    from uj0e.orchestrator import AgentOrchestrator
+
+    with overridden(
+        model_endpoint=stub.url,
+        agent_checkpoints=str(workdir / "checkpoints.sqlite") if args.checkpoints else "",
+        # Stub replies never call the sandbox; without a pool no containers are started.
+        sandbox_pool_size=0,
+        audit_log=str(workdir / "audit.log"),
+    ):
+        # The default vector store opens under the working directory before it is replaced.
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            orchestrator = AgentOrchestrator()
+        finally:
+            os.chdir(cwd)
+        try:
+            return _measure_orchestrator(orchestrator, args, stub, workdir)
+        finally:
+            orchestrator.audit.close()
+
+
+def _measure_orchestrator(orchestrator: Any, args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    orchestrator.vector = _stub_store(stub, workdir)
+    before = stub.requests
+
+    async def measure(concurrency: int) -> dict:
+        orchestrator.model = AsyncModelClient(endpoint=stub.url)
+        limit = asyncio.Semaphore(concurrency)
+        latencies: list[float] = []
+
+        async def run(i: int) -> None:
+            async with limit:
+                start = time.perf_counter()
+                await orchestrator.arun(goal=f"bench goal {concurrency}-{i}", max_iters=1)
+                latencies.append(time.perf_counter() - start)
+
+        try:
+            start = time.perf_counter()
+            await asyncio.gather(*(run(i) for i in range(max(args.runs, concurrency))))
+            elapsed = time.perf_counter() - start
+        finally:
+            await orchestrator.model.aclose()
+            # The checkpoint connection belongs to this loop; the next level opens its own.
+            await orchestrator.aclose()
+        return {"runs_per_sec": len(latencies) / elapsed, **percentiles(latencies)}
+
+    report: dict[str, Any] = {"checkpoints": bool(args.checkpoints)}
+    for concurrency in args.concurrency:
+        report[f"concurrency_{concurrency}"] = asyncio.run(measure(concurrency))
+    report["model_requests"] = stub.requests - before
+    return report
+
+
+def bench_sandbox(args: argparse.Namespace, stub: StubModelServer, workdir: Path) -> dict:
+    """Per-command overhead of a trivial command, and of capturing 4 MiB of output.
+
+    With docker, a fresh container per command is compared with the warm pool. Without
+    it the tool runs commands on the host; those numbers are reported as ``host_*`` so
+    they are never compared with container timings.
+    """
+    report: dict[str, Any] = {"docker": bool(SandboxTool(pool_size=0).docker_bin)}
+    if report["docker"]:
+        variants = {"fresh": SandboxTool(pool_size=0), "pooled": SandboxTool()}
+    else:
+        logger.warning("docker not found: timing host execution only, no container comparison")
+        variants = {"host": SandboxTool(pool_size=0)}
+    try:
+        for name, tool in variants.items():
+            for label, command in (("noop", "true"), ("output_4mib", "head -c 4194304 /dev/zero | tr '\\0' x")):
+                latencies = []
+                for _ in range(args.sandbox_runs):
+                    start = time.perf_counter()
+                    result = tool.run(command)
+                    latencies.append(time.perf_counter() - start)
+                    if not result.ok:
+                        raise RuntimeError(f"sandbox command failed: {result.output[:200]}")
+                report[f"{name}_{label}"] = percentiles(latencies)
+    finally:
+        for tool in variants.values():
+            if tool.pool is not None:
+                tool.pool.close()
+    return report
+
+
+BENCHES: dict[str, Callable[[argparse.Namespace, StubModelServer, Path], dict]] = {
+    "chunking": bench_chunking,
+    "model": bench_model,
+    "ingest": bench_ingest,
+    "query": bench_query,
+    "orchestrator": bench_orchestrator,
+    "sandbox": bench_sandbox,
+}
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args: argparse.Namespace) -> dict:
+    config = StubConfig(
+        latency=args.latency, tokens_per_sec=args.tokens_per_sec, completion_tokens=args.completion_tokens
+    )
+    report: dict[str, Any] = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "stub": vars(config),
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="ujoe-bench-") as tmp, StubModelServer(config) as stub:
+        workdir = Path(tmp)
+        with overridden(audit_log=str(workdir / "audit.log"), data_root=str(workdir / "data")):
+            for name in args.only:
+                logger.warning("running %s benchmark", name)
+                try:
+                    report["results"][name] = BENCHES[name](args, stub, workdir)
+                except ImportError as exc:
+                    # Sections needing the vector store or LangGraph are skipped on slim installs.
+                    report["results"][name] = {"skipped": str(exc)}
+                except Exception as exc:  # noqa: BLE001
+                    logger.exception("%s benchmark failed", name)
+                    report["results"][name] = {"error": str(exc)}
+    return report
+
+
+def flatten(value: Any, prefix: str = "") -> dict[str, float]:
+    if isinstance(value, dict):
+        return {k: v for key, item in value.items() for k, v in flatten(item, f"{prefix}{key}.").items()}
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix.rstrip("."): float(value)}
+    return {}
+
+
+def compare(baseline: dict, report: dict, threshold: float) -> list[str]:
+    """Lines for every metric that moved by more than ``threshold`` (a fraction) since ``baseline``."""
+    old, new = flatten(baseline.get("results", {})), flatten(report.get("results", {}))
+    lines = []
+    for key in sorted(old.keys() & new.keys()):
+        if old[key] and abs(new[key] - old[key]) / abs(old[key]) > threshold:
+            lines.append(f"{key}: {old[key]:.4g} -> {new[key]:.4g} ({(new[key] - old[key]) / abs(old[key]):+.1%})")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmarks against a deterministic stub model server.")
+    parser.add_argument("--only", default=",".join(SECTIONS), help=f"comma-separated subset of {','.join(SECTIONS)}")
+    parser.add_argument("--output", default=None, help="write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", default=None, help="baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported by --compare")
+    parser.add_argument("--latency", type=float, default=StubConfig.latency, help="stub seconds per request")
+    parser.add_argument("--tokens-per-sec", type=float, default=StubConfig.tokens_per_sec)
+    parser.add_argument("--completion-tokens", type=int, default=StubConfig.completion_tokens)
+    parser.add_argument("--concurrency", default="1,4,16", help="levels for the model and orchestrator benches")
+    parser.add_argument("--runs", type=int, default=32, help="runs (or calls) per concurrency level")
+    parser.add_argument("--files", type=int, default=200, help="synthetic files to ingest")
+    parser.add_argument("--queries", type=int, default=200, help="queries per retrieval mode")
+    parser.add_argument("--chunk-mb", type=float, default=4.0, help="synthetic text for the chunking bench")
+    parser.add_argument("--sandbox-runs", type=int, default=20)
+    parser.add_argument("--checkpoints", action="store_true", help="checkpoint orchestrator runs to sqlite")
+    args = parser.parse_args()
+    args.only = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(args.only) - set(SECTIONS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    args.concurrency = [int(level) for level in args.concurrency.split(",")]
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(text + "\n")
+    if args.compare:
+        changes = compare(json.loads(Path(args.compare).read_text()), report, args.threshold)
+        print("\n".join(changes) or "no changes above threshold", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import time
+from typing import Callable, Iterable
+
+from uj0e.chunking import chunk_text, token_counter
+from uj0e.config import settings
+from uj0e.extractors import extract_text
+from uj0e.pipeline import iter_paths
+
+_WORDS = "the parser config retry worker token embedding sandbox index query result error cache".split()
+
+
+def synthetic_markdown(size: int, seed: int = 0) -> str:
+    """Markdown with headings, prose and code fences, about ``size`` characters long."""
+    rng = random.Random(seed)
+    parts: list[str] = []
+    total = 0
+    while total < size:
+        section = [f"## Section {len(parts)}"]
+        for _ in range(rng.randint(2, 6)):
+            sentences = [
+                " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 25))).capitalize() + "."
+                for _ in range(rng.randint(1, 8))
+            ]
+            section.append(" ".join(sentences))
+        if rng.random() < 0.4:
+            body = "\n".join(f"    value_{i} = compute({i})" for i in range(rng.randint(3, 30)))
+            section.append(f"```python\ndef block():\n{body}\n```")
+        text = "\n\n".join(section)
+        parts.append(text)
+        total += len(text) + 2
+    return "\n\n".join(parts)
+
+
+def fixed_window(text: str, chunk_size: int = 800, chunk_overlap: int = 80) -> list[str]:
+    """The previous character-window chunker, kept here as the baseline."""
+    chunks: list[str] = []
+    start = 0
+    while start < len(text):
+        chunks.append(text[start : start + chunk_size])
+        start += chunk_size - chunk_overlap
+    return chunks
+
+
+def quality(chunks: list[str], count: Callable[[str], int], budget: int) -> dict:
+    sizes = sorted(count(chunk) for chunk in chunks) or [0]
+    n = max(len(chunks), 1)
+    return {
+        "chunks": len(chunks),
+        "tokens_mean": sum(sizes) / len(sizes),
+        "tokens_p95": sizes[min(len(sizes) - 1, int(len(sizes) * 0.95))],
+        "over_budget": sum(size > budget for size in sizes) / n,
+        # Chunk ends in the middle of a word (next char would continue it).
+        "split_words": sum(bool(re.search(r"\w$", c)) and not c.rstrip().endswith(("`", ")")) for c in chunks) / n,
+        "split_code_blocks": sum(c.count("```") % 2 for c in chunks) / n,
+        "sentence_or_block_end": sum(c.rstrip().endswith((".", "```", "!", "?")) for c in chunks) / n,
+    }
+
+
+def run(texts: Iterable[str], budget: int, overlap: int) -> dict:
+    texts = list(texts)
+    megabytes = sum(len(t.encode()) for t in texts) / 1e6
+    count = token_counter(settings.chunk_tokenizer)
+    report: dict = {"megabytes": megabytes, "tokens_per_chunk": budget}
+    # Roughly four characters per token, so both chunkers aim at the same size.
+    candidates = {
+        "fixed_window": lambda text: fixed_window(text, budget * 4, overlap * 4),
+        "structured": lambda text: list(chunk_text(text, budget, overlap, count=count)),
+    }
+    for name, chunker in candidates.items():
+        start = time.perf_counter()
+        chunks = [chunk for text in texts for chunk in chunker(text)]
+        elapsed = time.perf_counter() - start
+        report[name] = {
+            "seconds": elapsed,
+            "mb_per_sec": megabytes / max(elapsed, 1e-9),
+            **quality(chunks, count, budget),
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Speed and boundary quality of the chunker vs fixed windows.")
+    parser.add_argument("--path", default=None, help="corpus directory (default: synthetic markdown)")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="synthetic document size")
+    parser.add_argument("--tokens", type=int, default=settings.chunk_tokens)
+    parser.add_argument("--overlap", type=int, default=settings.chunk_overlap_tokens)
+    args = parser.parse_args()
+    if args.path:
+        texts = (extract_text(path, path.read_bytes()) for path in iter_paths(args.path))
+    else:
+        texts = [synthetic_markdown(int(args.size_mb * 1e6))]
+    print(json.dumps(run(texts, args.tokens, args.overlap), indent=2))
+
+
+if __name__ == "__main__":
+    main()
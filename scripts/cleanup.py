@@ -3,23 +3,43 @@ from __future__ import annotations
 import argparse
 import logging
 
-from uj0e.vector import VectorStore
+from uj0e.vector import vector_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 def cleanup(collection: str) -> None:
-    store = VectorStore(collection=collection)
+    store = vector_registry.store(collection=collection)
     store.cleanup(collection)
     logger.info("collection %s removed", collection)
 
 
+def gc(collection: str, path: str | None, compact: bool) -> None:
+    store = vector_registry.store(collection=collection)
+    report = store.gc(root=path)
+    if compact:
+        report.bytes_reclaimed = store.compact()
+    logger.info(
+        "gc %s: %s files dropped, %s chunks deleted, %s bytes reclaimed",
+        collection,
+        report.files_removed,
+        report.chunks_deleted,
+        report.bytes_reclaimed,
+    )
+
+
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--collection", default="knowledge")
+    parser.add_argument("--gc", action="store_true", help="delete stale chunks instead of dropping the collection")
+    parser.add_argument("--path", default=None, help="ingest root whose current files define what is live")
+    parser.add_argument("--compact", action="store_true", help="VACUUM the persistent store after gc")
     args = parser.parse_args()
-    cleanup(args.collection)
+    if args.gc or args.compact:
+        gc(args.collection, args.path, args.compact)
+    else:
+        cleanup(args.collection)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from uj0e.ann import NumpyCollection
+from uj0e.config import settings
+from uj0e.pipeline import iter_paths, prepare_file
+from uj0e.vector import vector_registry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def load_corpus(path: str, chunk_size: int, limit: int) -> list[str]:
+    chunks: list[str] = []
+    for file in iter_paths(path):
+        chunks.extend(prepare_file(file, chunk_size=chunk_size).chunks)
+        if len(chunks) >= limit:
+            break
+    return chunks[:limit]
+
+
+def measure(search, queries: np.ndarray, k: int, truth: list[set[str]]) -> dict:
+    latencies: list[float] = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        ids = search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & set(ids))
+    latencies.sort()
+    return {
+        "recall": hits / (k * len(queries)),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def compare(path: str, k: int, queries: int, limit: int, nlist: int | None) -> dict:
+    documents = load_corpus(path, chunk_size=settings.chunk_tokens, limit=limit)
+    if not documents:
+        raise SystemExit(f"no documents under {path}")
+    ids = [f"chunk:{i}" for i in range(len(documents))]
+    embedder = vector_registry.embedder(settings.embedding_model)
+    embeddings = np.asarray(embedder(documents), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    sample = embeddings[rng.choice(len(embeddings), size=min(queries, len(embeddings)), replace=False)]
+    sample = sample + rng.normal(scale=0.01, size=sample.shape).astype(np.float32)
+
+    # The collections hold a full copy of the corpus; removed once measured.
+    with tempfile.TemporaryDirectory(prefix="ujoe-compare-") as workdir:
+        exact = NumpyCollection(workdir, "exact")
+        int8 = NumpyCollection(workdir, "int8", quantize=True)
+        ivf = NumpyCollection(workdir, "ivf")
+        chroma = chromadb.EphemeralClient().get_or_create_collection(
+            "compare", embedding_function=None, metadata={"hnsw:space": "cosine"}
+        )
+        for start in range(0, len(ids), 1000):
+            part = slice(start, start + 1000)
+            for collection in (exact, int8, ivf, chroma):
+                collection.add(ids=ids[part], embeddings=embeddings[part], documents=documents[part])
+        ivf.build_index(nlist=nlist)
+
+        truth = [set(row) for row in exact.query(sample, n_results=k)["ids"]]
+
+        def numpy_search(collection: NumpyCollection):
+            return lambda query, n: collection.query([query], n_results=n)["ids"][0]
+
+        def chroma_search(query, n):
+            return chroma.query(query_embeddings=[query.tolist()], n_results=n)["ids"][0]
+
+        report = {
+            "documents": len(documents),
+            "queries": len(sample),
+            "k": k,
+            "backends": {
+                "chroma": measure(chroma_search, sample, k, truth),
+                "numpy_exact": measure(numpy_search(exact), sample, k, truth),
+                "numpy_int8": measure(numpy_search(int8), sample, k, truth),
+                "numpy_ivf": measure(numpy_search(ivf), sample, k, truth),
+            },
+        }
+        start = time.perf_counter()
+        exact.query(sample, n_results=k)
+        report["numpy_exact_batch_ms_per_query"] = (time.perf_counter() - start) * 1000 / len(sample)
+        return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Recall/latency of the Chroma and numpy vector backends.")
+    parser.add_argument("--path", default="data/docs")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50_000, help="maximum chunks to index")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default sqrt(n))")
+    args = parser.parse_args()
+    print(json.dumps(compare(args.path, args.k, args.queries, args.limit, args.nlist), indent=2))
+
+
+if __name__ == "__main__":
+    main()
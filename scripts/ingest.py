@@ -2,29 +2,102 @@ from __future__ import annotations
 
 import argparse
 import logging
-from pathlib import Path
+import time
 
-from uj0e.vector import VectorStore, iter_paths
+from uj0e.config import settings
+from uj0e.pipeline import IngestProgress, iter_paths
+from uj0e.vector import vector_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def ingest(path: str, collection: str, chunk_size: int, chunk_overlap: int) -> None:
-    store = VectorStore(collection=collection)
+class ProgressReporter:
+    def __init__(self, interval: float = 5.0) -> None:
+        self.interval = interval
+        self._last = time.perf_counter()
+        self.stats: IngestProgress | None = None
+
+    def __call__(self, stats: IngestProgress) -> None:
+        self.stats = stats
+        now = time.perf_counter()
+        if now - self._last < self.interval:
+            return
+        self._last = now
+        logger.info(
+            "progress: %s files (%s skipped), %s chunks, %.1f files/s, %.1f chunks/s",
+            stats.files,
+            stats.skipped,
+            stats.chunks,
+            stats.files_per_sec,
+            stats.chunks_per_sec,
+        )
+
+
+def ingest(
+    path: str,
+    collection: str,
+    chunk_size: int | None,
+    chunk_overlap: int | None,
+    workers: int | None = None,
+    batch_size: int | None = None,
+    build_index: bool = False,
+    rebuild_lexical: bool = False,
+) -> None:
+    store = vector_registry.store(collection=collection)
     files = iter_paths(path)
-    added = store.ingest_files(files, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-    logger.info("added %s chunks", added)
+    reporter = ProgressReporter()
+    added = store.ingest_files(
+        files,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        workers=workers,
+        batch_size=batch_size,
+        progress=reporter,
+    )
+    stats = reporter.stats
+    if stats is not None:
+        logger.info(
+            "added %s chunks from %s files (%s skipped, %s failed) in %.1fs: %.1f files/s, %.1f chunks/s",
+            added,
+            stats.files,
+            stats.skipped,
+            stats.failed,
+            stats.elapsed,
+            stats.files_per_sec,
+            stats.chunks_per_sec,
+        )
+    else:
+        logger.info("added %s chunks", added)
+    if build_index:
+        logger.info("built index with %s lists", store.build_index())
+    if rebuild_lexical:
+        logger.info("rebuilt lexical index over %s chunks", store.rebuild_lexical())
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--path", default="data/docs")
     parser.add_argument("--collection", default="knowledge")
-    parser.add_argument("--chunk-size", type=int, default=800)
-    parser.add_argument("--chunk-overlap", type=int, default=80)
+    parser.add_argument("--chunk-size", type=int, default=settings.chunk_tokens, help="tokens per chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=settings.chunk_overlap_tokens, help="tokens")
+    parser.add_argument("--workers", type=int, default=settings.ingest_workers)
+    parser.add_argument("--batch-size", type=int, default=settings.ingest_batch_size)
+    parser.add_argument("--build-index", action="store_true", help="train an IVF index (numpy backend)")
+    parser.add_argument(
+        "--rebuild-lexical", action="store_true", help="rebuild the BM25 index from everything in the collection"
+    )
     args = parser.parse_args()
-    ingest(args.path, args.collection, args.chunk_size, args.chunk_overlap)
+    ingest(
+        args.path,
+        args.collection,
+        args.chunk_size,
+        args.chunk_overlap,
+        args.workers,
+        args.batch_size,
+        args.build_index,
+        args.rebuild_lexical,
+    )
 
 
 if __name__ == "__main__":
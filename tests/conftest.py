@@ -0,0 +1,43 @@
+from pathlib import Path
+
+import pytest
+
+from uj0e.config import settings
+
+
+@pytest.fixture
+def stub_model():
+    pytest.importorskip("httpx")
+    from uj0e.stub_model import StubConfig, StubModelServer
+
+    with StubModelServer(StubConfig(latency=0, tokens_per_sec=0, embed_latency=0)) as server:
+        yield server
+
+
+@pytest.fixture
+def agent(stub_model, tmp_path: Path, monkeypatch):
+    """An orchestrator wired to ``stub_model``, with all state under ``tmp_path``.
+
+    Retrieval is lexical (no embedding model), the sandbox has no warm pool and
+    responses are not cached, so every run really reaches the stub.
+    """
+    pytest.importorskip("langgraph")
+    pytest.importorskip("chromadb")
+    from uj0e.cache import ResponseCache
+    from uj0e.orchestrator import AgentOrchestrator
+
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "model_endpoint": stub_model.url,
+        "retrieval_mode": "lexical",
+        "vector_backend": "numpy",
+        "chroma_mode": "embedded",
+        "sandbox_pool_size": 0,
+        "audit_log": str(tmp_path / "audit.log"),
+        "agent_checkpoints": str(tmp_path / "checkpoints.sqlite"),
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    orchestrator = AgentOrchestrator()
+    orchestrator.model.cache = ResponseCache(max_entries=0)
+    yield orchestrator
+    orchestrator.audit.close()
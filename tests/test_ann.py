@@ -0,0 +1,76 @@
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from uj0e.ann import NumpyCollection  # noqa: E402
+
+
+def _collection(tmp_path: Path, **kwargs) -> tuple[NumpyCollection, "np.ndarray"]:
+    vectors = np.random.default_rng(0).normal(size=(500, 16)).astype(np.float32)
+    collection = NumpyCollection(tmp_path, "knowledge", **kwargs)
+    collection.add(
+        ids=[f"doc:{i}" for i in range(500)],
+        embeddings=vectors,
+        documents=[f"text {i}" for i in range(500)],
+        metadatas=[{"fingerprint": "even" if i % 2 == 0 else "odd"} for i in range(500)],
+    )
+    return collection, vectors
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_query_finds_nearest_and_filters(tmp_path: Path, quantize: bool):
+    collection, vectors = _collection(tmp_path, quantize=quantize)
+    result = collection.query(vectors[:2], n_results=3)
+    assert [row[0] for row in result["ids"]] == ["doc:0", "doc:1"]
+    assert result["documents"][0][0] == "text 0"
+    filtered = collection.query(vectors[:1], n_results=3, where={"fingerprint": "odd"})
+    assert all(meta["fingerprint"] == "odd" for meta in filtered["metadatas"][0])
+
+
+def test_delete_compact_and_reopen(tmp_path: Path):
+    collection, vectors = _collection(tmp_path)
+    collection.delete(ids=["doc:0"])
+    assert "doc:0" not in collection.query(vectors[:1], n_results=5)["ids"][0]
+    collection.compact()
+    reopened = NumpyCollection(tmp_path, "knowledge")
+    assert reopened.count() == 499
+    assert reopened.query(vectors[1:2], n_results=1)["ids"] == [["doc:1"]]
+    collection.add(ids=["late:0"], embeddings=vectors[:1])
+    assert reopened.query(vectors[:1], n_results=1)["ids"] == [["late:0"]]
+
+
+def test_ivf_index_keeps_recall(tmp_path: Path):
+    collection, vectors = _collection(tmp_path, nprobe=4)
+    exact = collection.query(vectors[:20], n_results=5)["ids"]
+    assert collection.build_index(nlist=8) == 8
+    approx = collection.query(vectors[:20], n_results=5)["ids"]
+    assert all(a[0] == e[0] for a, e in zip(approx, exact))
+
+
+def _add_rows(directory: str, writer: int, vectors: "np.ndarray", go) -> None:
+    collection = NumpyCollection(directory, "knowledge")
+    go.wait()
+    for i, vector in enumerate(vectors):
+        collection.add(ids=[f"w{writer}:{i}"], embeddings=vector[None])
+
+
+def test_concurrent_writers_in_two_processes_keep_ids_on_their_vectors(tmp_path: Path):
+    import multiprocessing
+
+    vectors = np.random.default_rng(1).normal(size=(2, 400, 16)).astype(np.float32)
+    context = multiprocessing.get_context("fork")
+    go = context.Event()
+    writers = [context.Process(target=_add_rows, args=(str(tmp_path), w, vectors[w], go)) for w in range(2)]
+    for writer in writers:
+        writer.start()
+    go.set()
+    for writer in writers:
+        writer.join()
+        assert writer.exitcode == 0
+    collection = NumpyCollection(tmp_path, "knowledge")
+    assert collection.count() == 800
+    for w in range(2):
+        result = collection.query(vectors[w], n_results=1)
+        assert [row[0] for row in result["ids"]] == [f"w{w}:{i}" for i in range(400)]
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("langgraph")
+
+from uj0e.config import settings  # noqa: E402
+
+
+def test_api_ingest_uses_the_capped_worker_count(agent, tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from uj0e import main
+    from uj0e.vector import VectorStore
+
+    calls: list[dict] = []
+    monkeypatch.setattr(VectorStore, "ingest_files", lambda self, paths, **kwargs: calls.append(kwargs) or 0)
+    monkeypatch.setattr(settings, "ingest_api_workers", 1)
+    monkeypatch.setattr(settings, "embedding_warmup", False)
+    with TestClient(main.app) as client:
+        response = client.post("/ingest", json={"path": str(tmp_path)})
+    assert response.json() == {"added_chunks": 0}
+    assert calls == [{"workers": 1}]
+
+
+def test_lifespan_closes_shared_clients_on_shutdown(agent, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from uj0e import main, model_client
+
+    monkeypatch.setattr(main, "orchestrator", agent)
+    monkeypatch.setattr(settings, "embedding_warmup", False)
+    with TestClient(main.app) as client:
+        assert client.post("/agent/run", json={"goal": "summarise the notes", "max_iters": 1}).json()["completed"]
+        assert any(resources.saver is not None for resources in agent._loops.values())
+        blocking = model_client.shared_client()
+    assert all(resources.saver is None for resources in agent._loops.values())
+    assert blocking.is_closed and model_client.shared_client() is not blocking
+
+
+def test_lifespan_logs_a_failed_warmup_and_waits_for_it(agent, monkeypatch, caplog):
+    import threading
+
+    from fastapi.testclient import TestClient
+
+    from uj0e import main
+
+    finished = threading.Event()
+
+    def warm():
+        finished.set()
+        raise OSError("model not found")
+
+    monkeypatch.setattr(main, "orchestrator", agent)
+    monkeypatch.setattr(settings, "embedding_warmup", True)
+    monkeypatch.setattr(main.vector_registry, "warm", warm)
+    with TestClient(main.app):
+        pass
+    assert finished.is_set()
+    assert any(record.message == "embedding warmup failed" for record in caplog.records)
@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from uj0e.batch import BatchRunner  # noqa: E402
+from uj0e.config import settings  # noqa: E402
+
+
+@pytest.mark.asyncio
+async def test_batch_streams_every_goal_and_counts_failures_once(agent, stub_model, monkeypatch):
+    # Reflections never report success, so every goal ends incomplete.
+    stub_model.reply = lambda prompt, tokens, seed: "retrieve: notes" if "Use the tools" in prompt else "not yet"
+    failures: list[int] = []
+    runner = BatchRunner(agent, concurrency=2, on_failure=lambda: failures.append(1))
+    prefetched: list[list[str]] = []
+    query_many = agent.vector.query_many
+
+    def recording_query_many(goals, **kwargs):
+        prefetched.append(goals)
+        return query_many(goals, **kwargs)
+
+    monkeypatch.setattr(agent.vector, "query_many", recording_query_many)
+
+    job = runner.submit(["a", "b", "a"], max_iters=1)
+    events = [event async for event in runner.stream(job)]
+    assert job.status == "done" and job.failed == 0
+    assert sorted(event["index"] for event in events) == [0, 1, 2]
+    assert all(not event["state"].completed for event in events)
+    # One prefetch for the distinct goals, before any run.
+    assert prefetched[0] == ["a", "b"]
+    assert len(failures) == 3
+    # Replaying the stream (as polling does) does not count again.
+    assert len([event async for event in runner.stream(job)]) == 3
+    assert len(failures) == 3
+
+
+@pytest.mark.asyncio
+async def test_batch_records_errors_and_evicts_old_jobs(agent, monkeypatch):
+    async def boom(goal, **kwargs):
+        raise RuntimeError(f"cannot {goal}")
+
+    monkeypatch.setattr(agent, "arun", boom)
+    monkeypatch.setattr(settings, "batch_max_jobs", 2)
+    failures: list[int] = []
+    runner = BatchRunner(agent, on_failure=lambda: failures.append(1))
+    jobs = [runner.submit([f"goal {i}"]) for i in range(3)]
+    await asyncio.gather(*(job._task for job in jobs))
+    assert [event["error"] for event in jobs[0].results] == ["cannot goal 0"]
+    assert jobs[0].failed == 1 and len(failures) == 3
+
+    runner.submit(["goal 3"])
+    assert jobs[0].id not in runner.jobs and jobs[1].id not in runner.jobs
+    assert jobs[2].id in runner.jobs
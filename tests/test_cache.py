@@ -0,0 +1,81 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from uj0e.cache import LRUCache, ResponseCache
+
+
+def _payload(content: str) -> dict:
+    return {"model": "local-model", "messages": [{"role": "user", "content": content}], "max_tokens": 8}
+
+
+def test_key_ignores_stream_flag():
+    key = ResponseCache.key("http://m/v1/", {**_payload("a"), "stream": True})
+    assert key == ResponseCache.key("http://m/v1", {**_payload("a"), "stream": False})
+    assert key != ResponseCache.key("http://m/v1", _payload("b"))
+
+
+def test_lru_evicts_oldest():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats.evictions == 1
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path: Path):
+    path = str(tmp_path / "cache.sqlite")
+    ResponseCache(max_entries=0, path=path).put("k", "v")
+    assert ResponseCache(max_entries=0, path=path).get("k") == "v"
+    assert ResponseCache(max_entries=0, path=path, ttl=-1).get("k") is None
+
+
+def test_concurrent_identical_requests_are_coalesced():
+    cache = ResponseCache()
+    calls = 0
+
+    async def fetch() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main() -> list[str]:
+        return await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert calls == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.coalesced == 4
+
+
+def test_lru_cache_tracks_hit_rate():
+    cache: LRUCache[tuple, list[str]] = LRUCache(max_entries=1)
+    assert cache.get(("q", 2)) is None
+    cache.put(("q", 2), ["doc"])
+    assert cache.get(("q", 2)) == ["doc"]
+    cache.put(("other", 2), ["doc"])
+    assert cache.get(("q", 2)) is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 2, 1)
+    assert cache.hit_rate == 1 / 3
+
+
+def test_get_counts_misses_and_coalescing_stays_on_one_loop():
+    cache = ResponseCache()
+    assert cache.get("k") is None
+    assert (cache.stats.hits, cache.stats.misses) == (0, 1)
+
+    async def fetch() -> str:
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    def fetch_on_new_loop() -> str:
+        return asyncio.run(cache.get_or_fetch("k", fetch))
+
+    # Two threads, each with its own loop: neither may await the other's future.
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        assert list(pool.map(lambda _: fetch_on_new_loop(), range(2))) == ["answer", "answer"]
+    assert cache.stats.coalesced == 0
@@ -0,0 +1,82 @@
+import sys
+import types
+
+from uj0e.chunking import approximate_tokens, available_tokenizer, chunk_text, token_counter
+
+DOC = """# Install
+
+Run the installer. It asks two questions. Answer both.
+
+```python
+def main():
+    return 1
+```
+
+## Usage
+
+Call `main` from a script.
+"""
+
+
+def test_chunks_follow_structure_and_budget():
+    chunks = list(chunk_text(DOC, max_tokens=30, overlap_tokens=0))
+    assert chunks[0].startswith("# Install")
+    assert any(chunk.startswith("## Usage") for chunk in chunks)
+    assert all(chunk.count("```") in (0, 2) for chunk in chunks)
+    assert all(approximate_tokens(chunk) <= 30 for chunk in chunks)
+
+
+def test_long_paragraphs_split_on_sentences_with_overlap():
+    text = " ".join(f"Sentence number {i} ends here." for i in range(40))
+    chunks = chunk_text(text, max_tokens=40, overlap_tokens=10)
+    assert isinstance(chunks, types.GeneratorType)
+    chunks = list(chunks)
+    assert len(chunks) > 1
+    assert all(chunk.endswith(".") for chunk in chunks)
+    assert chunks[1].startswith(chunks[0].rsplit(". ", 1)[-1])
+
+
+def test_unbroken_text_is_still_bounded():
+    text = "x" * 5000
+    chunks = list(chunk_text(text, max_tokens=50, overlap_tokens=0))
+    assert "".join(chunks) == text
+    assert all(approximate_tokens(chunk) <= 50 for chunk in chunks)
+
+
+def _fake_transformers(monkeypatch, online: bool) -> list[dict]:
+    calls: list[dict] = []
+
+    def from_pretrained(name, **kwargs):
+        calls.append(kwargs)
+        if not online and not kwargs.get("local_files_only"):
+            raise OSError("no network")
+        return types.SimpleNamespace(encode=lambda text, add_special_tokens: text.split())
+
+    module = types.SimpleNamespace(AutoTokenizer=types.SimpleNamespace(from_pretrained=from_pretrained))
+    monkeypatch.setitem(sys.modules, "transformers", module)
+    token_counter.cache_clear()
+    return calls
+
+
+def test_unavailable_tokenizer_is_tried_once_and_workers_approximate(monkeypatch, tmp_path):
+    from uj0e.pipeline import prepare_file
+
+    calls = _fake_transformers(monkeypatch, online=False)
+    assert available_tokenizer("some/model") == "" and available_tokenizer("some/model") == ""
+    path = tmp_path / "note.txt"
+    path.write_text("one two three. four five.")
+    assert prepare_file(path, chunk_size=100, tokenizer="").chunks == ["one two three. four five."]
+    assert len(calls) == 1
+    token_counter.cache_clear()
+
+
+def test_resolved_tokenizer_is_loaded_from_the_local_cache(monkeypatch, tmp_path):
+    from uj0e.pipeline import prepare_file
+
+    calls = _fake_transformers(monkeypatch, online=True)
+    assert available_tokenizer("some/model") == "some/model"
+    path = tmp_path / "note.txt"
+    path.write_text("one two three")
+    prepare_file(path, chunk_size=100, tokenizer="some/model")
+    assert calls == [{"local_files_only": False}, {"local_files_only": True}]
+    token_counter.cache_clear()
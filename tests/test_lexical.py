@@ -0,0 +1,59 @@
+from pathlib import Path
+
+from uj0e.lexical import LexicalIndex, tokenize
+
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    tokens = list(tokenize("Raised E1234 in config_loader.py"))
+    assert "e1234" in tokens
+    assert "config_loader.py" in tokens
+    assert {"config", "loader", "py"} <= set(tokens)
+
+
+def test_search_ranks_rare_exact_terms_first(tmp_path: Path):
+    index = LexicalIndex(tmp_path / "knowledge.sqlite")
+    index.add(["a:0", "b:0"], ["the parser failed to start", "the parser raised ERR_4021 on start"])
+    index.add(["c:0"], ["unrelated text about networking"])
+    assert [chunk_id for chunk_id, _ in index.search("ERR_4021", k=3)] == ["b:0"]
+    assert {chunk_id for chunk_id, _ in index.search("parser start", k=3)} == {"a:0", "b:0"}
+    assert index.search("nothing matches", k=3) == []
+
+
+def test_delete_and_optimize_drop_postings(tmp_path: Path):
+    path = tmp_path / "knowledge.sqlite"
+    index = LexicalIndex(path)
+    index.add(["a:0", "b:0"], ["alpha beta", "beta gamma"])
+    index.add(["a:0"], ["ignored duplicate"])
+    index.delete(["a:0"])
+    assert [chunk_id for chunk_id, _ in index.search("alpha beta", k=5)] == ["b:0"]
+    index.optimize()
+
+    reopened = LexicalIndex(path)
+    assert len(reopened) == 1
+    assert [chunk_id for chunk_id, _ in reopened.search("beta", k=5)] == ["b:0"]
+    assert reopened.search("ignored", k=5) == []
+
+
+def test_other_processes_writes_are_picked_up(tmp_path: Path):
+    path = tmp_path / "knowledge.sqlite"
+    writer, reader = LexicalIndex(path), LexicalIndex(path)
+    writer.add(["a:0"], ["alpha beta"])
+    assert [chunk_id for chunk_id, _ in reader.search("alpha", k=5)] == ["a:0"]
+    writer.add(["b:0"], ["alpha gamma"])
+    assert len(reader) == 2
+    writer.delete(["a:0"])
+    assert [chunk_id for chunk_id, _ in reader.search("alpha", k=5)] == ["b:0"]
+    assert len(reader) == 1
+    reader.clear()
+    assert writer.search("alpha", k=5) == [] and len(writer) == 0
+
+
+def test_common_terms_are_skipped_in_large_indexes(tmp_path: Path):
+    index = LexicalIndex(tmp_path / "knowledge.sqlite", max_df=0.5)
+    ids = [f"doc:{i}" for i in range(1200)]
+    index.add(ids, [f"common filler {i}" + (" needle" if i == 7 else "") for i in range(1200)])
+    assert [chunk_id for chunk_id, _ in index.search("common needle", k=5)] == ["doc:7"]
+    # A query of common terms only still ranks by its rarest term.
+    assert len(index.search("common filler", k=5)) == 5
+    index.max_df = 0
+    assert len(index.search("common needle", k=5)) == 5
@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+
+from uj0e.manifest import IngestManifest, ManifestEntry, orphaned_chunk_ids
+from uj0e.pipeline import IngestProgress, changed_paths, manifest_key, prepare_file
+
+
+def _entry_for(path: Path) -> ManifestEntry:
+    prepared = prepare_file(path)
+    return ManifestEntry(
+        path=prepared.key,
+        size=prepared.size,
+        mtime_ns=prepared.mtime_ns,
+        inode=prepared.inode,
+        sha256=prepared.fingerprint,
+        chunk_ids=[f"{prepared.fingerprint}:{i}" for i in range(len(prepared.chunks))],
+    )
+
+
+def test_manifest_round_trip(tmp_path: Path):
+    doc = tmp_path / "doc.md"
+    doc.write_text("hello")
+    manifest = IngestManifest(tmp_path / "m" / "knowledge.sqlite")
+    manifest.record_many([_entry_for(doc)])
+
+    reopened = IngestManifest(tmp_path / "m" / "knowledge.sqlite")
+    entry = reopened.get(manifest_key(doc))
+    assert entry is not None and entry.matches(os.stat(doc))
+    assert entry.chunk_ids == [f"{entry.sha256}:0"]
+    reopened.remove([entry.path])
+    assert reopened.get(entry.path) is None
+
+
+def test_changed_paths_skips_unchanged_files_by_stat(tmp_path: Path):
+    same, edited = tmp_path / "same.md", tmp_path / "edited.md"
+    same.write_text("unchanged")
+    edited.write_text("before")
+    manifest = IngestManifest(tmp_path / "knowledge.sqlite")
+    manifest.record_many([_entry_for(same), _entry_for(edited)])
+
+    edited.write_text("after, and longer")
+    new = tmp_path / "new.md"
+    new.write_text("new")
+    progress = IngestProgress()
+    remaining = list(changed_paths([same, edited, new, tmp_path / "gone.md"], manifest.snapshot(), progress))
+    assert remaining == [edited, new]
+    assert progress.skipped == 1
+    assert progress.failed == 1
+
+
+def test_stale_entries_and_orphaned_chunks(tmp_path: Path):
+    kept, moved, edited = (tmp_path / name for name in ("kept.md", "moved.md", "edited.md"))
+    for path in (kept, moved, edited):
+        path.write_text(path.name)
+    manifest = IngestManifest(tmp_path / "knowledge.sqlite")
+    entries = {path.name: _entry_for(path) for path in (kept, moved, edited)}
+    old_edited_sha = entries["edited.md"].sha256
+    manifest.record_many(entries.values())
+
+    moved.unlink()
+    edited.write_text("new content")
+    manifest.record_many([_entry_for(edited)])
+    stale = manifest.stale()
+    assert [entry.path for entry in stale] == [manifest_key(moved)]
+    manifest.remove(entry.path for entry in stale)
+    assert manifest.referenced([entries["kept.md"].sha256, old_edited_sha]) == {entries["kept.md"].sha256}
+
+    legacy = tmp_path / "legacy.md"
+    legacy.write_text("ingested before the manifest existed")
+    chunks = [
+        (f"{entries['kept.md'].sha256}:0", {"source": str(kept)}),
+        (f"{old_edited_sha}:0", {"source": str(edited)}),
+        (f"{entries['moved.md'].sha256}:0", {"source": str(moved)}),
+        ("legacysha:0", {"source": str(legacy)}),
+    ]
+    orphans = orphaned_chunk_ids(chunks, manifest.entries())
+    assert orphans == [f"{old_edited_sha}:0", f"{entries['moved.md'].sha256}:0"]
+
+
+def test_generation_is_shared_between_handles(tmp_path: Path):
+    writer = IngestManifest(tmp_path / "knowledge.sqlite")
+    reader = IngestManifest(tmp_path / "knowledge.sqlite")
+    assert reader.generation() == 0
+    assert writer.bump_generation() == 1
+    assert reader.generation() == 1
@@ -0,0 +1,41 @@
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from uj0e.cache import ResponseCache  # noqa: E402
+from uj0e.model_client import AsyncModelClient  # noqa: E402
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/chat/completions"):
+        return httpx.Response(200, json={"choices": [{"message": {"content": "pong"}}]})
+    return httpx.Response(200, json={"data": [{"embedding": [0.1, 0.2]}]})
+
+
+@pytest.mark.asyncio
+async def test_async_chat_and_embed():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(_handler))
+    model = AsyncModelClient(endpoint="http://model/v1", client=client, cache=ResponseCache(max_entries=0))
+    assert await model.chat([{"role": "user", "content": "ping"}]) == "pong"
+    assert await model.embed(["x"]) == [[0.1, 0.2]]
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_parses_sse_deltas():
+    body = (
+        'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+        'data: {"choices": [{"delta": {"content": "po"}}]}\n\n'
+        ": keep-alive\n\n"
+        'data: {"choices": [{"delta": {"content": "ng"}}]}\n\n'
+        "data: [DONE]\n\n"
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    model = AsyncModelClient(endpoint="http://model/v1", client=client, cache=ResponseCache(max_entries=0))
+    tokens = [token async for token in model.stream_chat([{"role": "user", "content": "ping"}])]
+    assert tokens == ["po", "ng"]
+    await model.aclose()
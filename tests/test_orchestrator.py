@@ -0,0 +1,194 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+pytest.importorskip("langgraph")
+
+from uj0e.config import settings  # noqa: E402
+from uj0e.orchestrator import ACT_INSTRUCTION, PLAN_INSTRUCTION, REFLECT_INSTRUCTION  # noqa: E402
+from uj0e.stub_model import agent_reply  # noqa: E402
+
+
+def _recording(stub_model, fail_reflect: bool = False) -> list[str]:
+    prompts: list[str] = []
+
+    def reply(prompt: str, tokens: int, seed: int) -> str:
+        prompts.append(prompt)
+        if fail_reflect and REFLECT_INSTRUCTION in prompt:
+            raise RuntimeError("model crashed")
+        return agent_reply(prompt, tokens, seed)
+
+    stub_model.reply = reply
+    return prompts
+
+
+@pytest.mark.asyncio
+async def test_resume_continues_an_interrupted_run(agent, stub_model, monkeypatch):
+    monkeypatch.setattr(settings, "model_retries", 1)
+    prompts = _recording(stub_model, fail_reflect=True)
+    with pytest.raises(Exception):
+        await agent.arun("summarise the notes", max_iters=2, run_id="run-1")
+    assert sum(PLAN_INSTRUCTION in prompt for prompt in prompts) == 1
+
+    prompts = _recording(stub_model)
+    state = await agent.aresume("run-1")
+    assert state.completed and state.iterations == 1
+    # Plan and act were checkpointed: only the reflect node runs again.
+    assert len(prompts) == 1 and REFLECT_INSTRUCTION in prompts[0]
+    await agent.aclose()
+
+
+@pytest.mark.asyncio
+async def test_resume_finished_run_with_feedback(agent, stub_model):
+    first = await agent.arun("summarise the notes", max_iters=3, run_id="run-2")
+    assert first.completed and first.iterations == 1
+
+    prompts = _recording(stub_model)
+    state = await agent.aresume("run-2", feedback="Tests failed:\nE assert 1 == 2", extra_iters=1)
+    assert state.completed and state.iterations == 2
+    assert state.history[: len(first.history)] == first.history
+    assert not any(PLAN_INSTRUCTION in prompt for prompt in prompts)
+    assert "E assert 1 == 2" in prompts[0]
+    await agent.aclose()
+
+
+@pytest.mark.asyncio
+async def test_resume_unknown_run_raises_key_error(agent):
+    with pytest.raises(KeyError):
+        await agent.aresume("no-such-run")
+    await agent.aclose()
+
+
+def test_resume_unknown_run_is_404(agent, monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    from uj0e import main
+
+    monkeypatch.setattr(main, "orchestrator", agent)
+    with TestClient(main.app) as client:
+        response = client.post("/agent/run/no-such-run/resume", json={})
+    assert response.status_code == 404
+
+
+def _count_connections(monkeypatch) -> list:
+    import aiosqlite
+
+    connections = []
+    connect = aiosqlite.connect
+
+    def counting_connect(*args, **kwargs):
+        connection = connect(*args, **kwargs)
+        connections.append(connection)
+        return connection
+
+    monkeypatch.setattr(aiosqlite, "connect", counting_connect)
+    return connections
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_runs_share_one_saver_and_idle_runs_expire(agent, monkeypatch):
+    connections = _count_connections(monkeypatch)
+    await asyncio.gather(*(agent.arun(f"goal {i}", max_iters=1, run_id=f"run-{i}") for i in range(3)))
+    assert len(connections) == 1
+    assert await agent._sweep(before=0) == 0
+    assert await agent._sweep(before=float("inf")) == 3
+    with pytest.raises(KeyError):
+        await agent.aresume("run-0")
+    await agent.aclose()
+    with sqlite3.connect(settings.agent_checkpoints) as db:
+        assert db.execute("SELECT COUNT(*) FROM checkpoints").fetchone() == (0,)
+
+
+def test_blocking_runs_close_their_own_saver(agent, monkeypatch):
+    connections = _count_connections(monkeypatch)
+    agent.run("goal", max_iters=1)
+    agent.run("goal", max_iters=1)
+    assert len(connections) == 2
+    assert all(connection._connection is None for connection in connections)
+
+
+def test_aclose_closes_savers_left_by_finished_loops(agent, monkeypatch):
+    connections = _count_connections(monkeypatch)
+    asyncio.run(agent.arun("goal", max_iters=1))
+    assert connections[0]._connection is not None
+    asyncio.run(agent.aclose())
+    assert connections[0]._connection is None and not agent._loops
+
+
+def test_blocking_runs_from_several_threads_share_nothing_loop_bound(agent, monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setattr(settings, "agent_max_concurrency", 1)
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        states = list(pool.map(lambda i: agent.run(f"goal {i}", max_iters=1), range(8)))
+    assert all(state.iterations == 1 for state in states)
+
+
+@pytest.mark.asyncio
+async def test_parallel_run_fans_out_every_plan_step(agent):
+    events = [event async for event in agent.astream("summarise the notes", max_iters=3, parallel=True)]
+    state = events[-1]["state"]
+    tools = [event for event in events if event["type"] == "tool"]
+    assert len(state.plan) == 3
+    assert sorted(event["step"] for event in tools) == [1, 2, 3]
+    assert state.iterations == 1 and state.completed
+    assert state.last_result.metadata == {"steps": 3}
+    assert all(f"Step {i} (" in state.last_result.output for i in (1, 2, 3))
+    await agent.aclose()
+
+
+@pytest.mark.asyncio
+async def test_reflect_loops_back_to_act_until_max_iters(agent, stub_model):
+    prompts: list[str] = []
+
+    def reply(prompt: str, tokens: int, seed: int) -> str:
+        prompts.append(prompt)
+        return "not yet" if REFLECT_INSTRUCTION in prompt else agent_reply(prompt, tokens, seed)
+
+    stub_model.reply = reply
+    state = await agent.arun("summarise the notes", max_iters=3)
+    assert state.iterations == 3 and not state.completed
+    assert sum(ACT_INSTRUCTION in prompt for prompt in prompts) == 3
+    assert sum(REFLECT_INSTRUCTION in prompt for prompt in prompts) == 3
+    await agent.aclose()
+
+
+def test_resume_maps_only_disabled_checkpoints_to_409(agent, monkeypatch):
+    pytest.importorskip("fastapi")
+    from fastapi.testclient import TestClient
+
+    from uj0e import main
+    from uj0e.routing import NoEndpointAvailable
+
+    monkeypatch.setattr(main, "orchestrator", agent)
+    with TestClient(main.app) as client:
+        monkeypatch.setattr(settings, "agent_checkpoints", "")
+        assert client.post("/agent/run/run-1/resume", json={}).status_code == 409
+
+        async def outage(run_id, **kwargs):
+            raise NoEndpointAvailable("every circuit is open")
+
+        monkeypatch.setattr(agent, "aresume", outage)
+        failures = main.FAILURES._value.get()
+        assert client.post("/agent/run/run-1/resume", json={}).status_code == 500
+        assert main.FAILURES._value.get() == failures + 1
+
+
+@pytest.mark.asyncio
+async def test_autocorrect_retry_reaches_the_model(agent, stub_model, monkeypatch):
+    from scripts import autocorrect_loop
+    from uj0e.cache import ResponseCache
+    from uj0e.tools import ToolResult
+
+    # Responses are cached as in production; only checkpointing is off, so retries rerun the goal.
+    cache = ResponseCache()
+    monkeypatch.setattr(autocorrect_loop, "AgentOrchestrator", lambda: agent)
+    monkeypatch.setattr(agent.model, "cache", cache)
+    monkeypatch.setattr(settings, "agent_checkpoints", "")
+    monkeypatch.setattr(autocorrect_loop, "run_tests", lambda: ToolResult(output="1 failed", ok=False))
+    prompts = _recording(stub_model)
+    await autocorrect_loop.auto_correct("summarise the notes", max_iters=2)
+    assert sum(ACT_INSTRUCTION in prompt for prompt in prompts) == 2
+    assert cache.stats.hits == 0
@@ -0,0 +1,131 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from uj0e import pipeline
+from uj0e.pipeline import IngestProgress, iter_paths, prepare_file, prepare_files
+from uj0e.tools import Fingerprinter
+
+
+def _make_tree(root: Path) -> list[Path]:
+    (root / "nested").mkdir()
+    paths = [root / "a.md", root / "nested" / "b.txt"]
+    for i, path in enumerate(paths):
+        path.write_text(f"document {i} " * 50)
+    (root / "skip.bin").write_bytes(b"\x00\x01")
+    return paths
+
+
+def test_iter_paths_is_lazy_and_filters(tmp_path: Path):
+    expected = _make_tree(tmp_path)
+    walk = iter_paths(tmp_path)
+    assert iter(walk) is walk
+    assert sorted(walk) == sorted(expected)
+
+
+def test_prepare_file_hashes_in_the_read_pass(tmp_path: Path):
+    path = _make_tree(tmp_path)[0]
+    prepared = prepare_file(path, chunk_size=100, chunk_overlap=10)
+    assert prepared.fingerprint == Fingerprinter.sha256(path)
+    assert prepared.size == path.stat().st_size
+    assert len(prepared.chunks) > 1
+    assert path.read_text().startswith(prepared.chunks[0])
+
+
+def test_prepare_files_parallel_matches_serial(tmp_path: Path):
+    paths = _make_tree(tmp_path) + [tmp_path / "missing.md"]
+    progress = IngestProgress()
+    serial = {p.fingerprint for p in prepare_files(paths, workers=1, progress=IngestProgress())}
+    parallel = {p.fingerprint for p in prepare_files(paths, workers=2, progress=progress)}
+    assert parallel == serial
+    assert len(parallel) == 2
+    assert progress.failed == 1
+
+
+def test_markdown_extractor_drops_markup_noise(tmp_path: Path):
+    path = tmp_path / "page.md"
+    path.write_text("---\ntitle: x\n---\n# Setup\n<!-- hidden -->See [the docs](http://example.com) ![logo](a.png)\n")
+    text = " ".join(prepare_file(path, chunk_size=1000).chunks)
+    assert text == "# Setup\n\nSee the docs logo"
+
+
+def test_memory_mapped_read_matches_plain_read(tmp_path: Path):
+    path = _make_tree(tmp_path)[1]
+    read = prepare_file(path, chunk_size=100, mmap_threshold=0)
+    mapped = prepare_file(path, chunk_size=100, mmap_threshold=1)
+    assert (mapped.fingerprint, mapped.chunks, mapped.size) == (read.fingerprint, read.chunks, read.size)
+
+
+def test_unextractable_and_slow_files_are_counted_failed(tmp_path: Path, monkeypatch):
+    import time
+
+    from uj0e import extractors
+
+    pdf = tmp_path / "broken.pdf"
+    pdf.write_bytes(b"%PDF-1.4 not really a pdf")
+    slow = tmp_path / "slow.txt"
+    slow.write_text("slow")
+    monkeypatch.setitem(extractors.EXTRACTORS, ".txt", lambda data, path: time.sleep(5) or "")
+    progress = IngestProgress()
+    assert list(prepare_files([pdf, slow], workers=1, progress=progress, timeout=0.2)) == []
+    assert progress.failed == 2
+
+
+def test_in_process_timeout_restores_the_callers_alarm_handler(tmp_path: Path):
+    import signal
+
+    path = tmp_path / "note.txt"
+    path.write_text("hello")
+
+    def handler(_signum, _frame):
+        pass
+
+    previous = signal.signal(signal.SIGALRM, handler)
+    try:
+        assert len(list(prepare_files([path], workers=1, timeout=5))) == 1
+        assert signal.getsignal(signal.SIGALRM) is handler
+    finally:
+        signal.signal(signal.SIGALRM, previous)
+
+
+def test_off_main_thread_timeout_is_skipped_with_a_warning(tmp_path: Path, caplog):
+    from concurrent.futures import ThreadPoolExecutor
+
+    path = tmp_path / "note.txt"
+    path.write_text("hello")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        prepared = pool.submit(lambda: list(prepare_files([path], workers=1, timeout=5))).result()
+    assert len(prepared) == 1
+    assert any(record.message == "ingest file timeout disabled" for record in caplog.records)
+
+
+def test_corrupt_pdf_raises_extraction_error(tmp_path: Path):
+    pytest.importorskip("pypdf")
+    from uj0e.extractors import ExtractionError, extract_pdf
+
+    dangling = b"%PDF-1.4\n1 0 obj << /Type /Pages /Kids [2 0 R] >> endobj\ntrailer << /Root 1 0 R >>"
+    for body in (dangling, b"\x00garbage"):
+        with pytest.raises(ExtractionError):
+            extract_pdf(body, tmp_path / "corrupt.pdf")
+
+
+_prepare_with_timeout = pipeline._prepare_with_timeout
+
+
+def _prepare_or_die(path: Path, *args):
+    # Runs in a spawned worker: exit without cleanup, like a segfault or the OOM killer.
+    if path.name == "crash.txt":
+        os._exit(1)
+    return _prepare_with_timeout(path, *args)
+
+
+def test_dead_worker_fails_only_its_file(tmp_path: Path, monkeypatch):
+    paths = _make_tree(tmp_path)
+    crash = tmp_path / "crash.txt"
+    crash.write_text("boom")
+    monkeypatch.setattr(pipeline, "_prepare_with_timeout", _prepare_or_die)
+    progress = IngestProgress()
+    prepared = list(prepare_files([paths[0], crash, *paths[1:]], workers=2, progress=progress))
+    assert sorted(p.path for p in prepared) == sorted(paths)
+    assert progress.failed == 1
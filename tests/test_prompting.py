@@ -0,0 +1,48 @@
+from uj0e.chunking import approximate_tokens
+from uj0e.prompting import PromptBuilder
+
+
+def _builder(context_tokens: int = 600) -> PromptBuilder:
+    return PromptBuilder(context_tokens=context_tokens, completion_tokens=100, count=approximate_tokens)
+
+
+def _total(messages: list[dict[str, str]]) -> int:
+    return sum(approximate_tokens(m["content"]) + 4 for m in messages)
+
+
+def test_prompt_fits_window_and_keeps_stable_prefix():
+    builder = _builder()
+    docs = [{"id": "a:0", "text": "alpha " * 400, "metadata": {"source": "a.md"}}]
+    history = [{"role": "assistant", "content": f"step {i}: " + "word " * 60} for i in range(20)]
+    first = builder.build("system", "act", goal="fix tests", plan=["run pytest"], docs=docs, history=history[:2])
+    second = builder.build("system", "reflect", goal="fix tests", plan=["run pytest"], docs=docs, history=history)
+    assert first[:2] == second[:2]
+    assert second[2]["content"].startswith("Earlier steps (summarized):")
+    assert _total(second) <= 600 - 100
+    assert second[-1] == {"role": "user", "content": "reflect"}
+
+
+def test_context_dedupes_chunks_by_id_and_content():
+    builder = _builder()
+    docs = [
+        {"id": "a:0", "text": "same text", "metadata": {"source": "a.md"}},
+        {"id": "a:0", "text": "same text", "metadata": {"source": "a.md"}},
+        {"id": "b:0", "text": "same   text", "metadata": {"source": "b.md"}},
+        {"id": "c:0", "text": "other", "metadata": {}},
+    ]
+    assert builder.format_context(docs, budget=100) == "[a.md] same text\nother"
+
+
+def test_fit_truncates_at_word_boundary_and_caches_counts():
+    calls = []
+
+    def count(text: str) -> int:
+        calls.append(text)
+        return approximate_tokens(text)
+
+    builder = PromptBuilder(context_tokens=600, completion_tokens=100, count=count)
+    text = "one two three four five six seven"
+    assert builder.fit(text, 4) == "one two three …"
+    calls.clear()
+    builder.tokens(text)
+    assert calls == []
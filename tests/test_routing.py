@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+from uj0e.cache import ResponseCache  # noqa: E402
+from uj0e.model_client import AsyncModelClient  # noqa: E402
+from uj0e.routing import Endpoint, EndpointPool, ModelRouter, NoEndpointAvailable, parse_endpoints  # noqa: E402
+
+
+def _pool(*urls: str, limit: int = 0, **kwargs) -> EndpointPool:
+    kwargs.setdefault("backoff", 0)
+    return EndpointPool([Endpoint(url=url, limit=limit) for url in urls], **kwargs)
+
+
+def test_parse_endpoints_reads_model_and_cap():
+    assert parse_endpoints("http://a/v1, http://b/v1#small,http://c/v1#model=big&max=4") == [
+        ("http://a/v1", "local-model", 0),
+        ("http://b/v1", "small", 0),
+        ("http://c/v1", "big", 4),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_routes_to_least_loaded_then_fastest():
+    pool = _pool("http://a", "http://b")
+    a, b = pool.endpoints
+    a.ewma, b.ewma = 0.1, 0.55
+    assert await pool.acquire() is a
+    assert await pool.acquire() is a  # 2 * 0.1 still beats 0.55
+    assert await pool.acquire() is a
+    assert await pool.acquire() is a
+    assert await pool.acquire() is a
+    assert await pool.acquire() is b  # 6 * 0.1 > 0.55
+
+
+@pytest.mark.asyncio
+async def test_capped_endpoint_waits_for_release():
+    pool = _pool("http://a", limit=1)
+    first = await pool.acquire()
+    waiter = asyncio.create_task(pool.acquire())
+    await asyncio.sleep(0)
+    assert not waiter.done()
+    pool.release(first, ok=True, latency=0.01)
+    assert await asyncio.wait_for(waiter, 1) is first
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_probe_closes_it():
+    pool = _pool("http://a", breaker_failures=2, breaker_cooldown=0)
+    (endpoint,) = pool.endpoints
+    for _ in range(2):
+        pool.release(await pool.acquire(), ok=False)
+    assert pool.state(endpoint) == "half_open"
+    probe = await pool.acquire()
+    assert probe.probing
+    pool.release(probe, ok=True, latency=0.2)
+    assert pool.state(endpoint) == "closed" and endpoint.ewma == 0.2
+
+    pool.breaker_cooldown = 60
+    for _ in range(2):
+        pool.release(await pool.acquire(), ok=False)
+    with pytest.raises(NoEndpointAvailable):
+        await pool.acquire()
+
+
+@pytest.mark.asyncio
+async def test_chat_fails_over_to_healthy_endpoint():
+    seen: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.host)
+        if request.url.host == "down":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "pong"}}]})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    model = AsyncModelClient(
+        endpoint="http://down/v1,http://up/v1", client=client, cache=ResponseCache(max_entries=0), router=ModelRouter()
+    )
+    model.pool().backoff = 0
+    replies = [await model.chat([{"role": "user", "content": f"ping {i}"}]) for i in range(4)]
+    assert replies == ["pong"] * 4
+    down, up = model.pool().endpoints
+    assert down.errors >= 1 and up.errors == 0
+    assert seen.count("up") == 4
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried():
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(400)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    model = AsyncModelClient(
+        endpoint="http://a/v1,http://b/v1", client=client, cache=ResponseCache(max_entries=0), router=ModelRouter()
+    )
+    with pytest.raises(httpx.HTTPStatusError):
+        await model.chat([{"role": "user", "content": "ping"}])
+    assert calls == 1
+    assert all(endpoint.failures == 0 and endpoint.outstanding == 0 for endpoint in model.pool().endpoints)
+    await model.aclose()
+
+
+@pytest.mark.asyncio
+async def test_failover_retries_failed_endpoint_when_others_are_open():
+    pool = _pool("http://a", "http://b", breaker_failures=3, breaker_cooldown=60)
+    a, b = pool.endpoints
+    for _ in range(3):
+        pool.release(await pool.acquire([a]), ok=False)
+    assert pool.state(b) == "open"
+    calls: list[str] = []
+
+    async def send(endpoint: Endpoint) -> str:
+        calls.append(endpoint.url)
+        if len(calls) == 1:
+            raise httpx.ConnectError("transient")
+        return "ok"
+
+    assert await pool.call(send) == "ok"
+    assert calls == ["http://a", "http://a"]
+
+    for _ in range(3):
+        pool.release(await pool.acquire(), ok=False)
+    with pytest.raises(NoEndpointAvailable):
+        await pool.acquire()
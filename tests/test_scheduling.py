@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from uj0e.scheduling import FairLimiter
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_round_robin_across_lanes():
+    limiter = FairLimiter(1)
+    order: list[str] = []
+
+    async def call(name: str, lane: str) -> None:
+        async with limiter.slot(lane):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await limiter.acquire("holder")
+    tasks = [asyncio.create_task(call(name, name[0])) for name in ("a1", "a2", "a3", "b1")]
+    await asyncio.sleep(0)
+    assert limiter.waiting == 4
+    limiter.release()
+    await asyncio.gather(*tasks)
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = FairLimiter(1)
+    await limiter.acquire("x")
+    waiter = asyncio.create_task(limiter.acquire("y"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.waiting == 0
+    limiter.release()
+    await asyncio.wait_for(limiter.acquire("z"), timeout=1)
+    assert limiter.active == 1
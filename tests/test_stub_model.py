@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from uj0e.cache import ResponseCache  # noqa: E402
+from uj0e.model_client import AsyncModelClient, ModelClient  # noqa: E402
+from uj0e.stub_model import StubConfig, StubModelServer, agent_reply  # noqa: E402
+
+
+@pytest.fixture
+def stub():
+    with StubModelServer(StubConfig(latency=0, tokens_per_sec=0, completion_tokens=8, embed_latency=0)) as server:
+        yield server
+
+
+def test_agent_reply_follows_the_graph_phases():
+    assert "- step 1" in agent_reply("Plan up to 4 steps to achieve the goal.", 32, seed=1)
+    assert agent_reply("Use the tools to progress.", 32, seed=1).startswith("retrieve: ")
+    assert "success" in agent_reply("Reflect on the last result.", 32, seed=1)
+    assert agent_reply("Use the tools", 6, seed=7) == agent_reply("Use the tools", 6, seed=7)
+    assert len(agent_reply("Use the tools", 6, seed=7).split(" ")) == 6
+
+
+def test_stub_serves_deterministic_chat_and_embeddings(stub):
+    client = ModelClient(endpoint=stub.url, cache=ResponseCache(max_entries=0))
+    messages = [{"role": "user", "content": "Use the tools to progress."}]
+    first = client.chat(messages, use_cache=False)
+    assert first == client.chat(messages, use_cache=False)
+    assert first.startswith("retrieve: ")
+    vectors = client.embed(["a", "b", "a"])
+    assert len(vectors) == 3 and len(vectors[0]) == 384
+    assert vectors[0] == vectors[2] != vectors[1]
+    assert stub.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_stub_streams_one_token_per_chunk(stub):
+    model = AsyncModelClient(endpoint=stub.url, cache=ResponseCache(max_entries=0))
+    messages = [{"role": "user", "content": "Reflect on the last result."}]
+    tokens = [token async for token in model.stream_chat(messages)]
+    assert len(tokens) == 8
+    assert "".join(tokens) == await model.chat(messages, use_cache=False)
+    await model.aclose()
@@ -0,0 +1,35 @@
+import json
+import time
+
+from uj0e import telemetry
+from uj0e.config import settings
+from uj0e.telemetry import RunProfiler, track
+
+
+def test_disabled_telemetry_returns_shared_noop(monkeypatch):
+    monkeypatch.setattr(settings, "telemetry", False)
+    span = track("model", "chat", tokens=3)
+    assert span is track("tool", "sandbox")
+    with span as inner:
+        inner.set(prompt_tokens=1)
+
+
+def test_profiler_keeps_only_the_slowest_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "telemetry", True)
+    profiler = RunProfiler(slowest=2, interval=0.001, directory=tmp_path)
+    for run_id, seconds in (("a", 0.03), ("b", 0.0), ("c", 0.02), ("d", 0.01)):
+        with profiler.run(run_id):
+            with track("node", "act"):
+                time.sleep(seconds)
+
+    assert sorted(path.stem for path in tmp_path.iterdir()) == ["a", "c"]
+    report = json.loads((tmp_path / "a.json").read_text())
+    assert report["run_id"] == "a"
+    assert [span["name"] for span in report["spans"]] == ["act"]
+    assert report["spans"][0]["seconds"] >= 0.03
+    assert report["stacks"]
+
+
+def test_profile_run_is_noop_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "profile_slowest", 0)
+    assert telemetry.profile_run("x") is telemetry._NULL
@@ -1,13 +1,14 @@
+import gzip
+import json
+import os
+import threading
+import time
 from pathlib import Path
 
-from uj0e.tools import Fingerprinter, LocalFileTool
+import pytest
 
-
-def test_chunk_text_overlap():
-    text = "abcdefghij"
-    chunks = Fingerprinter.chunk_text(text, chunk_size=4, chunk_overlap=2)
-    assert chunks[0] == "abcd"
-    assert chunks[1].startswith("cd")
+from uj0e.config import settings
+from uj0e.tools import AuditLogger, LocalFileTool, OutputCapture, SandboxTool
 
 
 def test_local_file_tool_respects_root(tmp_path: Path):
@@ -16,3 +17,230 @@ def test_local_file_tool_respects_root(tmp_path: Path):
     assert "hello" in tool.read("allowed.txt").output
     outside = tool.read("../evil.txt")
     assert outside.ok is False
+
+
+def test_audit_logger_appends_and_flushes(tmp_path: Path):
+    audit = AuditLogger(path=str(tmp_path / "audit.log"), flush_interval=60, fsync="never")
+    audit.log("plan", {"goal": "a"})
+    audit.log("act", {"ok": True})
+    assert (tmp_path / "audit.log").read_text() == ""
+    audit.flush()
+    lines = [json.loads(line) for line in (tmp_path / "audit.log").read_text().splitlines()]
+    assert lines == [{"action": "plan", "goal": "a"}, {"action": "act", "ok": True}]
+    audit.close()
+
+
+def test_audit_logger_is_thread_safe(tmp_path: Path):
+    audit = AuditLogger(path=str(tmp_path / "audit.log"), flush_interval=0.01, fsync="never", max_buffer=256)
+    threads = [
+        threading.Thread(target=lambda n=n: [audit.log("act", {"thread": n, "i": i}) for i in range(200)])
+        for n in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    audit.close()
+    lines = (tmp_path / "audit.log").read_text().splitlines()
+    assert len(lines) == 800
+    assert all(json.loads(line)["action"] == "act" for line in lines)
+
+
+def test_audit_logger_rotates_and_compresses(tmp_path: Path):
+    path = tmp_path / "audit.log"
+    audit = AuditLogger(path=str(path), flush_interval=0, fsync="never", max_bytes=100, backups=2, compress=True)
+    for i in range(20):
+        audit.log("act", {"i": i})
+    audit.close()
+    assert path.stat().st_size <= 100
+    assert sorted(p.name for p in tmp_path.glob("audit.log.*.gz")) == ["audit.log.1.gz", "audit.log.2.gz"]
+    with gzip.open(tmp_path / "audit.log.1.gz", "rt") as f:
+        assert json.loads(f.readline())["action"] == "act"
+
+
+def test_audit_rotation_clock_survives_restarts(tmp_path: Path):
+    path = tmp_path / "audit.log"
+    options = dict(flush_interval=0, fsync="never", max_bytes=0, rotate_interval=3600, compress=False)
+    audit = AuditLogger(path=str(path), **options)
+    audit.log("act", {"i": 0})
+    audit.close()
+    # The log was started two hours ago by an earlier process.
+    started = time.time() - 7200
+    os.utime(f"{path}.lock", (started, started))
+
+    audit = AuditLogger(path=str(path), **options)
+    audit.log("act", {"i": 1})
+    audit.close()
+    assert json.loads((tmp_path / "audit.log.1").read_text())["i"] == 0
+    assert json.loads(path.read_text())["i"] == 1
+    assert time.time() - os.stat(f"{path}.lock").st_mtime < 60
+
+
+
+def test_audit_logger_ignores_events_after_close(tmp_path: Path):
+    path = tmp_path / "audit.log"
+    audit = AuditLogger(path=str(path), flush_interval=0, fsync="never")
+    audit.log("act", {"i": 0})
+    audit.close()
+    audit.log("act", {"i": 1})
+    audit.flush()
+    assert [json.loads(line)["i"] for line in path.read_text().splitlines()] == [0]
+
+
+def test_audit_rotation_dates_a_log_without_lock_file_by_its_mtime(tmp_path: Path):
+    path = tmp_path / "audit.log"
+    path.write_text(json.dumps({"action": "act", "i": 0}) + "\n")
+    written = time.time() - 7200
+    os.utime(path, (written, written))
+    audit = AuditLogger(path=str(path), flush_interval=0, fsync="never", max_bytes=0, rotate_interval=3600)
+    audit.log("act", {"i": 1})
+    audit.close()
+    with gzip.open(tmp_path / "audit.log.1.gz", "rt") as f:
+        assert json.loads(f.read())["i"] == 0
+    assert json.loads(path.read_text())["i"] == 1
+
+
+def test_audit_writers_sharing_a_log_lose_no_lines_across_rotations(tmp_path: Path):
+    path = tmp_path / "audit.log"
+    options = dict(flush_interval=0, fsync="never", max_bytes=2000, backups=100, compress=True)
+    writers = [AuditLogger(path=str(path), **options) for _ in range(2)]
+    threads = [
+        threading.Thread(target=lambda w=w: [writers[w].log("act", {"writer": w, "i": i}) for i in range(300)])
+        for w in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for writer in writers:
+        writer.close()
+    lines = path.read_text().splitlines()
+    for backup in tmp_path.glob("audit.log.*.gz"):
+        with gzip.open(backup, "rt") as f:
+            lines += f.read().splitlines()
+    assert len(lines) == 600
+
+
+FAKE_DOCKER = """#!/bin/sh
+# Minimal docker stand-in: 'run -d' hands out ids, 'exec' runs the command locally.
+case "$1" in
+  run) echo "c$$" ;;
+  exec) shift 2; exec "$@" ;;
+  rm) ;;
+esac
+"""
+
+
+def test_sandbox_pool_reuses_and_recycles_containers(tmp_path: Path, monkeypatch):
+    docker = tmp_path / "docker"
+    docker.write_text(FAKE_DOCKER)
+    docker.chmod(0o755)
+    monkeypatch.setattr(settings, "sandbox_max_uses", 2)
+    tool = SandboxTool(pool_size=1, docker_bin=str(docker))
+
+    first = tool.run("echo one")
+    second = tool.run("echo two")
+    assert first.output.strip() == "one" and second.output.strip() == "two"
+    assert first.metadata["container"] == second.metadata["container"]
+    third = tool.run("exit 3")
+    assert third.ok is False
+    assert third.metadata["container"] != first.metadata["container"]
+    stats = tool.pool.stats
+    assert stats.reuses == 1
+    assert stats.recycled == 1
+    assert stats.acquisitions == 3
+    tool.pool.close()
+
+
+FLAKY_DOCKER = """#!/bin/sh
+# Docker stand-in whose daemon is down while a 'down' file sits next to it.
+case "$1" in
+  run)
+    if [ -e "$(dirname "$0")/down" ]; then echo "daemon unavailable" >&2; exit 125; fi
+    if [ "$2" = "-d" ]; then echo "c$$"; else echo cold; fi ;;
+  exec) shift 2; exec "$@" ;;
+  rm) ;;
+esac
+"""
+
+
+def _wait_for(condition, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_sandbox_pool_recovers_after_failed_starts(tmp_path: Path):
+    docker = tmp_path / "docker"
+    docker.write_text(FLAKY_DOCKER)
+    docker.chmod(0o755)
+    (tmp_path / "down").touch()
+    tool = SandboxTool(pool_size=1, docker_bin=str(docker))
+    tool.pool.retry_backoff = 0.01
+    tool.pool.start()
+    _wait_for(lambda: tool.pool.degraded)
+
+    cold = tool.run("echo pooled")
+    assert cold.ok is False and "container" not in cold.metadata
+
+    (tmp_path / "down").unlink()
+    _wait_for(lambda: tool.pool.idle == 1)
+    assert not tool.pool.degraded
+    pooled = tool.run("echo pooled")
+    assert pooled.output.strip() == "pooled" and "container" in pooled.metadata
+    assert tool.pool.stats.start_failures >= 1 and tool.pool.stats.started == 1
+    tool.pool.close()
+
+
+def test_output_capture_keeps_head_and_tail():
+    capture = OutputCapture(limit=8)
+    for chunk in (b"abc", b"defgh", b"ijkl"):
+        capture.feed(chunk)
+    assert capture.truncated
+    assert capture.text() == "abcd\n... [4 bytes omitted] ...\nijkl"
+    assert capture.metadata() == {"output_bytes": 12, "truncated": True, "killed": False}
+
+
+def test_sandbox_kills_runaway_output():
+    tool = SandboxTool(pool_size=0)
+    tool.docker_bin = None
+    tool.output_limit = 1024
+    tool.output_kill = 64 * 1024
+    chunks: list[str] = []
+    result = tool.run("yes", on_output=chunks.append)
+    assert result.ok is False
+    assert result.metadata["killed"] and result.metadata["truncated"]
+    assert len(result.output) < 2048
+    assert "y\ny\n" in "".join(chunks)
+
+
+def test_failing_output_callback_kills_and_reaps_the_command(tmp_path: Path):
+    tool = SandboxTool(pool_size=0)
+    tool.docker_bin = None
+    pid_file = tmp_path / "pid"
+
+    def disconnect(chunk: str) -> None:
+        if "started" in chunk:
+            raise ConnectionResetError("client went away")
+
+    result = tool.run(f"echo $$ > {pid_file}; echo started; sleep 30", on_output=disconnect)
+    assert result.ok is False and "client went away" in result.output
+    status = Path(f"/proc/{int(pid_file.read_text())}/status")
+    # Gone, or a zombie waiting for init: either way no longer running.
+    _wait_for(lambda: not status.exists() or "\nState:\tZ" in status.read_text())
+
+
+def test_failing_output_callback_recycles_the_pooled_container(tmp_path: Path):
+    docker = tmp_path / "docker"
+    docker.write_text(FAKE_DOCKER)
+    docker.chmod(0o755)
+    tool = SandboxTool(pool_size=1, docker_bin=str(docker))
+
+    def disconnect(chunk: str) -> None:
+        raise ConnectionResetError("client went away")
+
+    result = tool.run("echo started; sleep 30", on_output=disconnect)
+    assert result.ok is False
+    assert tool.pool.stats.recycled == 1
+    tool.pool.close()
@@ -0,0 +1,54 @@
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("chromadb")
+
+from uj0e.config import settings  # noqa: E402
+from uj0e.vector import VectorRegistry, VectorStore  # noqa: E402
+
+
+def _store(tmp_path: Path, monkeypatch, **overrides) -> VectorStore:
+    monkeypatch.setattr(settings, "vector_backend", "numpy")
+    for name, value in overrides.items():
+        monkeypatch.setattr(settings, name, value)
+    return VectorStore(persist_directory=str(tmp_path / "chroma"), registry=VectorRegistry())
+
+
+def test_http_mode_without_shared_state_does_not_cache_results(tmp_path: Path, monkeypatch):
+    store = _store(tmp_path, monkeypatch, chroma_mode="http", index_state_dir="")
+    assert store.result_cache.max_entries == 0
+
+
+def test_index_state_dir_holds_manifest_and_lexical_index(tmp_path: Path, monkeypatch):
+    shared = tmp_path / "shared"
+    store = _store(tmp_path, monkeypatch, chroma_mode="http", index_state_dir=str(shared))
+    assert store.result_cache.max_entries == settings.retrieval_cache_size
+    assert store.state_directory == shared
+    assert (shared / "manifests").is_dir() and (shared / "lexical").is_dir()
+
+
+def test_loading_an_embedder_does_not_block_the_registry(monkeypatch):
+    import threading
+
+    from uj0e import vector
+
+    registry = VectorRegistry()
+    loads: list[str] = []
+
+    def load(model_name: str):
+        # /health and /metrics read the registry from other threads while a model loads.
+        reader = threading.Thread(target=registry.footprint)
+        reader.start()
+        reader.join(timeout=5)
+        assert not reader.is_alive()
+        loads.append(model_name)
+        return lambda texts: [[0.0] for _ in texts]
+
+    monkeypatch.setattr(vector.embedding_functions, "SentenceTransformerEmbeddingFunction", load)
+    threads = [threading.Thread(target=registry.embedder, args=("model",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["model"]
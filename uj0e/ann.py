@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class NumpyCollection:
+    """Chroma-compatible collection over memory-mapped embeddings.
+
+    Vectors are L2-normalised and appended to a flat float32 (or int8 + per-row scale)
+    file that readers ``np.memmap``, so opening is instant and the page cache is shared
+    between worker processes. Ids, documents and metadata live in a sqlite side table;
+    a row that is missing there is dead. Writers in every process take an flock on
+    ``write.lock``, so concurrent ingests never number two rows the same. Search is exact blockwise top-k by cosine
+    similarity, or, once ``build_index`` has trained centroids, an IVF probe of the
+    ``nprobe`` closest lists. Implements the subset of the Chroma collection API that
+    ``VectorStore`` uses: ``add``, ``get``, ``delete``, ``query`` and ``count``.
+    """
+
+    # Rows scored per matrix product in exact search; bounds temporary memory.
+    _BLOCK = 65536
+
+    def __init__(self, directory: str | Path, name: str, quantize: bool = False, nprobe: int = 8) -> None:
+        self.name = name
+        self.directory = Path(directory) / name
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.directory / "meta.sqlite"), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rows ("
+            "row INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, document TEXT, metadata TEXT, list INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        stored = self._info("quantize")
+        self.quantize = quantize if stored is None else stored == "1"
+        if stored is None:
+            self._set_info("quantize", "1" if quantize else "0")
+        self._dim: int | None = None
+        self._state: tuple[int, int] | None = None
+        self._matrix: np.ndarray | None = None
+        self._scales: np.ndarray | None = None
+        self._alive = np.zeros(0, dtype=bool)
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._centroids: np.ndarray | None = None
+
+    @property
+    def dim(self) -> int | None:
+        if self._dim is None:
+            value = self._info("dim")
+            self._dim = int(value) if value is not None else None
+        return self._dim
+
+    @property
+    def _vector_path(self) -> Path:
+        return self.directory / ("vectors.i8" if self.quantize else "vectors.f32")
+
+    @property
+    def _row_bytes(self) -> int:
+        dim = self.dim or 0
+        return dim if self.quantize else dim * 4
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    def add(
+        self,
+        ids: list[str],
+        embeddings: Any,
+        documents: list[str] | None = None,
+        metadatas: list[dict] | None = None,
+    ) -> None:
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._writing():
+            if self.dim is None:
+                self._set_info("dim", str(vectors.shape[1]))
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection ({self.dim})")
+            existing = set(self.get(ids=list(ids))["ids"])
+            keep = [i for i, chunk_id in enumerate(ids) if chunk_id not in existing]
+            if not keep:
+                return
+            vectors = vectors[keep]
+            # Rows are numbered by position in the vector file, which is appended before the
+            # metadata commit; a crash in between only leaves dead rows behind.
+            start = self._file_rows()
+            if self.quantize:
+                scales = np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127.0
+                quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+                _append(self._vector_path, quantized.tobytes())
+                _append(self.directory / "scales.f32", scales.astype(np.float32).tobytes())
+            else:
+                _append(self._vector_path, vectors.tobytes())
+            centroids = self._load_centroids()
+            lists = np.argmax(vectors @ centroids.T, axis=1) if centroids is not None else np.full(len(keep), -1)
+            rows = [
+                (start + offset, ids[i], documents[i], json.dumps(metadatas[i]), int(lists[offset]))
+                for offset, i in enumerate(keep)
+            ]
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self._state = None
+
+    def get(
+        self,
+        ids: list[str] | None = None,
+        where: dict | None = None,
+        include: Iterable[str] | None = None,
+        limit: int | None = None,
+        offset: int | None = None,
+    ) -> dict[str, list]:
+        clauses, params = _where_sql(where)
+        if ids is not None:
+            if not ids:
+                return {"ids": [], "documents": [], "metadatas": []}
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        sql = "SELECT id, document, metadata FROM rows"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY row"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        found = self._db.execute(sql, params).fetchall()
+        return {
+            "ids": [row[0] for row in found],
+            "documents": [row[1] for row in found],
+            "metadatas": [json.loads(row[2]) for row in found],
+        }
+
+    def delete(self, ids: list[str] | None = None, where: dict | None = None) -> None:
+        clauses, params = _where_sql(where)
+        if ids is not None:
+            clauses.append(f"id IN ({','.join('?' * len(ids))})")
+            params.extend(ids)
+        if not clauses:
+            return
+        with self._writing():
+            self._db.execute("DELETE FROM rows WHERE " + " AND ".join(clauses), params)
+            self._state = None
+
+    def query(
+        self,
+        query_embeddings: Any,
+        n_results: int = 4,
+        where: dict | None = None,
+        include: Iterable[str] | None = None,
+    ) -> dict[str, list]:
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        with self._lock:
+            self._refresh()
+            alive = self._alive if where is None else self._alive & self._where_mask(where)
+            k = min(n_results, int(alive.sum()))
+            if k == 0:
+                empty: list[list] = [[] for _ in range(len(queries))]
+                return {"ids": empty, "documents": empty, "metadatas": empty, "distances": empty}
+            if self._centroids is not None and self.nprobe > 0:
+                rows, scores = self._search_ivf(queries, alive, k)
+            else:
+                rows, scores = self._search_exact(queries, alive, k)
+        return self._results(rows, scores)
+
+    def build_index(self, nlist: int | None = None, iterations: int = 10, sample: int = 100_000) -> int:
+        """Train IVF centroids (spherical k-means) and assign every row to its list."""
+        with self._writing():
+            self._refresh()
+            alive_rows = np.flatnonzero(self._alive)
+            if not len(alive_rows):
+                return 0
+            nlist = nlist or max(1, int(np.sqrt(len(alive_rows))))
+            rng = np.random.default_rng(0)
+            picked = np.sort(rng.choice(alive_rows, size=min(sample, len(alive_rows)), replace=False))
+            training = self._vectors(picked)
+            centroids = training[rng.choice(len(training), size=min(nlist, len(training)), replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmax(training @ centroids.T, axis=1)
+                for index in range(len(centroids)):
+                    members = training[assignment == index]
+                    if len(members):
+                        centroids[index] = members.mean(axis=0)
+                centroids = _normalize(centroids)
+            lists = np.empty(len(alive_rows), dtype=np.int32)
+            for start in range(0, len(alive_rows), self._BLOCK):
+                block = alive_rows[start : start + self._BLOCK]
+                lists[start : start + len(block)] = np.argmax(self._vectors(block) @ centroids.T, axis=1)
+            np.save(self.directory / "centroids.npy", centroids)
+            self._db.execute("BEGIN")
+            self._db.executemany(
+                "UPDATE rows SET list = ? WHERE row = ?", zip(lists.tolist(), alive_rows.tolist())
+            )
+            self._db.execute("COMMIT")
+            self._state = None
+            return len(centroids)
+
+    def compact(self) -> None:
+        """Rewrite the vector files without dead rows and renumber the survivors."""
+        with self._writing():
+            self._refresh()
+            alive_rows = np.flatnonzero(self._alive)
+            mapping = [(int(new), int(old)) for new, old in enumerate(alive_rows)]
+            _rewrite(self._vector_path, np.asarray(self._matrix)[alive_rows])
+            if self.quantize:
+                _rewrite(self.directory / "scales.f32", np.asarray(self._scales)[alive_rows])
+            self._db.execute("BEGIN")
+            # Shift to negative first so renumbering never collides with a live row.
+            self._db.executemany("UPDATE rows SET row = ? WHERE row = ?", [(-new - 1, old) for new, old in mapping])
+            self._db.execute("UPDATE rows SET row = -row - 1")
+            self._db.execute("COMMIT")
+            self._db.execute("VACUUM")
+            self._state = None
+
+    def drop(self) -> None:
+        with self._lock:
+            self._db.close()
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        """Serialise writes with other threads and, through an flock, other processes."""
+        with self._lock, open(self.directory / "write.lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _file_rows(self) -> int:
+        if not self._row_bytes or not self._vector_path.exists():
+            return 0
+        return self._vector_path.stat().st_size // self._row_bytes
+
+    def _refresh(self) -> None:
+        """Remap after local writes, or when another process changed the files or table."""
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        state = (version, self._file_rows())
+        if state == self._state:
+            return
+        rows = state[1]
+        dim = self.dim or 0
+        if rows:
+            dtype = np.int8 if self.quantize else np.float32
+            self._matrix = np.memmap(self._vector_path, dtype=dtype, mode="r", shape=(rows, dim))
+            if self.quantize:
+                self._scales = np.memmap(self.directory / "scales.f32", dtype=np.float32, mode="r", shape=(rows,))
+        else:
+            self._matrix = np.zeros((0, dim), dtype=np.float32)
+            self._scales = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(rows, dtype=bool)
+        self._lists = np.full(rows, -1, dtype=np.int32)
+        found = np.array(self._db.execute("SELECT row, list FROM rows").fetchall(), dtype=np.int64).reshape(-1, 2)
+        found = found[found[:, 0] < rows]
+        self._alive[found[:, 0]] = True
+        self._lists[found[:, 0]] = found[:, 1]
+        self._centroids = self._load_centroids()
+        self._state = state
+
+    def _load_centroids(self) -> np.ndarray | None:
+        path = self.directory / "centroids.npy"
+        return np.load(path) if path.exists() else None
+
+    def _vectors(self, rows: np.ndarray | slice) -> np.ndarray:
+        assert self._matrix is not None
+        block = np.asarray(self._matrix[rows], dtype=np.float32)
+        if self.quantize:
+            assert self._scales is not None
+            block = block * np.asarray(self._scales[rows])[:, None]
+        return block
+
+    def _search_exact(self, queries: np.ndarray, alive: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        for start in range(0, len(alive), self._BLOCK):
+            stop = min(start + self._BLOCK, len(alive))
+            mask = alive[start:stop]
+            if not mask.any():
+                continue
+            scores = queries @ self._vectors(slice(start, stop)).T
+            scores[:, ~mask] = -np.inf
+            rows = np.broadcast_to(np.arange(start, stop), scores.shape)
+            best_scores, best_rows = _merge_topk(best_scores, best_rows, scores, rows, k)
+        return best_rows, best_scores
+
+    def _search_ivf(self, queries: np.ndarray, alive: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        assert self._centroids is not None
+        probes = np.argsort(-(queries @ self._centroids.T), axis=1)[:, : self.nprobe]
+        # Rows appended before the index existed have no list; always scan them.
+        unassigned = self._lists < 0
+        all_rows = np.full((len(queries), k), -1, dtype=np.int64)
+        all_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        for index, query in enumerate(queries):
+            candidates = np.flatnonzero(alive & (np.isin(self._lists, probes[index]) | unassigned))
+            if not len(candidates):
+                continue
+            scores = self._vectors(candidates) @ query
+            top = min(k, len(candidates))
+            picked = np.argpartition(-scores, top - 1)[:top]
+            all_rows[index, :top] = candidates[picked]
+            all_scores[index, :top] = scores[picked]
+        return _sort_topk(all_rows, all_scores)
+
+    def _where_mask(self, where: dict) -> np.ndarray:
+        clauses, params = _where_sql(where)
+        mask = np.zeros(len(self._alive), dtype=bool)
+        rows = [row for (row,) in self._db.execute("SELECT row FROM rows WHERE " + " AND ".join(clauses), params)]
+        rows = [row for row in rows if row < len(mask)]
+        mask[rows] = True
+        return mask
+
+    def _results(self, rows: np.ndarray, scores: np.ndarray) -> dict[str, list]:
+        rows, scores = _sort_topk(rows, scores)
+        wanted = sorted({int(row) for row in rows.ravel() if row >= 0})
+        by_row: dict[int, tuple] = {}
+        for start in range(0, len(wanted), 500):
+            part = wanted[start : start + 500]
+            sql = f"SELECT row, id, document, metadata FROM rows WHERE row IN ({','.join('?' * len(part))})"
+            for row, chunk_id, document, metadata in self._db.execute(sql, part):
+                by_row[row] = (chunk_id, document, json.loads(metadata))
+        result: dict[str, list] = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row_ids, row_scores in zip(rows, scores):
+            hits = [(by_row[int(r)], float(s)) for r, s in zip(row_ids, row_scores) if r >= 0 and int(r) in by_row]
+            result["ids"].append([hit[0][0] for hit in hits])
+            result["documents"].append([hit[0][1] for hit in hits])
+            result["metadatas"].append([hit[0][2] for hit in hits])
+            result["distances"].append([1.0 - score for _, score in hits])
+        return result
+
+    def _info(self, key: str) -> str | None:
+        row = self._db.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (key, value))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+def _append(path: Path, data: bytes) -> None:
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _rewrite(path: Path, data: np.ndarray) -> None:
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    data.tofile(tmp)
+    os.replace(tmp, path)
+
+
+def _merge_topk(
+    best_scores: np.ndarray, best_rows: np.ndarray, scores: np.ndarray, rows: np.ndarray, k: int
+) -> tuple[np.ndarray, np.ndarray]:
+    merged_scores = np.concatenate([best_scores, scores], axis=1)
+    merged_rows = np.concatenate([best_rows, rows], axis=1)
+    top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(merged_scores, top, axis=1), np.take_along_axis(merged_rows, top, axis=1)
+
+
+def _sort_topk(rows: np.ndarray, scores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _where_sql(where: dict | None) -> tuple[list[str], list[Any]]:
+    """Translate the Chroma metadata filters VectorStore uses ($eq/$in per key) to SQL."""
+    clauses: list[str] = []
+    params: list[Any] = []
+    for key, condition in (where or {}).items():
+        column = "json_extract(metadata, ?)"
+        if isinstance(condition, dict):
+            if set(condition) - {"$eq", "$in"}:
+                raise ValueError(f"Unsupported filter for numpy backend: {condition}")
+            if "$eq" in condition:
+                clauses.append(f"{column} = ?")
+                params.extend([f"$.{key}", condition["$eq"]])
+            if "$in" in condition:
+                values = list(condition["$in"])
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})" if values else "0")
+                params.extend([f"$.{key}", *values] if values else [])
+        else:
+            clauses.append(f"{column} = ?")
+            params.extend([f"$.{key}", condition])
+    return clauses, params
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+from .config import settings
+from .orchestrator import CONTEXT_K, AgentOrchestrator
+from .scheduling import current_lane
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchJob:
+    id: str
+    goals: list[str]
+    max_iters: int = 3
+    parallel: bool | None = None
+    status: str = "pending"
+    # One event per finished goal, in completion order: index, goal and state or error.
+    results: list[dict[str, Any]] = field(default_factory=list)
+    created: float = field(default_factory=time.time)
+    finished: float | None = None
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    _task: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed")
+
+    @property
+    def failed(self) -> int:
+        return sum(1 for result in self.results if "error" in result)
+
+    def record(self, event: dict[str, Any]) -> None:
+        self.results.append(event)
+        self._changed.set()
+
+
+class BatchRunner:
+    """Runs many goals as one job and keeps the most recent jobs for polling.
+
+    Retrieval for all goals is prefetched with one ``query_many`` call (identical goals
+    share one lookup and all misses share one embedding batch), so each run's act
+    step hits the retrieval cache. Model calls are tagged with the job id, so the
+    client's fair limiter interleaves this job with other traffic. ``on_failure`` is
+    called once per goal that errors or ends without completing.
+    """
+
+    def __init__(
+        self,
+        orchestrator: AgentOrchestrator,
+        concurrency: int | None = None,
+        on_failure: Callable[[], None] | None = None,
+    ) -> None:
+        self.orchestrator = orchestrator
+        self.concurrency = concurrency or settings.batch_concurrency
+        self.on_failure = on_failure
+        self.jobs: OrderedDict[str, BatchJob] = OrderedDict()
+
+    def submit(self, goals: list[str], max_iters: int = 3, parallel: bool | None = None) -> BatchJob:
+        job = BatchJob(id=uuid.uuid4().hex, goals=list(goals), max_iters=max_iters, parallel=parallel)
+        self.jobs[job.id] = job
+        self._evict()
+        # Runs in the background: a client that stops streaming can still poll the job.
+        job._task = asyncio.get_running_loop().create_task(self._run(job))
+        return job
+
+    def get(self, job_id: str) -> BatchJob:
+        return self.jobs[job_id]
+
+    async def stream(self, job: BatchJob) -> AsyncIterator[dict[str, Any]]:
+        """Yield the job's result events as they complete, from the first one."""
+        sent = 0
+        while True:
+            job._changed.clear()
+            while sent < len(job.results):
+                yield job.results[sent]
+                sent += 1
+            if job.done:
+                return
+            await job._changed.wait()
+
+    async def _run(self, job: BatchJob) -> None:
+        job.status = "running"
+        current_lane.set(job.id)
+        try:
+            goals = list(dict.fromkeys(job.goals))
+            await asyncio.to_thread(self.orchestrator.vector.query_many, goals, k=CONTEXT_K)
+        except Exception:  # noqa: BLE001
+            logger.warning("batch retrieval prefetch failed", extra={"job": job.id}, exc_info=True)
+        limit = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def run_goal(index: int, goal: str) -> None:
+            async with limit:
+                try:
+                    state = await self.orchestrator.arun(goal=goal, max_iters=job.max_iters, parallel=job.parallel)
+                except Exception as exc:  # noqa: BLE001
+                    logger.warning("batch goal failed", extra={"job": job.id, "index": index}, exc_info=True)
+                    job.record({"index": index, "goal": goal, "error": str(exc)})
+                    failed = True
+                else:
+                    job.record({"index": index, "goal": goal, "state": state})
+                    failed = not state.completed
+                if failed and self.on_failure is not None:
+                    self.on_failure()
+
+        try:
+            await asyncio.gather(*(run_goal(i, goal) for i, goal in enumerate(job.goals)))
+            job.status = "done"
+        except BaseException:
+            job.status = "failed"
+            raise
+        finally:
+            job.finished = time.time()
+            job._changed.set()
+            logger.info("batch finished", extra={"job": job.id, "goals": len(job.goals), "failed": job.failed})
+
+    def _evict(self) -> None:
+        """Forget the oldest finished jobs beyond ``BATCH_MAX_JOBS``."""
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.done]:
+            if len(self.jobs) <= settings.batch_max_jobs:
+                break
+            del self.jobs[job_id]
@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._data: OrderedDict[K, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats.hits + self.stats.misses
+        return self.stats.hits / lookups if lookups else 0.0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.stats.hits += 1
+                return self._data[key]
+            self.stats.misses += 1
+            return None
+
+    def put(self, key: K, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class ResponseCache:
+    """Content-addressed cache for model completions: in-memory LRU over an optional sqlite tier."""
+
+    # How many disk writes between size-bound sweeps of the sqlite tier.
+    _SWEEP_EVERY = 100
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        path: str | None = None,
+        ttl: float = 86400.0,
+        max_disk_entries: int = 100_000,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.stats = CacheStats()
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Futures belong to their loop, so only requests on the same loop are coalesced.
+        self._inflight: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+        self._writes = 0
+        self._db: sqlite3.Connection | None = None
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self.purge_expired()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self._db is not None
+
+    @staticmethod
+    def key(endpoint: str, payload: dict[str, Any]) -> str:
+        body = {k: v for k, v in payload.items() if k != "stream"}
+        raw = json.dumps({"endpoint": endpoint.rstrip("/"), **body}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        value = self._lookup(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            if self.max_entries > 0:
+                self._memory[key] = (now, value)
+                self._memory.move_to_end(key)
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+                    self.stats.evictions += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._writes += 1
+                if self._writes % self._SWEEP_EVERY == 0:
+                    self._sweep_disk()
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[str]]) -> str:
+        """Return the cached value or call ``fetch`` once, sharing it with concurrent identical calls.
+
+        Callers waiting on another call's fetch count as ``coalesced``, not as misses.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            cached = self._lookup(key)
+            if cached is not None:
+                self.stats.hits += 1
+                return cached
+            pending = self._inflight.get((loop, key))
+            if pending is None:
+                break
+            self.stats.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if pending.cancelled():
+                    # The leading request was cancelled, not us: take over.
+                    continue
+                raise
+
+        self.stats.misses += 1
+        future = loop.create_future()
+        self._inflight[(loop, key)] = future
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved so an unawaited failure is not logged twice
+            raise
+        finally:
+            self._inflight.pop((loop, key), None)
+        self.put(key, value)
+        future.set_result(value)
+        return value
+
+    def purge_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        removed = 0
+        with self._lock:
+            for key in [k for k, (ts, _) in self._memory.items() if ts < cutoff]:
+                del self._memory[key]
+                removed += 1
+            if self._db is not None:
+                removed += self._db.execute("DELETE FROM responses WHERE created < ?", (cutoff,)).rowcount
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+
+    def _lookup(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] <= self.ttl:
+                    self._memory.move_to_end(key)
+                    return entry[1]
+                del self._memory[key]
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT value, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if now - created > self.ttl:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            if self.max_entries > 0:
+                self._memory[key] = (created, value)
+                while len(self._memory) > self.max_entries:
+                    self._memory.popitem(last=False)
+            return value
+
+    def _sweep_disk(self) -> None:
+        assert self._db is not None
+        removed = self._db.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        ).rowcount
+        if removed:
+            self.stats.evictions += removed
+            logger.info("response cache evicted", extra={"entries": removed})
+
+
+@lru_cache(maxsize=1)
+def shared_response_cache() -> ResponseCache:
+    """Process-wide cache so identical prompts from different orchestrators share entries."""
+    return ResponseCache(
+        max_entries=settings.model_cache_size,
+        path=settings.model_cache_path or None,
+        ttl=settings.model_cache_ttl,
+    )
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import io
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+TokenCounter = Callable[[str], int]
+
+# Roughly one wordpiece per short word or punctuation mark; long words count per 6 chars.
+_APPROX_TOKEN = re.compile(r"\w{1,6}|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=\S)")
+_HEADING = re.compile(r"#{1,6}\s")
+# No tokenizer produces fewer tokens than chars / this, so longer text is split before counting.
+_MAX_CHARS_PER_TOKEN = 10
+
+
+def approximate_tokens(text: str) -> int:
+    return len(_APPROX_TOKEN.findall(text))
+
+
+@lru_cache(maxsize=8)
+def token_counter(model_name: str | None = None, local_files_only: bool = False) -> TokenCounter:
+    """Token counter for ``model_name``'s tokenizer; a regex approximation without one.
+
+    Loaded once per process, so ingest workers pay for it on their first file only.
+    With ``local_files_only`` the tokenizer comes from the local Hugging Face cache and
+    the network is never tried.
+    """
+    if not model_name:
+        return approximate_tokens
+    try:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+    except Exception:  # noqa: BLE001
+        logger.info("tokenizer unavailable; approximating token counts", extra={"model": model_name})
+        return approximate_tokens
+    return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+
+
+def available_tokenizer(model_name: str | None) -> str:
+    """``model_name`` if its tokenizer loads here (downloading it at most once), else ``""``.
+
+    Ingest resolves this in the parent process and hands the result to its workers,
+    which then load from the local cache or approximate without trying the network.
+    """
+    if model_name and token_counter(model_name) is not approximate_tokens:
+        return model_name
+    return ""
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = 200,
+    overlap_tokens: int = 20,
+    count: TokenCounter = approximate_tokens,
+) -> Iterator[str]:
+    """Lazily split ``text`` into chunks of at most ``max_tokens`` tokens.
+
+    Chunks break on headings, blank lines and sentence ends, in that order of
+    preference; fenced code blocks split only between lines. A heading always starts a
+    new chunk. Consecutive chunks within a section share up to ``overlap_tokens`` of
+    trailing sentences.
+    """
+    window: list[tuple[str, str, int]] = []
+    used = 0
+    fresh = False
+    for kind, block in _blocks(text):
+        if kind == "heading" and window:
+            if fresh:
+                yield _join(window)
+            window, used, fresh = [], 0, False
+        for index, (sep, piece, tokens) in enumerate(_pieces(block, kind, max_tokens, count)):
+            if window and used + tokens > max_tokens:
+                if fresh:
+                    yield _join(window)
+                window = _tail(window, overlap_tokens, max_tokens - tokens)
+                used, fresh = sum(n for _, _, n in window), False
+            window.append(("\n\n" if index == 0 else sep, piece, tokens))
+            used += tokens
+            fresh = True
+    if fresh:
+        yield _join(window)
+
+
+def _blocks(text: str) -> Iterator[tuple[str, str]]:
+    """Yield ``(kind, text)`` for headings, paragraphs and fenced code blocks, line by line."""
+    lines: list[str] = []
+    fence: str | None = None
+    for line in io.StringIO(text):
+        stripped = line.strip()
+        if fence is not None:
+            lines.append(line)
+            if stripped.startswith(fence):
+                yield "code", "".join(lines).strip("\n")
+                lines, fence = [], None
+            continue
+        if stripped.startswith(("```", "~~~")) or not stripped or _HEADING.match(stripped):
+            if lines:
+                yield "paragraph", "".join(lines).strip("\n")
+                lines = []
+            if stripped.startswith(("```", "~~~")):
+                fence = stripped[:3]
+                lines.append(line)
+            elif stripped:
+                yield "heading", stripped
+            continue
+        lines.append(line)
+    if lines:
+        yield ("code" if fence else "paragraph"), "".join(lines).strip("\n")
+
+
+def _pieces(text: str, kind: str, budget: int, count: TokenCounter) -> Iterator[tuple[str, str, int]]:
+    """Yield ``(separator, piece, tokens)`` pieces of ``text`` that each fit ``budget``."""
+    tokens = count(text) if len(text) <= budget * _MAX_CHARS_PER_TOKEN else budget + 1
+    if tokens <= budget or len(text) <= 1:
+        yield "", text, tokens
+        return
+    sep, parts = _split(text, kind)
+    for index, part in enumerate(parts):
+        for inner, (inner_sep, piece, n) in enumerate(_pieces(part, kind, budget, count)):
+            yield (sep if index and not inner else inner_sep), piece, n
+
+
+def _split(text: str, kind: str) -> tuple[str, list[str]]:
+    """Split at the most natural boundary available: lines or sentences, then whitespace."""
+    if kind == "code":
+        lines = text.split("\n")
+        if len(lines) > 1:
+            return "\n", lines
+    else:
+        sentences = _SENTENCE_END.split(text)
+        if len(sentences) > 1:
+            return " ", sentences
+    # Halving (rather than splitting every word) keeps the number of count calls logarithmic.
+    middle = len(text) // 2
+    cut = text.rfind(" ", 0, middle)
+    if cut <= 0:
+        cut = text.find(" ", middle)
+    if cut > 0:
+        return " ", [text[:cut], text[cut + 1 :]]
+    return "", [text[:middle], text[middle:]]
+
+
+def _tail(window: list[tuple[str, str, int]], overlap: int, room: int) -> list[tuple[str, str, int]]:
+    """Trailing pieces of ``window`` worth at most ``overlap`` tokens (and ``room``)."""
+    limit = min(overlap, room)
+    tail: list[tuple[str, str, int]] = []
+    used = 0
+    for sep, piece, tokens in reversed(window):
+        if used + tokens > limit:
+            break
+        tail.insert(0, (sep, piece, tokens))
+        used += tokens
+    return tail
+
+
+def _join(window: list[tuple[str, str, int]]) -> str:
+    return (window[0][1] + "".join(sep + piece for sep, piece, _ in window[1:])).strip()
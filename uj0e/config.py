@@ -14,14 +14,73 @@ def env(key: str, default: str | None = None) -> str:
 @dataclass
 class Settings:
     model_endpoint: str = env("MODEL_ENDPOINT", "http://localhost:8000/v1")
+    model_endpoint_plan: str = env("MODEL_ENDPOINT_PLAN", "")
+    model_endpoint_act: str = env("MODEL_ENDPOINT_ACT", "")
+    model_endpoint_reflect: str = env("MODEL_ENDPOINT_REFLECT", "")
+    model_endpoint_concurrency: int = int(env("MODEL_ENDPOINT_CONCURRENCY", "0"))
+    model_retries: int = int(env("MODEL_RETRIES", "3"))
+    model_retry_backoff: float = float(env("MODEL_RETRY_BACKOFF", "0.5"))
+    model_breaker_failures: int = int(env("MODEL_BREAKER_FAILURES", "3"))
+    model_breaker_cooldown: float = float(env("MODEL_BREAKER_COOLDOWN", "30"))
+    model_http2: bool = env("MODEL_HTTP2", "true").lower() in ("1", "true", "yes")
     model_max_tokens: int = int(env("MODEL_MAX_TOKENS", "512"))
+    model_context_tokens: int = int(env("MODEL_CONTEXT_TOKENS", "2048"))
+    prompt_tokenizer: str = env("PROMPT_TOKENIZER", "")
+    model_timeout: float = float(env("MODEL_TIMEOUT", "30"))
+    agent_max_concurrency: int = int(env("AGENT_MAX_CONCURRENCY", "256"))
+    model_concurrency: int = int(env("MODEL_CONCURRENCY", "8"))
+    batch_concurrency: int = int(env("BATCH_CONCURRENCY", "16"))
+    batch_max_jobs: int = int(env("BATCH_MAX_JOBS", "100"))
+    agent_parallel_steps: bool = env("AGENT_PARALLEL_STEPS", "false").lower() in ("1", "true", "yes")
+    agent_step_concurrency: int = int(env("AGENT_STEP_CONCURRENCY", "4"))
+    agent_checkpoints: str = env("AGENT_CHECKPOINTS", os.path.abspath("data/checkpoints/agent.sqlite"))
+    agent_checkpoint_ttl: float = float(env("AGENT_CHECKPOINT_TTL", str(7 * 86400)))
+    model_cache_size: int = int(env("MODEL_CACHE_SIZE", "512"))
+    model_cache_path: str = env("MODEL_CACHE_PATH", "")
+    model_cache_ttl: float = float(env("MODEL_CACHE_TTL", "86400"))
+    agent_cache_responses: bool = env("AGENT_CACHE_RESPONSES", "false").lower() in ("1", "true", "yes")
     chroma_host: str = env("CHROMA_HOST", "localhost")
     chroma_port: int = int(env("CHROMA_PORT", "8000"))
+    chroma_mode: str = env("CHROMA_MODE", "embedded")
+    chroma_pool_size: int = int(env("CHROMA_POOL_SIZE", "32"))
+    index_state_dir: str = env("INDEX_STATE_DIR", "")
     data_root: str = env("DATA_ROOT", os.path.abspath("data"))
     sandbox_memory: str = env("SANDBOX_MEMORY", "512m")
     sandbox_cpus: str = env("SANDBOX_CPUS", "0.5")
     sandbox_timeout: int = int(env("SANDBOX_TIMEOUT", "30"))
+    sandbox_image: str = env("SANDBOX_IMAGE", "alpine")
+    sandbox_pool_size: int = int(env("SANDBOX_POOL_SIZE", "2"))
+    sandbox_max_uses: int = int(env("SANDBOX_MAX_USES", "20"))
+    sandbox_output_limit: int = int(env("SANDBOX_OUTPUT_LIMIT", str(64 * 1024)))
+    sandbox_output_kill: int = int(env("SANDBOX_OUTPUT_KILL", str(16 * 1024 * 1024)))
+    vector_backend: str = env("VECTOR_BACKEND", "chroma")
+    vector_quantize: bool = env("VECTOR_QUANTIZE", "false").lower() in ("1", "true", "yes")
+    vector_nprobe: int = int(env("VECTOR_NPROBE", "8"))
+    embedding_model: str = env("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    embedding_warmup: bool = env("EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes")
+    retrieval_cache_size: int = int(env("RETRIEVAL_CACHE_SIZE", "1024"))
+    retrieval_mode: str = env("RETRIEVAL_MODE", "hybrid")
+    lexical_max_df: float = float(env("LEXICAL_MAX_DF", "0.5"))
+    ingest_workers: int = int(env("INGEST_WORKERS", str(os.cpu_count() or 1)))
+    ingest_api_workers: int = int(env("INGEST_API_WORKERS", "2"))
+    ingest_batch_size: int = int(env("INGEST_BATCH_SIZE", "256"))
+    chunk_tokens: int = int(env("CHUNK_TOKENS", "200"))
+    chunk_overlap_tokens: int = int(env("CHUNK_OVERLAP_TOKENS", "20"))
+    chunk_tokenizer: str = env("CHUNK_TOKENIZER", env("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+    ingest_file_timeout: float = float(env("INGEST_FILE_TIMEOUT", "120"))
+    ingest_worker_memory: int = int(env("INGEST_WORKER_MEMORY", str(2 * 1024 * 1024 * 1024)))
+    ingest_mmap_threshold: int = int(env("INGEST_MMAP_THRESHOLD", str(16 * 1024 * 1024)))
     audit_log: str = env("AUDIT_LOG", os.path.abspath("logs/audit.log"))
+    audit_flush_interval: float = float(env("AUDIT_FLUSH_INTERVAL", "1.0"))
+    audit_fsync: str = env("AUDIT_FSYNC", "flush")
+    audit_max_bytes: int = int(env("AUDIT_MAX_BYTES", str(50 * 1024 * 1024)))
+    audit_rotate_interval: float = float(env("AUDIT_ROTATE_INTERVAL", "86400"))
+    audit_backups: int = int(env("AUDIT_BACKUPS", "7"))
+    audit_compress: bool = env("AUDIT_COMPRESS", "true").lower() in ("1", "true", "yes")
+    telemetry: bool = env("TELEMETRY", "true").lower() in ("1", "true", "yes")
+    profile_slowest: int = int(env("PROFILE_SLOWEST", "0"))
+    profile_interval: float = float(env("PROFILE_INTERVAL", "0.01"))
+    profile_dir: str = env("PROFILE_DIR", os.path.abspath("logs/profiles"))
 
     @property
     def chroma_url(self) -> str:
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import codecs
+import io
+import re
+from pathlib import Path
+from typing import Callable
+
+# Extractors take the raw file contents (bytes, or an mmap for large files) and the
+# path, and return plain text. They run inside ingest worker processes.
+Extractor = Callable[[bytes, Path], str]
+
+EXTRACTORS: dict[str, Extractor] = {}
+
+# Decode in slices so a memory-mapped file is paged in gradually, not copied whole.
+_DECODE_BLOCK = 1 << 20
+
+_MD_IMAGE = re.compile(r"!\[([^\]]*)\]\([^)]*\)")
+_MD_LINK = re.compile(r"\[([^\]]+)\]\([^)]*\)")
+_MD_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_MD_FRONT_MATTER = re.compile(r"\A---\n.*?\n---\n", re.DOTALL)
+
+
+class ExtractionError(Exception):
+    """A file could not be turned into text; it is counted as failed and skipped."""
+
+
+def register_extractor(*extensions: str) -> Callable[[Extractor], Extractor]:
+    """Register ``fn`` for file extensions (``".pdf"``); later registrations win."""
+
+    def decorator(fn: Extractor) -> Extractor:
+        for ext in extensions:
+            EXTRACTORS[ext.lower()] = fn
+        return fn
+
+    return decorator
+
+
+def supported_extensions() -> tuple[str, ...]:
+    return tuple(sorted(EXTRACTORS))
+
+
+def extract_text(path: Path, data: bytes) -> str:
+    extractor = EXTRACTORS.get(path.suffix.lower())
+    if extractor is None:
+        raise ExtractionError(f"no extractor registered for {path.suffix or 'files without extension'}")
+    return extractor(data, path)
+
+
+@register_extractor(".txt", ".text", ".log", ".rst")
+def extract_plain(data: bytes, path: Path) -> str:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with memoryview(data) as view:
+        parts = [decoder.decode(view[i : i + _DECODE_BLOCK]) for i in range(0, len(view), _DECODE_BLOCK)]
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+
+@register_extractor(".md", ".markdown")
+def extract_markdown(data: bytes, path: Path) -> str:
+    """Markdown minus front matter, comments and link targets; headings and code stay."""
+    text = _MD_FRONT_MATTER.sub("", extract_plain(data, path))
+    text = _MD_COMMENT.sub("", text)
+    text = _MD_IMAGE.sub(r"\1", text)
+    return _MD_LINK.sub(r"\1", text)
+
+
+@register_extractor(".pdf")
+def extract_pdf(data: bytes, path: Path) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:
+        raise ExtractionError("PDF extraction needs pypdf (pip install 'uj0e[pdf]')") from exc
+    try:
+        # An mmap is already a seekable stream; plain bytes need wrapping.
+        reader = PdfReader(data if hasattr(data, "seek") else io.BytesIO(data))
+        if reader.is_encrypted:
+            raise ExtractionError(f"{path} is encrypted")
+        pages = [page.extract_text() or "" for page in reader.pages]
+    except ExtractionError:
+        raise
+    except Exception as exc:  # noqa: BLE001 - pypdf raises plain errors on malformed files
+        raise ExtractionError(f"{path}: {exc}") from exc
+    return "\n\n".join(page.strip() for page in pages if page.strip())
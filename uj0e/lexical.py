@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from .config import settings
+
+# Identifiers, file names, dotted paths and error codes stay whole ("foo_bar.py",
+# "E1234", "a/b:12"); their alphanumeric parts are indexed as well.
+_TOKEN = re.compile(r"[A-Za-z0-9_]+(?:[./:\-][A-Za-z0-9_]+)*")
+_PART = re.compile(r"[A-Za-z0-9]+")
+
+
+def tokenize(text: str) -> Iterator[str]:
+    for match in _TOKEN.finditer(text):
+        token = match.group().lower()
+        yield token
+        parts = _PART.findall(token)
+        if len(parts) > 1 or (parts and parts[0] != token):
+            yield from parts
+
+
+class LexicalIndex:
+    """Incremental BM25 index with array-backed postings in sqlite.
+
+    Each ``add`` writes one posting segment per term: doc numbers as ``array('I')`` and
+    term frequencies as ``array('H')`` blobs, so ingesting never rewrites existing
+    postings. Deleted chunks drop out of the doc table immediately and out of the
+    postings on ``optimize``, which also merges each term's segments into one.
+
+    Search scores postings with numpy and skips query terms found in more than
+    ``max_df`` (``LEXICAL_MAX_DF``) of the chunks once the index has
+    ``_CUTOFF_MIN_DOCS`` of them, so a query costs the postings of its rare terms.
+    Doc lengths are kept in memory and updated in place by local writes.
+    """
+
+    # In small collections every term is cheap and a common one can still decide the ranking.
+    _CUTOFF_MIN_DOCS = 1000
+
+    def __init__(self, path: str | Path, k1: float = 1.2, b: float = 0.75, max_df: float | None = None) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self.max_df = settings.lexical_max_df if max_df is None else max_df
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs (doc INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT UNIQUE NOT NULL, "
+            "length INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS postings (term TEXT NOT NULL, segment INTEGER NOT NULL, "
+            "docs BLOB NOT NULL, tfs BLOB NOT NULL, PRIMARY KEY (term, segment))"
+        )
+        self._state: int | None = None
+        # Doc length by doc number (0 for deleted docs), with spare capacity for appends.
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._rows = 0
+        self._last_doc = 0
+        self._alive = 0
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._alive
+
+    def add(self, ids: list[str], documents: list[str]) -> None:
+        with self._lock:
+            self._refresh()
+            existing = self._existing(ids)
+            postings: dict[str, tuple[array, array]] = defaultdict(lambda: (array("I"), array("H")))
+            added: list[tuple[int, int]] = []
+            self._db.execute("BEGIN")
+            try:
+                for chunk_id, document in zip(ids, documents):
+                    if chunk_id in existing:
+                        continue
+                    counts = Counter(tokenize(document))
+                    length = sum(counts.values())
+                    doc = self._db.execute("INSERT INTO docs (id, length) VALUES (?, ?)", (chunk_id, length)).lastrowid
+                    added.append((doc, length))
+                    for term, tf in counts.items():
+                        docs, tfs = postings[term]
+                        docs.append(doc)
+                        tfs.append(min(tf, 65535))
+                segment = self._db.execute("SELECT COALESCE(MAX(segment), -1) + 1 FROM postings").fetchone()[0]
+                self._db.executemany(
+                    "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                    ((term, segment, docs.tobytes(), tfs.tobytes()) for term, (docs, tfs) in postings.items()),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._track(added)
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            self._refresh()
+            for start in range(0, len(ids), 500):
+                part = ids[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                removed = self._db.execute(f"SELECT doc FROM docs WHERE id IN ({placeholders})", part).fetchall()
+                self._db.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", part)
+                for (doc,) in removed:
+                    if doc < len(self._lengths):
+                        length = int(self._lengths[doc])
+                        self._lengths[doc] = 0
+                        self._alive -= 1 if length else 0
+                        self._total_length -= length
+                    self._rows -= 1
+
+    def search(self, query: str, k: int = 4) -> list[tuple[str, float]]:
+        """Top ``k`` chunk ids by BM25 score for the query's terms."""
+        terms = sorted(set(tokenize(query)))
+        if not terms or k <= 0:
+            return []
+        with self._lock:
+            self._refresh()
+            if not self._alive:
+                return []
+            terms = self._selective(terms)
+            lengths = self._lengths
+            average = self._total_length / self._alive
+            by_term: dict[str, tuple[list[bytes], list[bytes]]] = defaultdict(lambda: ([], []))
+            sql = f"SELECT term, docs, tfs FROM postings WHERE term IN ({','.join('?' * len(terms))})"
+            for term, docs_blob, tfs_blob in self._db.execute(sql, terms):
+                by_term[term][0].append(docs_blob)
+                by_term[term][1].append(tfs_blob)
+            matched_docs, matched_scores = [], []
+            for docs_blobs, tfs_blobs in by_term.values():
+                docs = np.frombuffer(b"".join(docs_blobs), dtype=np.uint32)
+                tfs = np.frombuffer(b"".join(tfs_blobs), dtype=np.uint16).astype(np.float64)
+                # Postings of deleted docs stay until ``optimize``; docs past ``lengths``
+                # were committed by another process after the last refresh.
+                live = docs < len(lengths)
+                live[live] = lengths[docs[live]] > 0
+                docs, tfs = docs[live], tfs[live]
+                if not len(docs):
+                    continue
+                idf = math.log(1 + (self._alive - len(docs) + 0.5) / (len(docs) + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * lengths[docs] / average)
+                matched_docs.append(docs)
+                matched_scores.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+            if not matched_docs:
+                return []
+            candidates, slots = np.unique(np.concatenate(matched_docs), return_inverse=True)
+            scores = np.bincount(slots, weights=np.concatenate(matched_scores))
+            if len(scores) > k:
+                best = np.argpartition(-scores, k - 1)[:k]
+            else:
+                best = np.arange(len(scores))
+            best = best[np.lexsort((candidates[best], -scores[best]))]
+            top = [(int(candidates[i]), float(scores[i])) for i in best]
+            placeholders = ",".join("?" * len(top))
+            rows = self._db.execute(f"SELECT doc, id FROM docs WHERE doc IN ({placeholders})", [d for d, _ in top])
+            names = dict(rows.fetchall())
+        return [(names[doc], score) for doc, score in top if doc in names]
+
+    def _selective(self, terms: list[str]) -> list[str]:
+        """Drop terms in more than ``max_df`` of the docs, keeping the rarest if all are common."""
+        if self.max_df <= 0 or self._alive < self._CUTOFF_MIN_DOCS:
+            return terms
+        sql = (
+            f"SELECT term, SUM(LENGTH(docs)) / 4 FROM postings WHERE term IN ({','.join('?' * len(terms))}) "
+            "GROUP BY term"
+        )
+        # Counted from blob sizes, so postings of deleted docs are included until ``optimize``.
+        df = dict(self._db.execute(sql, terms).fetchall())
+        if not df:
+            return terms
+        selective = [term for term, count in df.items() if count <= self.max_df * self._alive]
+        return selective or [min(df, key=df.__getitem__)]
+
+    def optimize(self) -> None:
+        """Merge each term's segments and drop postings of deleted chunks."""
+        with self._lock:
+            self._refresh()
+            lengths = self._lengths
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("CREATE TEMP TABLE merged (term TEXT PRIMARY KEY, docs BLOB, tfs BLOB)")
+                current: str | None = None
+                docs_blobs: list[bytes] = []
+                tfs_blobs: list[bytes] = []
+                rows = self._db.execute("SELECT term, docs, tfs FROM postings ORDER BY term, segment").fetchall()
+                for term, docs_blob, tfs_blob in rows + [(None, b"", b"")]:
+                    if term != current and current is not None:
+                        docs = np.frombuffer(b"".join(docs_blobs), dtype=np.uint32)
+                        tfs = np.frombuffer(b"".join(tfs_blobs), dtype=np.uint16)
+                        keep = docs < len(lengths)
+                        keep[keep] = lengths[docs[keep]] > 0
+                        if keep.any():
+                            merged = (current, docs[keep].tobytes(), tfs[keep].tobytes())
+                            self._db.execute("INSERT INTO merged VALUES (?, ?, ?)", merged)
+                        docs_blobs, tfs_blobs = [], []
+                    current = term
+                    docs_blobs.append(docs_blob)
+                    tfs_blobs.append(tfs_blob)
+                self._db.execute("DELETE FROM postings")
+                self._db.execute("INSERT INTO postings SELECT term, 0, docs, tfs FROM merged")
+                self._db.execute("DROP TABLE merged")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("VACUUM")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM docs")
+            self._db.execute("DELETE FROM postings")
+            self._reset()
+
+    def _existing(self, ids: list[str]) -> set[str]:
+        found: set[str] = set()
+        for start in range(0, len(ids), 500):
+            part = ids[start : start + 500]
+            rows = self._db.execute(f"SELECT id FROM docs WHERE id IN ({','.join('?' * len(part))})", part)
+            found.update(row[0] for row in rows)
+        return found
+
+    def _refresh(self) -> None:
+        """Catch up with writes another process committed since the last call.
+
+        Docs are numbered by AUTOINCREMENT, so new ones are exactly those past
+        ``_last_doc``. Deletes leave no such trace: when the row count does not add up,
+        the lengths are reloaded from scratch.
+        """
+        version = self._db.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._state:
+            return
+        rows = self._db.execute("SELECT doc, length FROM docs WHERE doc > ?", (self._last_doc,)).fetchall()
+        (count,) = self._db.execute("SELECT COUNT(*) FROM docs").fetchone()
+        if count != self._rows + len(rows):
+            self._reset()
+            rows = self._db.execute("SELECT doc, length FROM docs").fetchall()
+        self._track(rows)
+        self._state = version
+
+    def _track(self, rows: list[tuple[int, int]]) -> None:
+        """Record the lengths of newly added docs."""
+        if not rows:
+            return
+        last = max(doc for doc, _ in rows)
+        if last >= len(self._lengths):
+            grown = np.zeros(max(last + 1, 2 * len(self._lengths)), dtype=np.uint32)
+            grown[: len(self._lengths)] = self._lengths
+            self._lengths = grown
+        docs = np.fromiter((doc for doc, _ in rows), dtype=np.int64, count=len(rows))
+        lengths = np.fromiter((length for _, length in rows), dtype=np.uint32, count=len(rows))
+        # Zero marks a deleted (or empty) chunk; empty chunks can never match anyway.
+        self._lengths[docs] = lengths
+        self._rows += len(rows)
+        self._last_doc = max(self._last_doc, last)
+        self._alive += int(np.count_nonzero(lengths))
+        self._total_length += int(lengths.sum(dtype=np.int64))
+
+    def _reset(self) -> None:
+        self._lengths = np.zeros(0, dtype=np.uint32)
+        self._rows = self._last_doc = self._alive = self._total_length = 0
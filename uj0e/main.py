@@ -1,23 +1,60 @@
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
+import threading
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from fastapi import Body, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, generate_latest
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, SummaryMetricFamily
 from starlette.responses import Response
 
+from .batch import BatchJob, BatchRunner
+from .cache import shared_response_cache
 from .config import settings
-from .orchestrator import AgentOrchestrator
-from .vector import VectorStore, iter_paths
+from .model_client import aclose_shared_clients
+from .orchestrator import AgentOrchestrator, CheckpointingDisabled, state_payload
+from .pipeline import iter_paths
+from .routing import shared_router
+from .telemetry import registry
+from .vector import vector_registry
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="UJOE Agent API")
+
+def _log_warmup_failure(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("embedding warmup failed", exc_info=future.exception())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Warm the embedder on start-up; close checkpoints, sandboxes, audit log and clients on shutdown."""
+    warmup = None
+    if settings.embedding_warmup:
+        # Load the shared embedding model in the background instead of on the first request.
+        warmup = asyncio.get_running_loop().run_in_executor(None, vector_registry.warm)
+        warmup.add_done_callback(_log_warmup_failure)
+    yield
+    if warmup is not None:
+        # A model load cannot be interrupted; let it finish before tearing down.
+        await asyncio.wait([warmup])
+    await orchestrator.aclose()
+    if orchestrator.sandbox.pool is not None:
+        await asyncio.to_thread(orchestrator.sandbox.pool.close)
+    await asyncio.to_thread(orchestrator.audit.close)
+    await aclose_shared_clients()
+
+
+app = FastAPI(title="UJOE Agent API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,43 +65,249 @@ app.add_middleware(
 FastAPIInstrumentor.instrument_app(app)
 
 orchestrator = AgentOrchestrator()
-registry = CollectorRegistry()
 REQUEST_COUNTER = Counter("agent_requests", "Total agent runs", registry=registry)
 FAILURES = Counter("agent_failures", "Agent failures", registry=registry)
-ITER_GAUGE = Gauge("agent_iterations", "Iterations used", registry=registry)
+batches = BatchRunner(orchestrator, on_failure=FAILURES.inc)
+_ingest_lock = threading.Lock()
+
+
+class ResponseCacheCollector:
+    """Exposes the shared model response cache counters at scrape time."""
+
+    def collect(self):
+        stats = shared_response_cache().stats
+        for name, doc in (
+            ("hits", "Model responses served from cache"),
+            ("misses", "Model responses fetched upstream"),
+            ("coalesced", "Model requests merged into an identical in-flight request"),
+            ("evictions", "Model cache entries evicted"),
+        ):
+            yield CounterMetricFamily(f"model_cache_{name}", doc, value=getattr(stats, name))
+
+
+class SandboxPoolCollector:
+    """Exposes warm sandbox pool usage: queue wait, reuse and recycling."""
+
+    def collect(self):
+        pool = orchestrator.sandbox.pool
+        if pool is None:
+            return
+        stats = pool.stats
+        yield SummaryMetricFamily(
+            "sandbox_pool_wait_seconds",
+            "Time spent waiting for a warm sandbox container",
+            count_value=stats.acquisitions,
+            sum_value=stats.wait_seconds,
+        )
+        for name, doc, value in (
+            ("reuses", "Commands run in an already-used container", stats.reuses),
+            ("recycled", "Containers replaced after max uses or a dirty exit", stats.recycled),
+            ("started", "Sandbox containers started", stats.started),
+            ("start_failures", "Failed sandbox container starts (retried with backoff)", stats.start_failures),
+        ):
+            yield CounterMetricFamily(f"sandbox_pool_{name}", doc, value=value)
+        yield GaugeMetricFamily("sandbox_pool_idle", "Warm containers waiting for work", value=pool.idle)
+
+
+class RetrievalCacheCollector:
+    """Exposes the orchestrator's query-embedding and retrieval result caches."""
+
+    def collect(self):
+        vector = orchestrator.vector
+        caches = (("retrieval_cache", vector.result_cache), ("query_embedding_cache", vector.embedding_cache))
+        for prefix, cache in caches:
+            yield CounterMetricFamily(f"{prefix}_hits", "Cache hits", value=cache.stats.hits)
+            yield CounterMetricFamily(f"{prefix}_misses", "Cache misses", value=cache.stats.misses)
+            yield CounterMetricFamily(f"{prefix}_evictions", "LRU evictions", value=cache.stats.evictions)
+            yield GaugeMetricFamily(f"{prefix}_hit_rate", "Hits over lookups since start", value=cache.hit_rate)
+
+
+class ModelEndpointCollector:
+    """Exposes per-endpoint routing state: in-flight requests, EWMA latency and circuit state."""
+
+    def collect(self):
+        outstanding = GaugeMetricFamily("model_endpoint_outstanding", "Requests in flight", labels=["endpoint"])
+        latency = GaugeMetricFamily("model_endpoint_latency_ewma_seconds", "Smoothed latency", labels=["endpoint"])
+        circuit = GaugeMetricFamily(
+            "model_endpoint_circuit_open", "1 unless the circuit is closed", labels=["endpoint"]
+        )
+        errors = CounterMetricFamily("model_endpoint_errors", "Retryable failures", labels=["endpoint"])
+        for row in shared_router().snapshot():
+            label = [f"{row['url']}#{row['model']}"]
+            outstanding.add_metric(label, row["outstanding"])
+            latency.add_metric(label, row["ewma_seconds"] or 0.0)
+            circuit.add_metric(label, row["state"] != "closed")
+            errors.add_metric(label, row["errors"])
+        yield from (outstanding, latency, circuit, errors)
+
+
+class VectorRegistryCollector:
+    """Exposes the memory footprint of the shared embedding models."""
+
+    def collect(self):
+        footprint = vector_registry.footprint()
+        params = GaugeMetricFamily("embedding_model_param_bytes", "Parameter bytes of loaded models", labels=["model"])
+        for model, size in footprint["models"].items():
+            params.add_metric([model], size)
+        yield params
+        yield GaugeMetricFamily(
+            "agent_process_rss_bytes", "Resident memory of this worker", value=footprint["rss_bytes"]
+        )
+
+
+registry.register(ResponseCacheCollector())
+registry.register(VectorRegistryCollector())
+registry.register(RetrievalCacheCollector())
+registry.register(SandboxPoolCollector())
+registry.register(ModelEndpointCollector())
 
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok", "model": settings.model_endpoint, "vector": settings.chroma_url}
+    return {
+        "status": "ok",
+        "model": settings.model_endpoint,
+        "model_endpoints": shared_router().snapshot(),
+        "vector": settings.chroma_url if vector_registry.remote else "embedded",
+        "vector_status": vector_registry.heartbeat(),
+        "vector_memory": vector_registry.footprint(),
+    }
 
 
 @app.post("/agent/run")
-def run_agent(goal: str = Body(..., embed=True), max_iters: int = Body(3, embed=True)) -> dict:
+async def run_agent(
+    goal: str = Body(..., embed=True),
+    max_iters: int = Body(3, embed=True),
+    parallel: Optional[bool] = Body(None, embed=True),
+) -> dict:
     try:
         REQUEST_COUNTER.inc()
-        state = orchestrator.run(goal=goal, max_iters=max_iters)
-        ITER_GAUGE.set(state.iterations)
+        state = await orchestrator.arun(goal=goal, max_iters=max_iters, parallel=parallel)
         if not state.completed:
             FAILURES.inc()
-        return {
-            "goal": state.goal,
-            "history": state.history,
-            "iterations": state.iterations,
-            "completed": state.completed,
-            "last_result": state.last_result.output if state.last_result else None,
-        }
+        return state_payload(state)
     except Exception as exc:  # noqa: BLE001
         FAILURES.inc()
         logger.exception("agent run failed")
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@app.post("/agent/run/{run_id}/resume")
+async def resume_agent(
+    run_id: str,
+    feedback: Optional[str] = Body(None, embed=True),
+    extra_iters: int = Body(1, embed=True),
+) -> dict:
+    """Continue a checkpointed run, e.g. after a crash or with failing test output as feedback."""
+    try:
+        REQUEST_COUNTER.inc()
+        state = await orchestrator.aresume(run_id, feedback=feedback, extra_iters=extra_iters)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown run: {run_id}") from None
+    except CheckpointingDisabled as exc:
+        raise HTTPException(status_code=409, detail=str(exc)) from exc
+    except Exception as exc:  # noqa: BLE001
+        FAILURES.inc()
+        logger.exception("agent resume failed", extra={"run_id": run_id})
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    if not state.completed:
+        FAILURES.inc()
+    return state_payload(state)
+
+
+@app.post("/agent/run/stream")
+async def run_agent_stream(
+    goal: str = Body(..., embed=True),
+    max_iters: int = Body(3, embed=True),
+    parallel: Optional[bool] = Body(None, embed=True),
+) -> StreamingResponse:
+    """Stream a run as newline-delimited JSON events (token, tool_output, tool, done, error)."""
+
+    async def events():
+        REQUEST_COUNTER.inc()
+        try:
+            async for event in orchestrator.astream(goal=goal, max_iters=max_iters, parallel=parallel):
+                if event["type"] == "done":
+                    state = event["state"]
+                    if not state.completed:
+                        FAILURES.inc()
+                    event = {"type": "done", "result": state_payload(state)}
+                yield json.dumps(event) + "\n"
+        except Exception as exc:  # noqa: BLE001
+            FAILURES.inc()
+            logger.exception("agent stream failed")
+            yield json.dumps({"type": "error", "detail": str(exc)}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+def _batch_event(event: dict) -> dict:
+    if "error" in event:
+        return {"type": "error", "index": event["index"], "goal": event["goal"], "detail": event["error"]}
+    return {"type": "result", "index": event["index"], "goal": event["goal"], "result": state_payload(event["state"])}
+
+
+def _batch_status(job: BatchJob, since: int = 0) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "total": len(job.goals),
+        "completed": len(job.results),
+        "failed": job.failed,
+        "results": [_batch_event(event) for event in job.results[since:]],
+    }
+
+
+@app.post("/agent/batch")
+async def run_agent_batch(
+    goals: list[str] = Body(..., embed=True),
+    max_iters: int = Body(3, embed=True),
+    parallel: Optional[bool] = Body(None, embed=True),
+    stream: bool = Body(True, embed=True),
+):
+    """Run many goals as one job.
+
+    With ``stream`` (default) results come back as NDJSON in completion order: a ``job``
+    line, one ``result``/``error`` line per goal, then ``done``. Otherwise the job id is
+    returned at once and ``GET /agent/batch/{job_id}`` is polled.
+    """
+    if not goals:
+        raise HTTPException(status_code=400, detail="goals must not be empty")
+    REQUEST_COUNTER.inc(len(goals))
+    job = batches.submit(goals, max_iters=max_iters, parallel=parallel)
+    if not stream:
+        return {"job_id": job.id, "status": job.status, "total": len(goals)}
+
+    async def events():
+        yield json.dumps({"type": "job", "job_id": job.id, "total": len(goals)}) + "\n"
+        async for event in batches.stream(job):
+            yield json.dumps(_batch_event(event)) + "\n"
+        yield json.dumps({"type": "done", "job_id": job.id, "status": job.status, "failed": job.failed}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.get("/agent/batch/{job_id}")
+async def get_agent_batch(job_id: str, since: int = 0) -> dict:
+    """Job status plus results completed so far; pass ``since`` to skip ones already seen."""
+    try:
+        job = batches.get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"unknown batch job: {job_id}") from None
+    return _batch_status(job, since)
+
+
 @app.post("/ingest")
 def ingest(path: Optional[str] = Body(None, embed=True), collection: str = Body("knowledge", embed=True)) -> dict:
+    """Ingest on ``INGEST_API_WORKERS`` processes, one request at a time per API worker.
+
+    Bulk loads belong in ``scripts/ingest.py``, which uses every core; here the pool
+    would compete with the agent runs served by the same host.
+    """
     target = Path(path or settings.data_root)
-    store = VectorStore(collection=collection)
-    added = store.ingest_files(iter_paths(target))
+    store = vector_registry.store(collection=collection)
+    with _ingest_lock:
+        added = store.ingest_files(iter_paths(target), workers=settings.ingest_api_workers)
     return {"added_chunks": added}
 
 
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    sha256: str
+    chunk_ids: list[str] = field(default_factory=list)
+
+    def matches(self, st: os.stat_result) -> bool:
+        return (self.size, self.mtime_ns, self.inode) == (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class IngestManifest:
+    """Local record of ingested files so unchanged ones are skipped with a single stat call."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, "
+            "inode INTEGER NOT NULL, sha256 TEXT NOT NULL, chunk_ids TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_sha256 ON files (sha256)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+    def generation(self) -> int:
+        """Counter bumped on every write to the collection, shared by all processes."""
+        with self._lock:
+            return self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'generation'")
+            return self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()[0]
+
+    def get(self, path: str) -> ManifestEntry | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM files WHERE path = ?", (path,)).fetchone()
+        return self._entry(row) if row else None
+
+    def entries(self) -> Iterator[ManifestEntry]:
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM files").fetchall()
+        for row in rows:
+            yield self._entry(row)
+
+    def snapshot(self) -> dict[str, tuple[int, int, int]]:
+        """Map of path -> (size, mtime_ns, inode), loaded once per run for stat-only checks."""
+        with self._lock:
+            rows = self._db.execute("SELECT path, size, mtime_ns, inode FROM files").fetchall()
+        return {path: (size, mtime_ns, inode) for path, size, mtime_ns, inode in rows}
+
+    def referenced(self, shas: Iterable[str]) -> set[str]:
+        """Subset of ``shas`` still owned by at least one tracked file."""
+        shas = list(shas)
+        found: set[str] = set()
+        with self._lock:
+            for start in range(0, len(shas), 500):
+                part = shas[start : start + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._db.execute(f"SELECT DISTINCT sha256 FROM files WHERE sha256 IN ({placeholders})", part)
+                found.update(row[0] for row in rows.fetchall())
+        return found
+
+    def stale(self, live: set[str] | None = None, root: str | Path | None = None) -> list[ManifestEntry]:
+        """Entries whose file is gone, or which sit under ``root`` but were not in the ``live`` walk."""
+        prefix = os.path.join(os.path.abspath(root), "") if root is not None else None
+        stale: list[ManifestEntry] = []
+        for entry in self.entries():
+            in_scope = live is not None and prefix is not None and entry.path.startswith(prefix)
+            if (in_scope and entry.path not in live) or not os.path.exists(entry.path):
+                stale.append(entry)
+        return stale
+
+    def record_many(self, entries: Iterable[ManifestEntry]) -> None:
+        rows = [(e.path, e.size, e.mtime_ns, e.inode, e.sha256, json.dumps(e.chunk_ids)) for e in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    def remove(self, paths: Iterable[str]) -> None:
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+            self._db.execute("COMMIT")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM files")
+
+    def vacuum(self) -> None:
+        with self._lock:
+            self._db.execute("VACUUM")
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _entry(row: tuple) -> ManifestEntry:
+        path, size, mtime_ns, inode, sha256, chunk_ids = row
+        return ManifestEntry(path, size, mtime_ns, inode, sha256, json.loads(chunk_ids))
+
+
+def orphaned_chunk_ids(chunks: Iterable[tuple[str, dict | None]], entries: Iterable[ManifestEntry]) -> list[str]:
+    """Chunk ids no tracked file accounts for.
+
+    A chunk survives if its fingerprint belongs to a tracked file. Otherwise it is an
+    orphan when its source is tracked under a different hash (superseded) or no longer
+    exists; untracked sources that still exist predate the manifest and are kept.
+    """
+    by_path: dict[str, str] = {}
+    live_shas: set[str] = set()
+    for entry in entries:
+        by_path[entry.path] = entry.sha256
+        live_shas.add(entry.sha256)
+    orphans: list[str] = []
+    for chunk_id, metadata in chunks:
+        if chunk_id.rsplit(":", 1)[0] in live_shas:
+            continue
+        source = (metadata or {}).get("source")
+        if source is None or os.path.abspath(source) in by_path or not os.path.exists(source):
+            orphans.append(chunk_id)
+    return orphans
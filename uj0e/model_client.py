@@ -1,43 +1,297 @@
 from __future__ import annotations
 
+import asyncio
+import importlib.util
+import json
 import logging
-from typing import Iterable, List
+import time
+import weakref
+from functools import lru_cache
+from typing import AsyncIterator, Iterable, List
 
 import httpx
-from tenacity import retry, stop_after_attempt, wait_fixed
 
+from .cache import ResponseCache, shared_response_cache
 from .config import settings
+from .routing import Endpoint, EndpointPool, ModelRouter, is_retryable, shared_router
+from .scheduling import FairLimiter
+from .telemetry import record_tokens, track
 
 logger = logging.getLogger(__name__)
 
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+
+
+def _chat_payload(messages: List[dict], max_tokens: int | None, stream: bool = False) -> dict:
+    # The model name is filled in per endpoint when the request is sent.
+    return {
+        "messages": messages,
+        "max_tokens": max_tokens or settings.model_max_tokens,
+        "stream": stream,
+    }
+
+
+def _chat_content(data: dict) -> str:
+    return data.get("choices", [{}])[0].get("message", {}).get("content", "")
+
+
+def _record_usage(data: dict, span) -> None:
+    usage = data.get("usage") or {}
+    record_tokens(usage.get("prompt_tokens"), usage.get("completion_tokens"), span)
+
+
+def _sse_delta(line: str) -> str | None:
+    """Return the content delta of one SSE line, "" for non-content lines, None at [DONE]."""
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:") :].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data)
+    except json.JSONDecodeError:
+        logger.warning("skipping malformed stream chunk", extra={"chunk": data})
+        return ""
+    choices = chunk.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def _client_options() -> dict:
+    return {
+        "timeout": settings.model_timeout,
+        "limits": httpx.Limits(
+            max_connections=settings.agent_max_concurrency,
+            max_keepalive_connections=settings.agent_max_concurrency,
+            keepalive_expiry=60.0,
+        ),
+        # HTTP/2 needs the optional h2 package and is only negotiated over TLS.
+        "http2": settings.model_http2 and importlib.util.find_spec("h2") is not None,
+    }
+
+
+@lru_cache(maxsize=1)
+def shared_client() -> httpx.Client:
+    """Process-wide blocking client, so every ModelClient reuses the same keep-alive connections."""
+    return httpx.Client(**_client_options())
+
+
+def shared_async_client() -> httpx.AsyncClient:
+    """Async client shared by every AsyncModelClient on the running loop.
+
+    Connections belong to the loop that opened them, so each loop gets its own pool.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(**_client_options())
+    return client
+
+
+async def aclose_shared_clients() -> None:
+    """Close the running loop's shared async client and the blocking one, e.g. at shutdown."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+    if shared_client.cache_info().currsize:
+        shared_client().close()
+        shared_client.cache_clear()
+
 
 class ModelClient:
-    """Thin wrapper around an OpenAI-compatible chat/completions endpoint."""
+    """Thin wrapper around OpenAI-compatible chat/completions endpoints.
 
-    def __init__(self, endpoint: str | None = None, timeout: float = 30.0) -> None:
+    ``endpoint`` is a ``MODEL_ENDPOINT``-style list; requests are balanced and failed over
+    across it by the shared router (see ``uj0e.routing``).
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        timeout: float | None = None,
+        cache: ResponseCache | None = None,
+        client: httpx.Client | None = None,
+    ) -> None:
         self.endpoint = endpoint or settings.model_endpoint
-        self.timeout = timeout
-        self._client = httpx.Client(timeout=timeout)
-
-    @retry(wait=wait_fixed(2), stop=stop_after_attempt(3))
-    def chat(self, messages: List[dict], max_tokens: int | None = None) -> str:
-        url = f"{self.endpoint.rstrip('/')}/chat/completions"
-        payload = {
-            "model": "local-model",
-            "messages": messages,
-            "max_tokens": max_tokens or settings.model_max_tokens,
-            "stream": False,
-        }
-        logger.debug("Sending chat payload to model", extra={"payload": payload})
-        response = self._client.post(url, json=payload)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("choices", [{}])[0].get("message", {}).get("content", "")
+        self.timeout = timeout or settings.model_timeout
+        self.cache = cache or shared_response_cache()
+        self.pool = shared_router().pool(self.endpoint)
+        self._client = client or shared_client()
+
+    def chat(self, messages: List[dict], max_tokens: int | None = None, use_cache: bool = True) -> str:
+        payload = _chat_payload(messages, max_tokens)
+        if not use_cache:
+            return self._chat(payload)
+        key = self.cache.key(self.pool.key, payload)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        content = self._chat(payload)
+        self.cache.put(key, content)
+        return content
+
+    def _chat(self, payload: dict) -> str:
+        return self.pool.call_sync(lambda endpoint: self._post_chat(endpoint, payload))
+
+    def _post_chat(self, endpoint: Endpoint, payload: dict) -> str:
+        logger.debug("Sending chat payload to model", extra={"payload": payload, "endpoint": endpoint.url})
+        with track("model", "chat", endpoint=endpoint.url) as span:
+            response = self._client.post(
+                endpoint.path("chat/completions"), json={"model": endpoint.model, **payload}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            _record_usage(data, span)
+        return _chat_content(data)
 
     def embed(self, inputs: Iterable[str]) -> list[list[float]]:
-        url = f"{self.endpoint.rstrip('/')}/embeddings"
         payload = {"input": list(inputs), "model": "embedding-model"}
-        response = self._client.post(url, json=payload)
-        response.raise_for_status()
-        data = response.json()
+        return self.pool.call_sync(lambda endpoint: self._post_embed(endpoint, payload))
+
+    def _post_embed(self, endpoint: Endpoint, payload: dict) -> list[list[float]]:
+        with track("model", "embed", endpoint=endpoint.url, inputs=len(payload["input"])) as span:
+            response = self._client.post(endpoint.path("embeddings"), json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            _record_usage(data, span)
+        return [row["embedding"] for row in data.get("data", [])]
+
+
+class AsyncModelClient:
+    """Non-blocking counterpart of ModelClient for the async agent pipeline.
+
+    Without an explicit ``endpoint``, each call is routed by its ``phase``: plan, act and
+    reflect may use their own pools (``MODEL_ENDPOINT_PLAN`` etc.).
+    """
+
+    def __init__(
+        self,
+        endpoint: str | None = None,
+        timeout: float | None = None,
+        client: httpx.AsyncClient | None = None,
+        cache: ResponseCache | None = None,
+        router: ModelRouter | None = None,
+    ) -> None:
+        self.endpoint = endpoint
+        self.timeout = timeout or settings.model_timeout
+        self.cache = cache or shared_response_cache()
+        self.router = router or shared_router()
+        self._own_client = client
+        # Upstream calls (not cache hits) take a slot; lanes keep batches from starving others.
+        self.limiter = FairLimiter(settings.model_concurrency)
+
+    @property
+    def _client(self) -> httpx.AsyncClient:
+        return self._own_client or shared_async_client()
+
+    def pool(self, phase: str | None = None) -> EndpointPool:
+        if self.endpoint:
+            return self.router.pool(self.endpoint)
+        return self.router.for_phase(phase)
+
+    async def chat(
+        self, messages: List[dict], max_tokens: int | None = None, use_cache: bool = True, phase: str | None = None
+    ) -> str:
+        payload = _chat_payload(messages, max_tokens)
+        pool = self.pool(phase)
+        if not use_cache:
+            return await self._limited_chat(pool, payload)
+        key = self.cache.key(pool.key, payload)
+        return await self.cache.get_or_fetch(key, lambda: self._limited_chat(pool, payload))
+
+    async def _limited_chat(self, pool: EndpointPool, payload: dict) -> str:
+        async with self.limiter.slot():
+            return await pool.call(lambda endpoint: self._post_chat(endpoint, payload))
+
+    async def _post_chat(self, endpoint: Endpoint, payload: dict) -> str:
+        logger.debug("Sending chat payload to model", extra={"payload": payload, "endpoint": endpoint.url})
+        with track("model", "chat", endpoint=endpoint.url) as span:
+            response = await self._client.post(
+                endpoint.path("chat/completions"), json={"model": endpoint.model, **payload}, timeout=self.timeout
+            )
+            response.raise_for_status()
+            data = response.json()
+            _record_usage(data, span)
+        return _chat_content(data)
+
+    async def stream_chat(
+        self, messages: List[dict], max_tokens: int | None = None, use_cache: bool = True, phase: str | None = None
+    ) -> AsyncIterator[str]:
+        """Yield completion tokens as the server streams them.
+
+        A stream fails over to another endpoint only until its first token; after that
+        it cannot be replayed safely. Closing the generator early (e.g. on client
+        disconnect) closes the upstream connection. A cached completion is replayed as a
+        single chunk; only complete streams are cached.
+        """
+        payload = _chat_payload(messages, max_tokens, stream=True)
+        pool = self.pool(phase)
+        key = self.cache.key(pool.key, payload)
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                yield cached
+                return
+        parts: list[str] = []
+        # Not made the current span: the context cannot be carried across yields.
+        async with self.limiter.slot():
+            with track("model", "stream_chat", current=False) as span:
+                async for delta in self._stream(pool, payload):
+                    parts.append(delta)
+                    yield delta
+                # Servers stream about one token per delta and send no usage block by default.
+                record_tokens(completion=len(parts), span=span)
+        if use_cache:
+            self.cache.put(key, "".join(parts))
+
+    async def _stream(self, pool: EndpointPool, payload: dict) -> AsyncIterator[str]:
+        tried: set[Endpoint] = set()
+        for attempt in range(pool.attempts):
+            endpoint = await pool.acquire(tried)
+            start = time.perf_counter()
+            streamed = False
+            ok: bool | None = None
+            try:
+                async with self._client.stream(
+                    "POST",
+                    endpoint.path("chat/completions"),
+                    json={"model": endpoint.model, **payload},
+                    timeout=self.timeout,
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        delta = _sse_delta(line)
+                        if delta is None:
+                            break
+                        if delta:
+                            streamed = True
+                            yield delta
+                ok = True
+            except Exception as exc:  # noqa: BLE001 - classified and re-raised below
+                if not is_retryable(exc):
+                    raise
+                ok = False
+                if streamed or attempt + 1 == pool.attempts:
+                    raise
+                delay = pool.failed_over(endpoint, exc, tried, attempt)
+            finally:
+                pool.release(endpoint, ok, time.perf_counter() - start if ok else None)
+            if ok:
+                return
+            await asyncio.sleep(delay)
+
+    async def embed(self, inputs: Iterable[str]) -> list[list[float]]:
+        payload = {"input": list(inputs), "model": "embedding-model"}
+        return await self.pool().call(lambda endpoint: self._post_embed(endpoint, payload))
+
+    async def _post_embed(self, endpoint: Endpoint, payload: dict) -> list[list[float]]:
+        with track("model", "embed", endpoint=endpoint.url, inputs=len(payload["input"])) as span:
+            response = await self._client.post(endpoint.path("embeddings"), json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            _record_usage(data, span)
         return [row["embedding"] for row in data.get("data", [])]
+
+    async def aclose(self) -> None:
+        """Close a client passed in by the caller; the shared per-loop client stays open."""
+        if self._own_client is not None:
+            await self._own_client.aclose()
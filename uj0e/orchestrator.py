@@ -1,18 +1,55 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import time
+import uuid
+import weakref
+from contextvars import ContextVar
 from dataclasses import dataclass, field
-from typing import Any
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable
 
 from langgraph.graph import StateGraph, END
 
 from .config import settings
-from .model_client import ModelClient
+from .model_client import AsyncModelClient
+from .prompting import PromptBuilder
+from .telemetry import profile_run, record_run, traced, track
 from .tools import AuditLogger, LocalFileTool, SandboxTool, ToolResult
-from .vector import VectorStore
+from .vector import vector_registry
 
 logger = logging.getLogger(__name__)
 
+# Set for the duration of a streamed run; nodes push token/tool events onto it.
+_events: ContextVar[asyncio.Queue | None] = ContextVar("agent_events", default=None)
+
+# Shared by every phase so all prompts of a run start with the same tokens.
+SYSTEM_PROMPT = (
+    "You are a coding agent working towards the user's goal. "
+    "Tools: sandbox (run a command), file_read (read a file), retrieval (search the knowledge base)."
+)
+PLAN_INSTRUCTION = "Plan up to 4 steps to achieve the goal."
+PARALLEL_PLAN_INSTRUCTION = "Plan up to 4 independent steps to achieve the goal; they will run at the same time."
+ACT_INSTRUCTION = "Use the tools to progress."
+REFLECT_INSTRUCTION = "Reflect on the last result. Mark success if goal reached. Keep responses short."
+# Chunks retrieved for the goal on every act; batch runs prefetch with the same k.
+CONTEXT_K = 2
+
+
+@dataclass
+class _LoopResources:
+    """What the orchestrator binds to one event loop: its run limit and checkpointer."""
+
+    limit: asyncio.Semaphore
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    app: Any = None
+    saver: Any = None
+
+
+class CheckpointingDisabled(RuntimeError):
+    """A run cannot be resumed because ``AGENT_CHECKPOINTS`` is empty."""
+
 
 @dataclass
 class AgentState:
@@ -22,17 +59,40 @@ class AgentState:
     max_iters: int = 3
     last_result: ToolResult | None = None
     plan: list[str] = field(default_factory=list)
+    context: list[dict] = field(default_factory=list)
     completed: bool = False
+    parallel: bool = False
+    run_id: str = ""
+
+
+def state_payload(state: AgentState) -> dict:
+    """JSON-friendly summary of a finished run, as returned by the API and CLIs."""
+    return {
+        "run_id": state.run_id,
+        "goal": state.goal,
+        "history": state.history,
+        "iterations": state.iterations,
+        "completed": state.completed,
+        "last_result": state.last_result.output if state.last_result else None,
+    }
 
 
 class AgentOrchestrator:
     def __init__(self) -> None:
-        self.model = ModelClient()
+        self.model = AsyncModelClient()
         self.sandbox = SandboxTool()
         self.files = LocalFileTool()
-        self.vector = VectorStore()
+        self.vector = vector_registry.store()
         self.audit = AuditLogger()
+        self.prompts = PromptBuilder()
         self.graph = self._build_graph()
+        # Compiling validates and wires the whole graph; do it once, not per request.
+        # With checkpoints it is compiled once per event loop, around that loop's saver (see _app).
+        self.app = self.graph.compile()
+        self._loops: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopResources] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._swept = 0.0
 
     def _build_graph(self) -> StateGraph:
         graph = StateGraph(AgentState)
@@ -43,70 +103,314 @@ class AgentOrchestrator:
         graph.set_entry_point("plan")
         graph.add_edge("plan", "act")
         graph.add_edge("act", "reflect")
-        graph.add_edge("reflect", END)
-        graph.add_edge("reflect", "act", condition=lambda s: not s.completed and s.iterations < s.max_iters)
+        graph.add_conditional_edges("reflect", self._after_reflect, {"act": "act", END: END})
         return graph
 
-    def run(self, goal: str, max_iters: int = 3) -> AgentState:
-        state = AgentState(goal=goal, max_iters=max_iters)
-        app = self.graph.compile()
-        result: AgentState = app.invoke(state)
-        return result
-
-    def _plan(self, state: AgentState) -> AgentState:
-        prompt = [
-            {"role": "system", "content": "Plan up to 4 steps to achieve the goal."},
-            {"role": "user", "content": state.goal},
-        ]
-        plan_text = self.model.chat(prompt)
+    @staticmethod
+    def _after_reflect(state: AgentState) -> str:
+        return "act" if not state.completed and state.iterations < state.max_iters else END
+
+    @property
+    def checkpointing(self) -> bool:
+        return bool(settings.agent_checkpoints)
+
+    async def arun(
+        self, goal: str, max_iters: int = 3, parallel: bool | None = None, run_id: str | None = None
+    ) -> AgentState:
+        """Run the graph once; ``parallel`` (default ``AGENT_PARALLEL_STEPS``) fans plan steps out.
+
+        With checkpointing on, the state is saved after every node under ``run_id``
+        (generated when omitted), so ``aresume`` can continue the run later.
+        """
+        parallel = settings.agent_parallel_steps if parallel is None else parallel
+        state = AgentState(goal=goal, max_iters=max_iters, parallel=parallel, run_id=run_id or uuid.uuid4().hex)
+        return await self._invoke(state, state.run_id)
+
+    async def aresume(self, run_id: str, feedback: str | None = None, extra_iters: int = 1) -> AgentState:
+        """Continue run ``run_id`` from its last checkpoint instead of starting over.
+
+        An interrupted run picks up at the node it had not finished. A finished run
+        keeps its plan, context and history and gets ``extra_iters`` more act/reflect
+        rounds, with ``feedback`` (e.g. failing test output) as the latest tool result.
+        Raises ``KeyError`` for unknown runs and ``CheckpointingDisabled`` without checkpoints.
+        """
+        if not self.checkpointing:
+            raise CheckpointingDisabled("checkpointing is disabled (AGENT_CHECKPOINTS is empty)")
+        app = await self._app()
+        config = self._config(run_id)
+        snapshot = await app.aget_state(config)
+        if not snapshot.values:
+            raise KeyError(run_id)
+        if not snapshot.next:
+            update: dict[str, Any] = {"completed": False, "max_iters": snapshot.values["iterations"] + extra_iters}
+            if feedback:
+                update["last_result"] = ToolResult(output=feedback, ok=False, metadata={"source": "feedback"})
+            await app.aupdate_state(config, update, as_node="reflect")
+        return await self._invoke(None, run_id)
+
+    async def _invoke(self, state: AgentState | None, run_id: str) -> AgentState:
+        app = await self._app()
+        await self._touch(run_id)
+        async with self._resources().limit:
+            with track("run", "run" if state is not None else "resume", run_id=run_id), profile_run(run_id):
+                result = await app.ainvoke(state, self._config(run_id))
+        # LangGraph returns the final channel values as a dict.
+        final = AgentState(**result) if isinstance(result, dict) else result
+        record_run(final.iterations)
+        return final
+
+    def _resources(self) -> _LoopResources:
+        """The running loop's run limit and checkpointer.
+
+        Semaphores and saver connections belong to one event loop: the API has one for
+        its lifetime, while each blocking ``run`` call starts its own, possibly from
+        several threads at once. ``AGENT_MAX_CONCURRENCY`` therefore applies per loop.
+        """
+        loop = asyncio.get_running_loop()
+        resources = self._loops.get(loop)
+        if resources is None:
+            resources = self._loops[loop] = _LoopResources(asyncio.Semaphore(settings.agent_max_concurrency))
+        return resources
+
+    async def _app(self) -> Any:
+        """The compiled graph, bound to a sqlite checkpointer on the running loop when enabled."""
+        resources = self._resources()
+        if not self.checkpointing:
+            return self.app
+        if resources.app is not None:
+            return resources.app
+        async with resources.lock:
+            # Concurrent first requests on this loop wait here for one saver.
+            if resources.app is None:
+                import aiosqlite
+                from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+                Path(settings.agent_checkpoints).parent.mkdir(parents=True, exist_ok=True)
+                saver = AsyncSqliteSaver(await aiosqlite.connect(settings.agent_checkpoints))
+                await saver.setup()
+                await saver.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS run_activity (thread_id TEXT PRIMARY KEY, updated REAL NOT NULL)"
+                )
+                await saver.conn.commit()
+                resources.saver = saver
+                resources.app = self.graph.compile(checkpointer=saver)
+        return resources.app
+
+    async def aclose(self) -> None:
+        """Close the running loop's checkpoint connection; the next run on it opens a new one.
+
+        Connections left behind by loops that have since closed are closed as well.
+        """
+        loop = asyncio.get_running_loop()
+        for owner, resources in list(self._loops.items()):
+            if owner is not loop and not owner.is_closed():
+                continue
+            saver, resources.saver, resources.app = resources.saver, None, None
+            if owner is not loop:
+                del self._loops[owner]
+            if saver is None:
+                continue
+            try:
+                await saver.conn.close()
+            except Exception:  # noqa: BLE001
+                logger.warning("closing the checkpoint database failed", exc_info=True)
+
+    async def _touch(self, run_id: str) -> None:
+        """Note that ``run_id`` started or resumed, and expire idle runs now and then.
+
+        Runs not started or resumed for ``AGENT_CHECKPOINT_TTL`` seconds lose their
+        checkpoints; the sweep runs at most once per hour (or per TTL, if shorter).
+        """
+        saver = self._resources().saver
+        if saver is None:
+            return
+        now = time.time()
+        async with saver.lock:
+            await saver.conn.execute("INSERT OR REPLACE INTO run_activity VALUES (?, ?)", (run_id, now))
+            await saver.conn.commit()
+        ttl = settings.agent_checkpoint_ttl
+        if ttl > 0 and now - self._swept >= min(ttl, 3600):
+            self._swept = now
+            await self._sweep(now - ttl)
+
+    async def _sweep(self, before: float) -> int:
+        """Delete the checkpoints of runs last active before ``before``; returns how many."""
+        saver = self._resources().saver
+        async with saver.lock:
+            # Runs checkpointed before activity was tracked expire one TTL from now.
+            await saver.conn.execute(
+                "INSERT OR IGNORE INTO run_activity SELECT DISTINCT thread_id, ? FROM checkpoints", (time.time(),)
+            )
+            async with saver.conn.execute("SELECT thread_id FROM run_activity WHERE updated < ?", (before,)) as rows:
+                expired = [thread_id for (thread_id,) in await rows.fetchall()]
+            await saver.conn.commit()
+        for thread_id in expired:
+            await saver.adelete_thread(thread_id)
+        if expired:
+            async with saver.lock:
+                await saver.conn.execute("DELETE FROM run_activity WHERE updated < ?", (before,))
+                await saver.conn.commit()
+            logger.info("expired agent checkpoints", extra={"runs": len(expired)})
+        return len(expired)
+
+    @staticmethod
+    def _config(run_id: str) -> dict[str, Any]:
+        return {"configurable": {"thread_id": run_id}}
+
+    async def astream(
+        self, goal: str, max_iters: int = 3, parallel: bool | None = None, run_id: str | None = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Run the graph and yield token/tool events, ending with a ``done`` event.
+
+        Closing the iterator cancels the underlying run, freeing model capacity.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        token = _events.set(queue)
+        try:
+            task = asyncio.create_task(self.arun(goal=goal, max_iters=max_iters, parallel=parallel, run_id=run_id))
+        finally:
+            _events.reset(token)
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while (event := await queue.get()) is not None:
+                yield event
+            yield {"type": "done", "state": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+
+    def run(self, goal: str, max_iters: int = 3, parallel: bool | None = None) -> AgentState:
+        """Blocking entry point for callers that are not running an event loop.
+
+        Each call runs on a fresh loop, whose checkpoint connection is closed on return.
+        """
+
+        async def run_and_close() -> AgentState:
+            try:
+                return await self.arun(goal=goal, max_iters=max_iters, parallel=parallel)
+            finally:
+                await self.aclose()
+
+        return asyncio.run(run_and_close())
+
+    @traced("node", "plan")
+    async def _plan(self, state: AgentState) -> AgentState:
+        instruction = PARALLEL_PLAN_INSTRUCTION if state.parallel else PLAN_INSTRUCTION
+        prompt = self.prompts.build(SYSTEM_PROMPT, instruction, goal=state.goal)
+        plan_text = await self._chat(prompt, phase="plan")
         state.plan = [line.strip("- ") for line in plan_text.split("\n") if line.strip()]
         state.history.append({"role": "assistant", "content": plan_text})
         self.audit.log("plan", {"goal": state.goal, "plan": state.plan})
         return state
 
-    def _act(self, state: AgentState) -> AgentState:
+    @traced("node", "act")
+    async def _act(self, state: AgentState) -> AgentState:
         if state.iterations >= state.max_iters:
             state.completed = True
             return state
 
-        context_docs = self.vector.query(state.goal, k=2)
-        tool_prompt = [
-            {"role": "system", "content": "Use the tools to progress. Tools: sandbox, file_read, retrieval."},
-            {"role": "user", "content": f"Goal: {state.goal}. Context: {context_docs}. Plan: {state.plan}"},
-        ]
-        action_text = self.model.chat(tool_prompt)
-        result = self._dispatch_tool(action_text)
+        state.context = await asyncio.to_thread(self.vector.query, state.goal, k=CONTEXT_K)
+        if state.parallel and state.iterations == 0 and len(state.plan) > 1:
+            return await self._act_parallel(state)
+        action_text, result = await self._step(state, ACT_INSTRUCTION)
         state.last_result = result
         state.history.append({"role": "assistant", "content": action_text})
         state.iterations += 1
-        self.audit.log("act", {"action": action_text, "result": result.output, "ok": result.ok})
         return state
 
-    def _reflect(self, state: AgentState) -> AgentState:
-        reflection_prompt = [
-            {
-                "role": "system",
-                "content": "Reflect on the last result. Mark success if goal reached. Keep responses short.",
-            },
-            {"role": "assistant", "content": state.history[-1]["content"] if state.history else ""},
-            {"role": "user", "content": f"Result: {state.last_result.output if state.last_result else ''}"},
-        ]
-        reflection = self.model.chat(reflection_prompt)
+    async def _act_parallel(self, state: AgentState) -> AgentState:
+        """Fan the plan steps out to model and tools at once, then merge results for reflect.
+
+        At most ``AGENT_STEP_CONCURRENCY`` steps of a run are in flight. Every step prompt
+        shares the run's prefix, so the model server reuses it across the fan-out.
+        """
+        limit = asyncio.Semaphore(max(settings.agent_step_concurrency, 1))
+
+        async def run_step(index: int, step: str) -> tuple[str, ToolResult]:
+            async with limit:
+                return await self._step(state, f"{ACT_INSTRUCTION} Carry out step {index}: {step}", step=index)
+
+        outcomes = await asyncio.gather(*(run_step(i, step) for i, step in enumerate(state.plan, 1)))
+        sections = []
+        for index, (action_text, result) in enumerate(outcomes, 1):
+            state.history.append({"role": "assistant", "content": action_text})
+            status = "ok" if result.ok else "failed"
+            sections.append(f"Step {index} ({status}): {action_text.strip()}\n{result.output}")
+        state.last_result = ToolResult(
+            output="\n\n".join(sections),
+            ok=all(result.ok for _, result in outcomes),
+            metadata={"steps": len(outcomes)},
+        )
+        state.iterations += 1
+        return state
+
+    async def _step(self, state: AgentState, instruction: str, step: int | None = None) -> tuple[str, ToolResult]:
+        """One model-chosen action and its tool call."""
+        action_text = await self._chat(self._prompt(state, instruction), phase="act")
+        result = await self._dispatch_tool(action_text)
+        event = {"type": "tool", "action": action_text, "ok": result.ok, "output": result.output}
+        self._emit(event if step is None else {**event, "step": step})
+        self.audit.log("act", {"action": action_text, "result": result.output, "ok": result.ok, "step": step})
+        return action_text, result
+
+    @traced("node", "reflect")
+    async def _reflect(self, state: AgentState) -> AgentState:
+        reflection_prompt = self._prompt(state, REFLECT_INSTRUCTION)
+        reflection = await self._chat(reflection_prompt, phase="reflect")
         state.history.append({"role": "assistant", "content": reflection})
         if "success" in reflection.lower() or "done" in reflection.lower():
             state.completed = True
         return state
 
-    def _dispatch_tool(self, action: str) -> ToolResult:
+    def _prompt(self, state: AgentState, instruction: str) -> list[dict[str, str]]:
+        return self.prompts.build(
+            SYSTEM_PROMPT,
+            instruction,
+            goal=state.goal,
+            plan=state.plan,
+            docs=state.context,
+            # history[0] is the plan text, which already has its own section.
+            history=state.history[1:],
+            result=state.last_result.output if state.last_result else "",
+        )
+
+    async def _chat(self, messages: list[dict[str, str]], phase: str) -> str:
+        # Agent turns drive tools with side effects: a rerun or retry of the same goal must
+        # get a fresh completion, not replay the one that failed (see AGENT_CACHE_RESPONSES).
+        use_cache = settings.agent_cache_responses
+        queue = _events.get()
+        if queue is None:
+            return await self.model.chat(messages, use_cache=use_cache, phase=phase)
+        parts: list[str] = []
+        async for delta in self.model.stream_chat(messages, use_cache=use_cache, phase=phase):
+            parts.append(delta)
+            queue.put_nowait({"type": "token", "phase": phase, "content": delta})
+        return "".join(parts)
+
+    def _emit(self, event: dict[str, Any]) -> None:
+        queue = _events.get()
+        if queue is not None:
+            queue.put_nowait(event)
+
+    def _output_listener(self) -> Callable[[str], None] | None:
+        """Forward sandbox output chunks (produced on a worker thread) to a streamed run."""
+        queue = _events.get()
+        if queue is None:
+            return None
+        loop = asyncio.get_running_loop()
+        return lambda chunk: loop.call_soon_threadsafe(queue.put_nowait, {"type": "tool_output", "content": chunk})
+
+    async def _dispatch_tool(self, action: str) -> ToolResult:
         action_lower = action.lower()
         if "sandbox" in action_lower:
             cmd = action.split(":", 1)[-1].strip()
-            return self.sandbox.run(cmd)
+            return await asyncio.to_thread(self.sandbox.run, cmd, self._output_listener())
         if "read" in action_lower:
             target = action.split(":", 1)[-1].strip()
-            return self.files.read(target)
+            return await asyncio.to_thread(self.files.read, target)
         if "retrieve" in action_lower or "vector" in action_lower:
             query = action.split(":", 1)[-1].strip()
-            docs = self.vector.query(query)
-            return ToolResult(output=str(docs), metadata={"hits": len(docs)})
+            docs = await asyncio.to_thread(self.vector.query, query)
+            output = self.prompts.format_context(docs, self.prompts.budget_for("context"))
+            return ToolResult(output=output, metadata={"hits": len(docs)})
         return ToolResult(output=f"Unknown action: {action}", ok=False)
@@ -0,0 +1,317 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import mmap
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from itertools import islice
+from typing import Generator, Iterable, Iterator, TypeVar
+
+from .chunking import TokenCounter, available_tokenizer, chunk_text, token_counter
+from .config import settings
+from .extractors import ExtractionError, extract_text, supported_extensions
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Per-file failures (unreadable, unextractable, too slow, too large) that skip the file.
+# TimeoutError is an OSError.
+_FILE_ERRORS = (OSError, ExtractionError, MemoryError)
+
+
+@dataclass
+class PreparedFile:
+    path: Path
+    fingerprint: str
+    chunks: list[str]
+    size: int
+    mtime_ns: int = 0
+    inode: int = 0
+
+    @property
+    def key(self) -> str:
+        return manifest_key(self.path)
+
+
+@dataclass
+class IngestProgress:
+    files: int = 0
+    skipped: int = 0
+    failed: int = 0
+    chunks: int = 0
+    bytes: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def files_per_sec(self) -> float:
+        return (self.files + self.skipped) / max(self.elapsed, 1e-9)
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / max(self.elapsed, 1e-9)
+
+
+def iter_paths(root: str | Path, allowed_exts: tuple[str, ...] | None = None) -> Iterator[Path]:
+    """Lazily walk ``root`` so ingestion starts before the whole tree has been listed.
+
+    By default every extension with a registered extractor is included.
+    """
+    allowed_exts = allowed_exts or supported_extensions()
+    for dirpath, _dirnames, filenames in os.walk(root):
+        for name in filenames:
+            if os.path.splitext(name)[1].lower() in allowed_exts:
+                yield Path(dirpath, name)
+
+
+def manifest_key(path: str | Path) -> str:
+    return os.path.abspath(path)
+
+
+def changed_paths(
+    paths: Iterable[Path], known: dict[str, tuple[int, int, int]], progress: IngestProgress | None = None
+) -> Iterator[Path]:
+    """Drop paths whose (size, mtime_ns, inode) match the manifest, without opening them."""
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            if progress is not None:
+                progress.failed += 1
+            continue
+        if known.get(manifest_key(path)) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            if progress is not None:
+                progress.skipped += 1
+            continue
+        yield path
+
+
+def prepare_file(
+    path: Path,
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    mmap_threshold: int | None = None,
+    tokenizer: str | None = None,
+) -> PreparedFile:
+    """Read, fingerprint, extract and chunk one file. Runs inside worker processes.
+
+    ``chunk_size`` and ``chunk_overlap`` are in tokens of ``CHUNK_TOKENIZER`` (defaults
+    ``CHUNK_TOKENS`` and ``CHUNK_OVERLAP_TOKENS``). Files of ``mmap_threshold`` bytes or
+    more are memory-mapped instead of read, so hashing and extraction page them in on
+    demand rather than copying them whole. ``tokenizer`` is a name already resolved by
+    ``available_tokenizer`` and is only loaded from the local cache (``""`` approximates).
+    """
+    chunk_size = chunk_size or settings.chunk_tokens
+    chunk_overlap = settings.chunk_overlap_tokens if chunk_overlap is None else chunk_overlap
+    mmap_threshold = settings.ingest_mmap_threshold if mmap_threshold is None else mmap_threshold
+    if tokenizer is None:
+        count = token_counter(settings.chunk_tokenizer)
+    else:
+        count = token_counter(tokenizer, local_files_only=True)
+    with open(path, "rb") as f:
+        st = os.fstat(f.fileno())
+        if 0 < mmap_threshold <= st.st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _prepare(path, st, data, chunk_size, chunk_overlap, count)
+        data = f.read()
+    return _prepare(path, st, data, chunk_size, chunk_overlap, count)
+
+
+def _prepare(
+    path: Path, st: os.stat_result, data: bytes, chunk_size: int, chunk_overlap: int, count: TokenCounter
+) -> PreparedFile:
+    fingerprint = hashlib.sha256(data).hexdigest()
+    text = extract_text(path, data)
+    chunks = list(chunk_text(text, chunk_size, chunk_overlap, count=count))
+    return PreparedFile(
+        path=path,
+        fingerprint=fingerprint,
+        chunks=chunks,
+        size=len(data),
+        mtime_ns=st.st_mtime_ns,
+        inode=st.st_ino,
+    )
+
+
+def _prepare_with_timeout(
+    path: Path, chunk_size: int | None, chunk_overlap: int | None, timeout: float, tokenizer: str | None = None
+) -> PreparedFile:
+    """``prepare_file`` bounded by a wall-clock alarm; only possible on a main thread.
+
+    In-process ingests (``workers <= 1``) run this in the caller, so the caller's
+    SIGALRM handler is put back afterwards. Elsewhere the file runs without a timeout.
+    """
+    if timeout <= 0:
+        return prepare_file(path, chunk_size, chunk_overlap, tokenizer=tokenizer)
+    if not hasattr(signal, "setitimer"):
+        _warn_no_timeout("SIGALRM is not available on this platform")
+        return prepare_file(path, chunk_size, chunk_overlap, tokenizer=tokenizer)
+    if threading.current_thread() is not threading.main_thread():
+        _warn_no_timeout("signals only reach the main thread; use workers > 1 for per-file timeouts")
+        return prepare_file(path, chunk_size, chunk_overlap, tokenizer=tokenizer)
+
+    def expire(_signum, _frame):
+        raise TimeoutError(f"extraction exceeded {timeout}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return prepare_file(path, chunk_size, chunk_overlap, tokenizer=tokenizer)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+@lru_cache(maxsize=None)
+def _warn_no_timeout(reason: str) -> None:
+    """Warn once per process and reason that ``INGEST_FILE_TIMEOUT`` is not enforced."""
+    logger.warning("ingest file timeout disabled", extra={"reason": reason})
+
+
+def _limit_worker_memory(limit: int) -> None:
+    """Pool initializer: cap the worker's heap so a pathological file raises MemoryError.
+
+    RLIMIT_DATA (rather than RLIMIT_AS) leaves memory-mapped input files out of the cap.
+    """
+    if limit <= 0:
+        return
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        logger.debug("worker memory limit unavailable", exc_info=True)
+
+
+def prepare_files(
+    paths: Iterable[Path],
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    workers: int = 1,
+    progress: IngestProgress | None = None,
+    timeout: float | None = None,
+    memory_limit: int | None = None,
+) -> Iterator[PreparedFile]:
+    """Prepare files on a process pool, yielding results in completion order.
+
+    At most ``workers * 4`` files are in flight, so memory stays bounded no matter how
+    large the walk is and the consumer applies backpressure to the readers. Each file
+    gets ``timeout`` seconds (``INGEST_FILE_TIMEOUT``) and each worker a heap cap of
+    ``memory_limit`` bytes (``INGEST_WORKER_MEMORY``); files exceeding either are
+    counted as failed. Workers are spawned rather than forked, since the caller
+    usually has writer threads and a loaded embedding model. ``CHUNK_TOKENIZER`` is
+    resolved here once, so workers do not each try to download it.
+    """
+    timeout = settings.ingest_file_timeout if timeout is None else timeout
+    memory_limit = settings.ingest_worker_memory if memory_limit is None else memory_limit
+    if workers <= 1:
+        for path in paths:
+            try:
+                yield _prepare_with_timeout(path, chunk_size, chunk_overlap, timeout)
+            except _FILE_ERRORS:
+                _failed(path, progress)
+        return
+
+    window = workers * 4
+    args = (chunk_size, chunk_overlap, timeout, available_tokenizer(settings.chunk_tokenizer))
+    pool = _process_pool(workers, memory_limit)
+    pending: dict[Future, Path] = {}
+    try:
+        for path in paths:
+            pending[pool.submit(_prepare_with_timeout, path, *args)] = path
+            while len(pending) >= window:
+                pool = yield from _drain(pool, pending, workers, memory_limit, args, progress)
+        while pending:
+            pool = yield from _drain(pool, pending, workers, memory_limit, args, progress)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _process_pool(workers: int, memory_limit: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_limit_worker_memory,
+        initargs=(memory_limit,),
+    )
+
+
+def _drain(
+    pool: ProcessPoolExecutor,
+    pending: dict[Future, Path],
+    workers: int,
+    memory_limit: int,
+    args: tuple,
+    progress: IngestProgress | None,
+) -> Generator[PreparedFile, None, ProcessPoolExecutor]:
+    """Yield finished files; returns the pool to keep using.
+
+    A worker killed outright (OOM killer, segfault in a native parser) breaks the whole
+    pool and fails every pending future. The files that were in flight are then retried
+    one at a time on a fresh single-worker pool, so only the one that kills its worker
+    is counted as failed, and a new pool takes over the rest of the walk.
+    """
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    broken = False
+    for future in done:
+        path = pending.pop(future)
+        try:
+            yield future.result()
+        except BrokenProcessPool:
+            broken = True
+            pending[future] = path
+        except _FILE_ERRORS:
+            _failed(path, progress)
+    if not broken:
+        return pool
+    suspects = list(pending.values())
+    pending.clear()
+    pool.shutdown(wait=False, cancel_futures=True)
+    logger.warning("ingest worker died, isolating in-flight files", extra={"files": len(suspects)})
+    yield from _isolate(suspects, memory_limit, args, progress)
+    return _process_pool(workers, memory_limit)
+
+
+def _isolate(
+    paths: list[Path], memory_limit: int, args: tuple, progress: IngestProgress | None
+) -> Iterator[PreparedFile]:
+    pool: ProcessPoolExecutor | None = None
+    try:
+        for path in paths:
+            pool = pool or _process_pool(1, memory_limit)
+            try:
+                yield pool.submit(_prepare_with_timeout, path, *args).result()
+            except BrokenProcessPool:
+                pool.shutdown(wait=False)
+                pool = None
+                _failed(path, progress)
+            except _FILE_ERRORS:
+                _failed(path, progress)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def _failed(path: Path, progress: IngestProgress | None) -> None:
+    logger.warning("failed to prepare file", extra={"file": str(path)}, exc_info=True)
+    if progress is not None:
+        progress.failed += 1
+
+
+def batched(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+
+from .cache import LRUCache
+from .chunking import TokenCounter, token_counter
+from .config import settings
+
+# Chat-template tokens per message (role markers, separators) in typical llama.cpp templates.
+_MESSAGE_OVERHEAD = 4
+_ELLIPSIS = " …"
+
+
+@dataclass
+class PromptBudget:
+    """Share of the prompt window each section may use at most.
+
+    The window is the model context minus the completion (``max_tokens``) and the
+    system message. History gets whatever the other sections leave, up to its share.
+    """
+
+    goal: float = 0.10
+    plan: float = 0.15
+    context: float = 0.35
+    history: float = 0.25
+    turn: float = 0.15
+
+
+@dataclass
+class PromptBuilder:
+    """Assembles chat prompts that fit the model context window.
+
+    Messages are ordered from most to least stable: the shared system message, then
+    goal, plan and retrieved context (fixed for a run), then history (append-only
+    until it is compacted) and finally the phase's instruction and latest result.
+    Consecutive calls therefore share a long token prefix, which llama.cpp's prompt
+    cache reuses instead of prefilling it again.
+    """
+
+    context_tokens: int = field(default_factory=lambda: settings.model_context_tokens)
+    completion_tokens: int = field(default_factory=lambda: settings.model_max_tokens)
+    budget: PromptBudget = field(default_factory=PromptBudget)
+    count: TokenCounter = field(default_factory=lambda: token_counter(settings.prompt_tokenizer or None))
+    cache_size: int = 4096
+
+    def __post_init__(self) -> None:
+        self._counts: LRUCache[str, int] = LRUCache(self.cache_size)
+
+    def budget_for(self, section: str) -> int:
+        """Token cap of ``section`` (a ``PromptBudget`` field) in an otherwise empty window."""
+        return int((self.context_tokens - self.completion_tokens) * getattr(self.budget, section))
+
+    def tokens(self, text: str) -> int:
+        cached = self._counts.get(text)
+        if cached is None:
+            cached = self.count(text)
+            self._counts.put(text, cached)
+        return cached
+
+    def fit(self, text: str, budget: int) -> str:
+        """``text`` cut (at a word boundary where possible) to at most ``budget`` tokens."""
+        if budget <= 0:
+            return ""
+        if self.tokens(text) <= budget:
+            return text
+        budget -= self.tokens(_ELLIPSIS)
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(text[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text.rfind(" ", 0, low)
+        return text[: cut if cut > low // 2 else low].rstrip() + _ELLIPSIS
+
+    def format_context(self, docs: list[dict], budget: int) -> str:
+        """Retrieved chunks as ``[source] text`` blocks, deduplicated, best first, within ``budget``."""
+        blocks: list[str] = []
+        seen: set[str] = set()
+        used = 0
+        for doc in docs:
+            if used >= budget:
+                break
+            text = " ".join(str(doc.get("text", "")).split())
+            # The same chunk can come back under its id or, duplicated across files, by content.
+            keys = {hashlib.sha1(text.lower().encode("utf-8")).hexdigest()}
+            if doc.get("id"):
+                keys.add(doc["id"])
+            if not text or keys & seen:
+                continue
+            seen |= keys
+            source = (doc.get("metadata") or {}).get("source")
+            block = self.fit(f"[{source}] {text}" if source else text, budget - used)
+            blocks.append(block)
+            used += self.tokens(block) + 1
+        return "\n".join(blocks)
+
+    def compact_history(self, history: list[dict[str, str]], budget: int) -> list[dict[str, str]]:
+        """Keep the newest messages that fit; fold older ones into a one-line-each summary.
+
+        The summary is extractive (first line of each dropped message), so compaction
+        costs no model call. When even the summary does not fit, the oldest lines go.
+        """
+        kept: list[dict[str, str]] = []
+        used = 0
+        older = list(history)
+        while older:
+            cost = self.tokens(older[-1]["content"]) + _MESSAGE_OVERHEAD
+            if used + cost > budget:
+                break
+            kept.insert(0, older.pop())
+            used += cost
+        if not older:
+            return kept
+        room = budget - used - _MESSAGE_OVERHEAD
+        lines = [self.fit(message["content"].strip().split("\n", 1)[0], 32) for message in older]
+        summary = ""
+        while lines:
+            summary = "Earlier steps (summarized):\n" + "\n".join(f"- {line}" for line in lines)
+            if self.tokens(summary) <= room:
+                break
+            lines.pop(0)
+            summary = ""
+        if summary:
+            kept.insert(0, {"role": "assistant", "content": summary})
+        return kept
+
+    def build(
+        self,
+        system: str,
+        instruction: str,
+        goal: str = "",
+        plan: list[str] | None = None,
+        docs: list[dict] | None = None,
+        history: list[dict[str, str]] | None = None,
+        result: str = "",
+    ) -> list[dict[str, str]]:
+        """Messages for one model call, within ``context_tokens - completion_tokens``."""
+        available = self.context_tokens - self.completion_tokens - self.tokens(system) - 3 * _MESSAGE_OVERHEAD
+        share = {name: int(available * getattr(self.budget, name)) for name in ("goal", "plan", "context", "turn")}
+
+        sections = [f"Goal: {self.fit(goal, share['goal'])}"] if goal else []
+        if plan:
+            steps = "\n".join(f"{index}. {step}" for index, step in enumerate(plan, 1))
+            sections.append("Plan:\n" + self.fit(steps, share["plan"]))
+        if docs:
+            context = self.format_context(docs, share["context"])
+            if context:
+                sections.append("Context:\n" + context)
+        turn = instruction
+        if result:
+            turn = f"{instruction}\n\nLast result:\n" + self.fit(result, share["turn"] - self.tokens(instruction))
+        turn = self.fit(turn, share["turn"])
+
+        stable = "\n\n".join(sections)
+        room = min(int(available * self.budget.history), available - self.tokens(stable) - self.tokens(turn))
+        past = self.compact_history(history or [], room)
+        messages = [{"role": "system", "content": system}]
+        if not past:
+            # Strict chat templates reject two user turns in a row; the prefix is unchanged.
+            messages.append({"role": "user", "content": f"{stable}\n\n{turn}" if stable else turn})
+            return messages
+        if stable:
+            messages.append({"role": "user", "content": stable})
+        messages.extend(past)
+        messages.append({"role": "user", "content": turn})
+        return messages
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable, TypeVar
+from urllib.parse import parse_qs
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Upstream answers worth sending to another endpoint; other 4xx are the request's fault.
+RETRYABLE_STATUS = frozenset({408, 429, 500, 502, 503, 504})
+PHASES = ("plan", "act", "reflect")
+
+
+class NoEndpointAvailable(RuntimeError):
+    """Every endpoint of a pool has an open circuit."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRYABLE_STATUS
+    return isinstance(exc, httpx.TransportError)
+
+
+@dataclass(eq=False)
+class Endpoint:
+    """One OpenAI-compatible server and the routing state kept about it."""
+
+    url: str
+    model: str = "local-model"
+    limit: int = 0
+    outstanding: int = 0
+    ewma: float | None = None
+    failures: int = 0
+    opened_at: float | None = None
+    probing: bool = False
+    requests: int = 0
+    errors: int = 0
+
+    def path(self, suffix: str) -> str:
+        return f"{self.url.rstrip('/')}/{suffix}"
+
+
+def parse_endpoints(spec: str) -> list[tuple[str, str, int]]:
+    """``url[#model]`` or ``url#model=name&max=N`` entries, comma separated."""
+    entries = []
+    for item in spec.split(","):
+        url, _, fragment = item.strip().partition("#")
+        if not url:
+            continue
+        model, limit = "local-model", settings.model_endpoint_concurrency
+        if "=" in fragment:
+            options = {key: values[-1] for key, values in parse_qs(fragment).items()}
+            model = options.get("model", model)
+            limit = int(options.get("max", limit))
+        elif fragment:
+            model = fragment
+        entries.append((url, model, limit))
+    if not entries:
+        raise ValueError(f"no model endpoints in {spec!r}")
+    return entries
+
+
+class EndpointPool:
+    """Routes requests over several endpoints with caps, circuit breaking and failover.
+
+    Each request goes to the endpoint with the lowest ``(outstanding + 1) * EWMA latency``
+    that is below its concurrency cap; endpoints not measured yet go first. After
+    ``MODEL_BREAKER_FAILURES`` consecutive retryable failures an endpoint's circuit opens
+    for ``MODEL_BREAKER_COOLDOWN`` seconds, then a single probe request decides whether
+    it closes again. A failed request moves on to an endpoint it has not tried yet and only
+    backs off once every endpoint failed, for at most ``MODEL_RETRIES`` attempts.
+
+    State is guarded by a thread lock, and waiters are woken through their own event
+    loop, so one pool serves the async API, blocking callers and several event loops.
+    """
+
+    def __init__(
+        self,
+        endpoints: list[Endpoint],
+        attempts: int | None = None,
+        breaker_failures: int | None = None,
+        breaker_cooldown: float | None = None,
+        backoff: float | None = None,
+        alpha: float = 0.3,
+    ) -> None:
+        self.endpoints = endpoints
+        self.attempts = max(attempts or settings.model_retries, 1)
+        self.breaker_failures = breaker_failures or settings.model_breaker_failures
+        self.breaker_cooldown = settings.model_breaker_cooldown if breaker_cooldown is None else breaker_cooldown
+        self.backoff = settings.model_retry_backoff if backoff is None else backoff
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._waiters: list[Callable[[], None]] = []
+        self._turn = itertools.count()
+
+    @property
+    def key(self) -> str:
+        """Identity for response caching: the same endpoints and models give the same answers."""
+        return ",".join(f"{endpoint.url}#{endpoint.model}" for endpoint in self.endpoints)
+
+    def state(self, endpoint: Endpoint, now: float | None = None) -> str:
+        if endpoint.opened_at is None:
+            return "closed"
+        if (now or time.monotonic()) - endpoint.opened_at < self.breaker_cooldown:
+            return "open"
+        return "half_open"
+
+    async def call(self, send: Callable[[Endpoint], Awaitable[T]]) -> T:
+        """Run ``send`` against the best endpoint, failing over on retryable errors."""
+        tried: set[Endpoint] = set()
+        for attempt in range(self.attempts):
+            endpoint = await self.acquire(tried)
+            start = time.perf_counter()
+            try:
+                result = await send(endpoint)
+            except BaseException as exc:
+                retryable = isinstance(exc, Exception) and is_retryable(exc)
+                self.release(endpoint, ok=False if retryable else None)
+                if not retryable or attempt + 1 == self.attempts:
+                    raise
+                await asyncio.sleep(self.failed_over(endpoint, exc, tried, attempt))
+                continue
+            self.release(endpoint, ok=True, latency=time.perf_counter() - start)
+            return result
+        raise AssertionError("unreachable")
+
+    def call_sync(self, send: Callable[[Endpoint], T]) -> T:
+        """Blocking counterpart of ``call``."""
+        tried: set[Endpoint] = set()
+        for attempt in range(self.attempts):
+            endpoint = self.acquire_sync(tried)
+            start = time.perf_counter()
+            try:
+                result = send(endpoint)
+            except BaseException as exc:
+                retryable = isinstance(exc, Exception) and is_retryable(exc)
+                self.release(endpoint, ok=False if retryable else None)
+                if not retryable or attempt + 1 == self.attempts:
+                    raise
+                time.sleep(self.failed_over(endpoint, exc, tried, attempt))
+                continue
+            self.release(endpoint, ok=True, latency=time.perf_counter() - start)
+            return result
+        raise AssertionError("unreachable")
+
+    def failed_over(self, endpoint: Endpoint, exc: BaseException, tried: set[Endpoint], attempt: int) -> float:
+        """Note a retryable failure; returns the seconds to wait before the next attempt.
+
+        No wait while an untried endpoint with a closed or half-open circuit is left.
+        Otherwise the tried set is cleared, so failed endpoints get another go after a backoff.
+        """
+        logger.warning("model endpoint failed, failing over", extra={"endpoint": endpoint.url, "error": str(exc)})
+        tried.add(endpoint)
+        now = time.monotonic()
+        with self._lock:
+            untried = any(e not in tried and self.state(e, now) != "open" for e in self.endpoints)
+        if untried:
+            return 0.0
+        tried.clear()
+        return self.backoff * 2**attempt
+
+    async def acquire(self, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        loop = asyncio.get_running_loop()
+        while True:
+            future = loop.create_future()
+            wake = functools.partial(loop.call_soon_threadsafe, _resolve, future)
+            if (endpoint := self._try_acquire(exclude, wake)) is not None:
+                return endpoint
+            try:
+                await future
+            except asyncio.CancelledError:
+                self._discard(wake)
+                raise
+
+    def acquire_sync(self, exclude: Iterable[Endpoint] = ()) -> Endpoint:
+        while True:
+            event = threading.Event()
+            if (endpoint := self._try_acquire(exclude, event.set)) is not None:
+                return endpoint
+            event.wait()
+
+    def _try_acquire(self, exclude: Iterable[Endpoint], wake: Callable[[], None]) -> Endpoint | None:
+        """Take the best free endpoint, or register ``wake`` for the next release and return None."""
+        exclude = set(exclude)
+        now = time.monotonic()
+        with self._lock:
+            states = {endpoint: self.state(endpoint, now) for endpoint in self.endpoints}
+            # Prefer endpoints this request has not tried; if all of those have open circuits,
+            # fall back to the tried ones rather than failing while one of them may recover.
+            candidates = [e for e in self.endpoints if e not in exclude and states[e] != "open"] or self.endpoints
+            free = [
+                endpoint
+                for endpoint in candidates
+                if (states[endpoint] == "closed" or (states[endpoint] == "half_open" and not endpoint.probing))
+                and (endpoint.limit <= 0 or endpoint.outstanding < endpoint.limit)
+            ]
+            if free:
+                # Rotate the starting point so ties are spread instead of piling onto the first endpoint.
+                offset = next(self._turn) % len(free)
+                free = free[offset:] + free[:offset]
+                endpoint = min(free, key=lambda e: (e.outstanding + 1) * (e.ewma or 0.0))
+                endpoint.outstanding += 1
+                endpoint.requests += 1
+                endpoint.probing = states[endpoint] == "half_open"
+                return endpoint
+            if all(state == "open" for state in states.values()):
+                raise NoEndpointAvailable(f"circuit open for all model endpoints: {self.key}")
+            self._waiters.append(wake)
+            return None
+
+    def _discard(self, wake: Callable[[], None]) -> None:
+        with self._lock:
+            if wake in self._waiters:
+                self._waiters.remove(wake)
+
+    def release(self, endpoint: Endpoint, ok: bool | None, latency: float | None = None) -> None:
+        """``ok`` is None for outcomes that say nothing about the endpoint (cancellation, 4xx)."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            probe, endpoint.probing = endpoint.probing, False
+            if ok:
+                endpoint.failures = 0
+                endpoint.opened_at = None
+                if latency is not None:
+                    previous = endpoint.ewma
+                    endpoint.ewma = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+            elif ok is False:
+                endpoint.failures += 1
+                endpoint.errors += 1
+                if probe or endpoint.failures >= self.breaker_failures:
+                    if endpoint.opened_at is None or probe:
+                        logger.warning("model endpoint circuit opened", extra={"endpoint": endpoint.url})
+                    endpoint.opened_at = time.monotonic()
+            waiters, self._waiters = self._waiters, []
+        for wake in waiters:
+            wake()
+
+    def snapshot(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "url": endpoint.url,
+                    "model": endpoint.model,
+                    "state": self.state(endpoint, now),
+                    "outstanding": endpoint.outstanding,
+                    "limit": endpoint.limit,
+                    "ewma_seconds": endpoint.ewma,
+                    "requests": endpoint.requests,
+                    "errors": endpoint.errors,
+                }
+                for endpoint in self.endpoints
+            ]
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelRouter:
+    """Process-wide pools, one per endpoint spec, sharing each endpoint's state.
+
+    ``for_phase`` picks ``MODEL_ENDPOINT_PLAN``/``_ACT``/``_REFLECT`` when set, so plan and
+    reflect can go to a small fast model and act to a bigger one, and falls back to
+    ``MODEL_ENDPOINT``. An endpoint listed in several specs has one EWMA and one circuit.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._endpoints: dict[tuple[str, str], Endpoint] = {}
+        self._pools: dict[str, EndpointPool] = {}
+
+    def pool(self, spec: str | None = None) -> EndpointPool:
+        spec = spec or settings.model_endpoint
+        with self._lock:
+            if spec not in self._pools:
+                endpoints = []
+                for url, model, limit in parse_endpoints(spec):
+                    endpoint = self._endpoints.setdefault((url, model), Endpoint(url=url, model=model, limit=limit))
+                    endpoints.append(endpoint)
+                self._pools[spec] = EndpointPool(endpoints)
+            return self._pools[spec]
+
+    def for_phase(self, phase: str | None, default: str | None = None) -> EndpointPool:
+        spec = getattr(settings, f"model_endpoint_{phase}", "") if phase in PHASES else ""
+        return self.pool(spec or default)
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            pools = list(self._pools.values())
+        seen: dict[str, dict] = {}
+        for pool in pools:
+            for row in pool.snapshot():
+                seen.setdefault(f"{row['url']}#{row['model']}", row)
+        return list(seen.values())
+
+
+@functools.lru_cache(maxsize=1)
+def shared_router() -> ModelRouter:
+    return ModelRouter()
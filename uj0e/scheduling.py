@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+# Which queue a model call waits in: a batch job's id, or "interactive" for single runs.
+current_lane: ContextVar[str] = ContextVar("model_lane", default="interactive")
+
+
+class FairLimiter:
+    """Caps concurrent holders; waiters are served round-robin across lanes, FIFO within one.
+
+    A batch of hundreds of goals therefore queues behind itself instead of in front of
+    interactive requests or other batches: each lane gets the next free slot in turn.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self._lanes: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._lanes.values())
+
+    @asynccontextmanager
+    async def slot(self, lane: str | None = None) -> AsyncIterator[None]:
+        if self.limit <= 0:
+            yield
+            return
+        await self.acquire(lane or current_lane.get())
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, lane: str) -> None:
+        if self.active < self.limit and not self._lanes:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._lanes.setdefault(lane, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted a slot just as we were cancelled: hand it on.
+                self.release()
+            else:
+                waiters = self._lanes.get(lane)
+                if waiters is not None and future in waiters:
+                    waiters.remove(future)
+                    if not waiters:
+                        del self._lanes[lane]
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        while self.active < self.limit and self._lanes:
+            lane, waiters = next(iter(self._lanes.items()))
+            future = waiters.popleft()
+            if waiters:
+                self._lanes.move_to_end(lane)
+            else:
+                del self._lanes[lane]
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
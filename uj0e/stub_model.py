@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import numpy as np
+
+from .chunking import approximate_tokens
+
+logger = logging.getLogger(__name__)
+
+_FILLER = "check the result of the last step and keep the change small while tests run".split()
+
+
+@dataclass
+class StubConfig:
+    """Timing model of the stub: a fixed latency per request plus a per-token generation rate."""
+
+    latency: float = 0.05
+    tokens_per_sec: float = 200.0
+    completion_tokens: int = 32
+    embed_latency: float = 0.005
+    embed_latency_per_input: float = 0.0005
+    dimensions: int = 384
+
+
+def agent_reply(prompt: str, tokens: int, seed: int) -> str:
+    """Deterministic reply that walks the agent graph: a plan, a retrieval action, then success."""
+    rng = random.Random(seed)
+    if "Reflect on the last result" in prompt:
+        head = "Goal reached: success."
+    elif "Plan up to" in prompt:
+        head = "\n".join(f"- step {i}: retrieve notes" for i in range(1, 4))
+    else:
+        head = "retrieve: " + " ".join(rng.choice(_FILLER) for _ in range(4))
+    words = head.split(" ")
+    words += [rng.choice(_FILLER) for _ in range(max(tokens - len(words), 0))]
+    return " ".join(words[: max(tokens, 1)])
+
+
+def stub_embedding(text: str, dimensions: int) -> list[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _StubHTTPServer
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, each response waits for a delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format: str, *args) -> None:  # noqa: A002 - signature from BaseHTTPRequestHandler
+        logger.debug(format, *args)
+
+    def do_POST(self) -> None:  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        stub = self.server.stub
+        with stub._lock:
+            stub.requests += 1
+        if self.path.endswith("/chat/completions"):
+            self._chat(body, stub)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body, stub)
+        else:
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _send(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chat(self, body: dict, stub: StubModelServer) -> None:
+        config = stub.config
+        messages = body.get("messages", [])
+        prompt = "\n".join(str(message.get("content", "")) for message in messages)
+        tokens = min(body.get("max_tokens") or config.completion_tokens, config.completion_tokens)
+        seed = int.from_bytes(hashlib.sha256(prompt.encode("utf-8")).digest()[:8], "little")
+        words = stub.reply(prompt, tokens, seed).split(" ")
+        per_token = 1.0 / config.tokens_per_sec if config.tokens_per_sec > 0 else 0.0
+        time.sleep(config.latency)
+        if not body.get("stream"):
+            time.sleep(per_token * len(words))
+            self._send(
+                200,
+                {
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}}],
+                    "usage": {"prompt_tokens": approximate_tokens(prompt), "completion_tokens": len(words)},
+                },
+            )
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, word in enumerate(words):
+            time.sleep(per_token)
+            delta = {"choices": [{"index": 0, "delta": {"content": word if i == 0 else f" {word}"}}]}
+            self._chunk(f"data: {json.dumps(delta)}\n\n")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _embeddings(self, body: dict, stub: StubModelServer) -> None:
+        config = stub.config
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+        time.sleep(config.embed_latency + config.embed_latency_per_input * len(inputs))
+        data = [
+            {"index": i, "object": "embedding", "embedding": stub_embedding(text, config.dimensions)}
+            for i, text in enumerate(inputs)
+        ]
+        tokens = sum(approximate_tokens(text) for text in inputs)
+        self._send(200, {"data": data, "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+    stub: StubModelServer
+
+
+class StubModelServer:
+    """Deterministic OpenAI-compatible ``/chat/completions`` and ``/embeddings`` server.
+
+    Replies and embeddings depend only on the request, and every request costs
+    ``latency`` plus ``1 / tokens_per_sec`` per generated token, so benchmarks measure
+    our own overhead instead of model noise. Serves on a background thread.
+    """
+
+    def __init__(
+        self,
+        config: StubConfig | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        reply: Callable[[str, int, int], str] = agent_reply,
+    ) -> None:
+        self.config = config or StubConfig()
+        self.reply = reply
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer((host, port), _Handler)
+        self._server.stub = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> StubModelServer:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-model", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> StubModelServer:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a deterministic stub of the model API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=StubConfig.latency, help="seconds per request")
+    parser.add_argument("--tokens-per-sec", type=float, default=StubConfig.tokens_per_sec, help="0 for instant")
+    parser.add_argument("--completion-tokens", type=int, default=StubConfig.completion_tokens)
+    parser.add_argument("--dimensions", type=int, default=StubConfig.dimensions)
+    args = parser.parse_args()
+    config = StubConfig(
+        latency=args.latency,
+        tokens_per_sec=args.tokens_per_sec,
+        completion_tokens=args.completion_tokens,
+        dimensions=args.dimensions,
+    )
+    server = StubModelServer(config, host=args.host, port=args.port)
+    print(f"stub model API at {server.url}", flush=True)
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
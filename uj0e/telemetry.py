@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import functools
+import heapq
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable
+
+from .config import settings
+
+try:
+    from prometheus_client import CollectorRegistry, Histogram
+    from prometheus_client import Counter as PromCounter
+except ImportError:  # pragma: no cover - metrics are optional outside the API image
+    CollectorRegistry = Histogram = PromCounter = None
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import trace
+except ImportError:  # pragma: no cover
+    otel_context = trace = None
+
+logger = logging.getLogger(__name__)
+
+# Model calls on a CPU server take tens of seconds; the defaults stop at 10s.
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+registry = CollectorRegistry() if CollectorRegistry is not None else None
+_histograms: dict[str, Any] = {}
+_tokens = None
+_run_iterations = None
+if registry is not None:
+    for kind, (metric, doc, label) in {
+        "run": ("agent_run_seconds", "Wall-clock time of a whole agent run", "mode"),
+        "node": ("agent_node_seconds", "Time spent in each graph node", "node"),
+        "model": ("model_call_seconds", "Model client call latency", "operation"),
+        "vector": ("vector_operation_seconds", "Vector store queries and ingest batches", "operation"),
+        "tool": ("tool_seconds", "Tool execution time", "tool"),
+    }.items():
+        _histograms[kind] = Histogram(metric, doc, [label], buckets=_BUCKETS, registry=registry)
+    _tokens = PromCounter("model_tokens", "Tokens sent to and generated by the model", ["kind"], registry=registry)
+    _run_iterations = Histogram(
+        "agent_run_iterations", "Act/reflect iterations per run", buckets=(1, 2, 3, 4, 5, 8, 13), registry=registry
+    )
+
+_tracer = trace.get_tracer("uj0e") if trace is not None else None
+# Per-run span log, set only while a profiled run is active.
+_run_spans: ContextVar[list | None] = ContextVar("run_spans", default=None)
+
+
+class _Span:
+    """Times a block into a histogram and, when OpenTelemetry is installed, a span."""
+
+    __slots__ = ("kind", "name", "attributes", "current", "start", "_span", "_token")
+
+    def __init__(self, kind: str, name: str, attributes: dict[str, Any], current: bool) -> None:
+        self.kind = kind
+        self.name = name
+        self.attributes = attributes
+        self.current = current
+        self._span = None
+        self._token = None
+
+    def __enter__(self) -> _Span:
+        if _tracer is not None:
+            self._span = _tracer.start_span(f"{self.kind}.{self.name}", attributes=self.attributes)
+            if self.current:
+                self._token = otel_context.attach(trace.set_span_in_context(self._span))
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, **attributes: Any) -> None:
+        if self._span is not None:
+            self._span.set_attributes(attributes)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self.start
+        histogram = _histograms.get(self.kind)
+        if histogram is not None:
+            histogram.labels(self.name).observe(elapsed)
+        spans = _run_spans.get()
+        if spans is not None:
+            spans.append({"kind": self.kind, "name": self.name, "seconds": elapsed, "error": exc_type is not None})
+        if self._span is not None:
+            if exc is not None:
+                self._span.record_exception(exc)
+            if self._token is not None:
+                otel_context.detach(self._token)
+            self._span.end()
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> _NullSpan:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+    def set(self, **attributes: Any) -> None:
+        return None
+
+
+_NULL = _NullSpan()
+
+
+def track(kind: str, name: str, current: bool = True, **attributes: Any) -> _Span | _NullSpan:
+    """Context manager timing one hot-path operation; a shared no-op when ``TELEMETRY=false``.
+
+    Pass ``current=False`` inside async generators, where the span cannot be made the
+    current OpenTelemetry context across ``yield``.
+    """
+    if not settings.telemetry:
+        return _NULL
+    return _Span(kind, name, attributes, current)
+
+
+def traced(kind: str, name: str) -> Callable:
+    """Decorator form of ``track`` for coroutine functions such as graph nodes."""
+
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with track(kind, name):
+                return await fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_tokens(prompt: int | None = None, completion: int | None = None, span: Any = None) -> None:
+    if _tokens is None or not settings.telemetry:
+        return
+    if prompt:
+        _tokens.labels("prompt").inc(prompt)
+    if completion:
+        _tokens.labels("completion").inc(completion)
+    if span is not None:
+        span.set(prompt_tokens=prompt or 0, completion_tokens=completion or 0)
+
+
+def record_run(iterations: int) -> None:
+    if _run_iterations is not None and settings.telemetry:
+        _run_iterations.observe(iterations)
+
+
+class RunProfiler:
+    """Opt-in profiler that keeps the ``PROFILE_SLOWEST`` slowest runs on disk.
+
+    While at least one run is active, a daemon thread samples every thread's stack
+    every ``PROFILE_INTERVAL`` seconds. Samples are process-wide, so concurrent runs
+    share them. When a run finishes among the slowest seen so far, its span breakdown
+    and collapsed stacks (flamegraph.pl format) are written to ``PROFILE_DIR``.
+    """
+
+    def __init__(self, slowest: int, interval: float, directory: str | Path) -> None:
+        self.slowest = slowest
+        self.interval = interval
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._active: dict[str, Counter] = {}
+        self._kept: list[tuple[float, str]] = []
+        self._thread: threading.Thread | None = None
+        self._wake = threading.Event()
+
+    def run(self, run_id: str) -> _ProfiledRun:
+        return _ProfiledRun(self, run_id)
+
+    def _start(self, run_id: str) -> Counter:
+        samples: Counter = Counter()
+        with self._lock:
+            self._active[run_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample, name="run-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+        return samples
+
+    def _finish(self, run_id: str, seconds: float, spans: list[dict], samples: Counter) -> None:
+        with self._lock:
+            self._active.pop(run_id, None)
+            if len(self._kept) >= self.slowest and seconds <= self._kept[0][0]:
+                return
+            heapq.heappush(self._kept, (seconds, run_id))
+            evicted = heapq.heappop(self._kept)[1] if len(self._kept) > self.slowest else None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        report = {
+            "run_id": run_id,
+            "seconds": seconds,
+            "spans": spans,
+            "stacks": [f"{stack} {count}" for stack, count in samples.most_common(200)],
+        }
+        (self.directory / f"{run_id}.json").write_text(json.dumps(report, indent=2))
+        if evicted is not None:
+            (self.directory / f"{evicted}.json").unlink(missing_ok=True)
+
+    def _sample(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                targets = list(self._active.values())
+            if not targets:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                collapsed = ";".join(reversed(stack))
+                for samples in targets:
+                    samples[collapsed] += 1
+            time.sleep(self.interval)
+
+
+class _ProfiledRun:
+    __slots__ = ("profiler", "run_id", "start", "samples", "spans", "_token")
+
+    def __init__(self, profiler: RunProfiler, run_id: str) -> None:
+        self.profiler = profiler
+        self.run_id = run_id
+
+    def __enter__(self) -> _ProfiledRun:
+        self.spans: list[dict] = []
+        self._token = _run_spans.set(self.spans)
+        self.samples = self.profiler._start(self.run_id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        seconds = time.perf_counter() - self.start
+        _run_spans.reset(self._token)
+        try:
+            self.profiler._finish(self.run_id, seconds, self.spans, self.samples)
+        except OSError:
+            logger.warning("could not write run profile", extra={"run_id": self.run_id}, exc_info=True)
+
+
+_profiler: RunProfiler | None = None
+
+
+def profile_run(run_id: str) -> _ProfiledRun | _NullSpan:
+    """Profile one agent run when ``PROFILE_SLOWEST`` > 0; otherwise a no-op."""
+    global _profiler
+    if settings.profile_slowest <= 0:
+        return _NULL
+    if _profiler is None:
+        _profiler = RunProfiler(settings.profile_slowest, settings.profile_interval, settings.profile_dir)
+    return _profiler.run(run_id)
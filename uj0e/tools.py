@@ -1,19 +1,33 @@
 from __future__ import annotations
 
+import atexit
+import codecs
+import gzip
 import hashlib
 import json
 import logging
 import os
+import queue
 import shlex
 import shutil
+import signal
 import subprocess
 import tempfile
+import threading
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable
 
 from .config import settings
+from .telemetry import track
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
@@ -25,22 +39,258 @@ class ToolResult:
     metadata: dict[str, Any] | None = None
 
 
+class OutputCapture:
+    """Keeps the first and last ``limit / 2`` bytes of a stream, counting what was dropped."""
+
+    def __init__(self, limit: int) -> None:
+        self.head_limit = limit // 2
+        self.tail_limit = limit - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+        self.killed = False
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def feed(self, chunk: bytes) -> None:
+        self.total += len(chunk)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk:
+            self.tail += chunk
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    def text(self) -> str:
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail.decode("utf-8", errors="replace")
+        if not self.truncated:
+            return head + tail
+        omitted = self.total - len(self.head) - len(self.tail)
+        return f"{head}\n... [{omitted} bytes omitted] ...\n{tail}"
+
+    def metadata(self) -> dict[str, Any]:
+        return {"output_bytes": self.total, "truncated": self.truncated, "killed": self.killed}
+
+
+@dataclass
+class PoolStats:
+    started: int = 0
+    recycled: int = 0
+    acquisitions: int = 0
+    reuses: int = 0
+    start_failures: int = 0
+    wait_seconds: float = 0.0
+
+
+@dataclass
+class _Container:
+    id: str
+    uses: int = 0
+
+
+class SandboxPool:
+    """Pre-started sandbox containers that commands ``docker exec`` into.
+
+    Containers get the same ``--network none``, CPU, memory and pids limits as a cold
+    ``docker run``. A container is replaced after ``max_uses`` commands or after a
+    dirty exit (timeout, OOM kill, docker error), so state left behind by one command
+    is visible to at most ``max_uses - 1`` later ones. A failed ``docker run`` is
+    retried with exponential backoff (``retry_backoff`` doubling up to ``max_backoff``
+    seconds), so the pool grows back to ``size`` once the daemon recovers.
+    """
+
+    # timeout(1) expiry, docker daemon error, SIGKILL (e.g. OOM).
+    DIRTY_EXIT_CODES = (124, 125, 137)
+
+    def __init__(
+        self,
+        docker_bin: str,
+        size: int,
+        image: str,
+        memory: str,
+        cpus: str,
+        max_uses: int,
+        pids_limit: int = 128,
+        retry_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ) -> None:
+        self.docker_bin = docker_bin
+        self.size = size
+        self.image = image
+        self.memory = memory
+        self.cpus = cpus
+        self.max_uses = max_uses
+        self.pids_limit = pids_limit
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.stats = PoolStats()
+        self._idle: queue.Queue[_Container] = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._stopped = threading.Event()
+        self._live: set[str] = set()
+        # Consecutive failed ``docker run`` calls; reset by the next successful start.
+        self._failures = 0
+
+    @property
+    def idle(self) -> int:
+        return self._idle.qsize()
+
+    @property
+    def degraded(self) -> bool:
+        """No live containers and the last start failed, so an acquire would just wait."""
+        with self._lock:
+            return not self._live and self._failures > 0
+
+    def start(self) -> None:
+        """Launch ``size`` containers in the background; idempotent."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        atexit.register(self.close)
+        for _ in range(self.size):
+            threading.Thread(target=self._replenish, daemon=True).start()
+
+    def acquire(self, timeout: float | None = None) -> _Container:
+        self.start()
+        begin = time.perf_counter()
+        container = self._idle.get(timeout=timeout)
+        with self._lock:
+            self.stats.acquisitions += 1
+            self.stats.wait_seconds += time.perf_counter() - begin
+            if container.uses:
+                self.stats.reuses += 1
+        container.uses += 1
+        return container
+
+    def release(self, container: _Container, dirty: bool = False) -> None:
+        if self._closed:
+            self._remove(container.id)
+        elif dirty or container.uses >= self.max_uses:
+            with self._lock:
+                self.stats.recycled += 1
+            threading.Thread(target=self._recycle, args=(container.id,), daemon=True).start()
+        else:
+            self._idle.put(container)
+
+    def exec_command(self, container: _Container, command: str, timeout: int) -> list[str]:
+        return [self.docker_bin, "exec", container.id, "timeout", str(timeout), "/bin/sh", "-c", command]
+
+    def close(self) -> None:
+        self._closed = True
+        self._stopped.set()
+        with self._lock:
+            live = list(self._live)
+        for container_id in live:
+            self._remove(container_id)
+
+    def _recycle(self, container_id: str) -> None:
+        self._remove(container_id)
+        self._replenish()
+
+    def _replenish(self) -> None:
+        cmd = [
+            self.docker_bin,
+            "run",
+            "-d",
+            "--rm",
+            "--network",
+            "none",
+            "--cpus",
+            str(self.cpus),
+            "--memory",
+            str(self.memory),
+            "--pids-limit",
+            str(self.pids_limit),
+            self.image,
+            "sleep",
+            "infinity",
+        ]
+        delay = self.retry_backoff
+        while True:
+            if self._closed:
+                return
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+            if proc.returncode == 0:
+                break
+            with self._lock:
+                self._failures += 1
+                self.stats.start_failures += 1
+            logger.error("sandbox pool failed to start container", extra={"stderr": proc.stderr, "retry_in": delay})
+            if self._stopped.wait(delay):
+                return
+            delay = min(delay * 2, self.max_backoff)
+        container_id = proc.stdout.strip()
+        with self._lock:
+            self._live.add(container_id)
+            self._failures = 0
+            self.stats.started += 1
+        self._idle.put(_Container(id=container_id))
+
+    def _remove(self, container_id: str) -> None:
+        subprocess.run(
+            [self.docker_bin, "rm", "-f", container_id],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            check=False,
+        )
+        with self._lock:
+            self._live.discard(container_id)
+
+
 class SandboxTool:
     """Executes code inside a sandboxed container with strict limits."""
 
-    def __init__(self) -> None:
+    def __init__(self, pool_size: int | None = None, docker_bin: str | None = None) -> None:
         self.memory = settings.sandbox_memory
         self.cpus = settings.sandbox_cpus
         self.timeout = settings.sandbox_timeout
+        self.image = settings.sandbox_image
+        self.output_limit = settings.sandbox_output_limit
+        self.output_kill = settings.sandbox_output_kill
+        self.docker_bin = docker_bin or shutil.which("docker")
+        pool_size = settings.sandbox_pool_size if pool_size is None else pool_size
+        self.pool: SandboxPool | None = None
+        if self.docker_bin and pool_size > 0:
+            self.pool = SandboxPool(
+                docker_bin=self.docker_bin,
+                size=pool_size,
+                image=self.image,
+                memory=self.memory,
+                cpus=self.cpus,
+                max_uses=settings.sandbox_max_uses,
+            )
 
-    def run(self, command: str) -> ToolResult:
-        docker_bin = shutil.which("docker")
+    def run(self, command: str, on_output: Callable[[str], None] | None = None) -> ToolResult:
+        """Run ``command`` and capture at most ``SANDBOX_OUTPUT_LIMIT`` bytes of its output.
+
+        stdout and stderr are read incrementally as one stream; ``on_output`` receives
+        decoded chunks as they arrive. Past ``SANDBOX_OUTPUT_KILL`` bytes the command is
+        killed. Truncation is reported in the result metadata.
+        """
+        with track("tool", "sandbox", pooled=self.pool is not None):
+            if self.pool is not None:
+                return self._run_pooled(command, on_output)
+            return self._run_container(command, on_output)
+
+    def _run_container(self, command: str, on_output: Callable[[str], None] | None) -> ToolResult:
+        docker_bin = self.docker_bin
         safe_command = ["/bin/bash", "-lc", command]
+        name = f"ujoe-sandbox-{uuid.uuid4().hex[:12]}"
         if docker_bin:
             cmd = [
                 docker_bin,
                 "run",
                 "--rm",
+                "--name",
+                name,
                 "--network",
                 "none",
                 "--cpus",
@@ -49,7 +299,7 @@ class SandboxTool:
                 str(self.memory),
                 "--pids-limit",
                 "128",
-                "alpine",
+                self.image,
                 "timeout",
                 str(self.timeout),
                 "/bin/sh",
@@ -59,24 +309,101 @@ class SandboxTool:
         else:
             cmd = ["timeout", str(self.timeout)] + safe_command
 
+        def stop() -> None:
+            # Killing the docker client does not stop the container itself.
+            if docker_bin:
+                subprocess.run([docker_bin, "rm", "-f", name], capture_output=True, check=False)
+
         logger.info("sandbox.run", extra={"cmd": cmd})
         try:
             start = time.time()
-            proc = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                check=False,
-            )
+            returncode, capture = self._execute(cmd, on_output, stop)
             duration = time.time() - start
-            output = proc.stdout + proc.stderr
-            ok = proc.returncode == 0
-            return ToolResult(output=output, ok=ok, metadata={"duration": duration})
+            ok = returncode == 0 and not capture.killed
+            return ToolResult(output=capture.text(), ok=ok, metadata={"duration": duration, **capture.metadata()})
         except Exception as exc:  # noqa: BLE001
             logger.exception("sandbox failure")
             return ToolResult(output=str(exc), ok=False)
 
+    def _run_pooled(self, command: str, on_output: Callable[[str], None] | None) -> ToolResult:
+        assert self.pool is not None
+        self.pool.start()
+        if self.pool.degraded:
+            # Waiting on the pool would only time out; try a cold container instead.
+            return self._run_container(command, on_output)
+        start = time.time()
+        try:
+            with track("tool", "sandbox_acquire"):
+                container = self.pool.acquire(timeout=self.timeout)
+        except queue.Empty:
+            return ToolResult(output="No sandbox container available", ok=False)
+        waited = time.time() - start
+        cmd = self.pool.exec_command(container, command, self.timeout)
+        logger.info("sandbox.run", extra={"cmd": cmd})
+        dirty = True
+        try:
+            # On overflow or a failed ``on_output`` the exec'd process keeps running in the
+            # container; marking it dirty makes the pool remove the container, which stops it.
+            returncode, capture = self._execute(cmd, on_output, lambda: None)
+            dirty = capture.killed or returncode in SandboxPool.DIRTY_EXIT_CODES
+            metadata = {
+                "duration": time.time() - start,
+                "wait": waited,
+                "container": container.id,
+                "uses": container.uses,
+                **capture.metadata(),
+            }
+            return ToolResult(output=capture.text(), ok=returncode == 0 and not capture.killed, metadata=metadata)
+        except Exception as exc:  # noqa: BLE001
+            logger.exception("sandbox failure")
+            return ToolResult(output=str(exc), ok=False)
+        finally:
+            self.pool.release(container, dirty=dirty)
+
+    def _execute(
+        self,
+        cmd: list[str],
+        on_output: Callable[[str], None] | None,
+        stop: Callable[[], None],
+    ) -> tuple[int, OutputCapture]:
+        """Run ``cmd`` to completion, streaming its output.
+
+        If the output overflows or ``on_output`` raises (e.g. a streaming client went
+        away), the process is killed and reaped and ``stop`` ends what it started.
+        """
+        capture = OutputCapture(limit=self.output_limit)
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # A session of its own, so a kill also reaches what the command started.
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, start_new_session=True)
+        assert proc.stdout is not None
+        fd = proc.stdout.fileno()
+        finished = False
+        try:
+            while chunk := os.read(fd, 65536):
+                capture.feed(chunk)
+                if on_output is not None:
+                    on_output(decoder.decode(chunk))
+                if capture.total > self.output_kill:
+                    capture.killed = True
+                    stop()
+                    _kill_group(proc)
+                    break
+            finished = True
+        finally:
+            proc.stdout.close()
+            if not finished:
+                stop()
+                _kill_group(proc)
+                proc.wait()
+        return proc.wait(), capture
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
 
 class LocalFileTool:
     """Restricts file reads to DATA_ROOT."""
@@ -91,7 +418,8 @@ class LocalFileTool:
             return ToolResult(output="Access denied", ok=False)
         if not target.exists():
             return ToolResult(output="Not found", ok=False)
-        return ToolResult(output=target.read_text())
+        with track("tool", "file_read"):
+            return ToolResult(output=target.read_text())
 
     def write(self, relative_path: str, content: str) -> ToolResult:
         target = (self.root / relative_path).resolve()
@@ -103,13 +431,205 @@ class LocalFileTool:
 
 
 class AuditLogger:
-    def __init__(self, path: str | None = None) -> None:
+    """Buffered, append-only JSONL audit log with size/time rotation.
+
+    Lines are appended with O_APPEND in whole-buffer writes, so several threads and
+    processes can share one file. Every flush holds a shared flock on ``<path>.lock``
+    and first reopens the log if its inode changed; rotation renames the file aside
+    under the exclusive lock, so once it is renamed no writer appends to it again and
+    the background archiver can shift and gzip it right away. The rotation clock is the
+    lock file's mtime, touched whenever a writer opens an empty log (and seeded from
+    the log's own mtime for a log written before the lock file existed), so every
+    process and restart agrees on the file's age. Events logged after ``close`` are
+    dropped. ``fsync`` is
+    ``never`` (leave it to the OS), ``flush`` (after each buffer flush) or ``always``
+    (write and fsync every event synchronously).
+    """
+
+    FSYNC_POLICIES = ("never", "flush", "always")
+
+    def __init__(
+        self,
+        path: str | None = None,
+        flush_interval: float | None = None,
+        fsync: str | None = None,
+        max_bytes: int | None = None,
+        rotate_interval: float | None = None,
+        backups: int | None = None,
+        compress: bool | None = None,
+        max_buffer: int = 64 * 1024,
+    ) -> None:
         self.path = Path(path or settings.audit_log)
         self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = settings.audit_flush_interval if flush_interval is None else flush_interval
+        self.fsync = fsync or settings.audit_fsync
+        if self.fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f"Unknown audit fsync policy: {self.fsync}")
+        self.max_bytes = settings.audit_max_bytes if max_bytes is None else max_bytes
+        self.rotate_interval = settings.audit_rotate_interval if rotate_interval is None else rotate_interval
+        self.backups = settings.audit_backups if backups is None else backups
+        self.compress = settings.audit_compress if compress is None else compress
+        self.max_buffer = max_buffer
+        self._lock = threading.Lock()
+        self._buffer: list[bytes] = []
+        self._buffered = 0
+        self._lock_path = Path(f"{self.path}.lock")
+        self._fd = self._open()
+        self._lock_fd = os.open(self._lock_path, os.O_RDONLY | os.O_CREAT, 0o644)
+        self._archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-archiver")
+        self._closed = threading.Event()
+        self._flusher: threading.Thread | None = None
+        if self.fsync != "always" and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
 
     def log(self, action: str, payload: dict[str, Any]) -> None:
-        line = json.dumps({"action": action, **payload})
-        self.path.write_text(self.path.read_text() + line + "\n" if self.path.exists() else line + "\n")
+        line = (json.dumps({"action": action, **payload}) + "\n").encode("utf-8")
+        with self._lock:
+            if self._closed.is_set():
+                # Late callbacks (atexit, shutdown ordering) must not fail the caller.
+                logger.debug("audit event after close dropped", extra={"action": action})
+                return
+            self._buffer.append(line)
+            self._buffered += len(line)
+            if self.fsync == "always" or self._flusher is None or self._buffered >= self.max_buffer:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._fd >= 0:
+                self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed.is_set():
+                return
+            self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        with self._lock:
+            self._flush_locked()
+            os.close(self._fd)
+            os.close(self._lock_fd)
+            self._fd = self._lock_fd = -1
+        self._archiver.shutdown(wait=True)
+        atexit.unregister(self.close)
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except OSError:
+                logger.exception("audit flush failed")
+
+    def _flush_locked(self) -> None:
+        if not self._buffer:
+            return
+        data = b"".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        with track("tool", "audit_flush", bytes=len(data)):
+            self._flock("LOCK_SH")
+            try:
+                self._reopen_if_rotated()
+                if self._should_rotate(len(data)):
+                    self._rotate()
+                os.write(self._fd, data)
+            finally:
+                self._flock("LOCK_UN")
+            if self.fsync != "never":
+                os.fsync(self._fd)
+
+    def _open(self) -> int:
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        stat = os.fstat(fd)
+        if stat.st_size == 0:
+            # A new or freshly rotated log: restart the rotation clock.
+            self._lock_path.touch()
+        elif not self._lock_path.exists():
+            # A log left by a version without the lock file: date it by its last write.
+            self._lock_path.touch()
+            os.utime(self._lock_path, (stat.st_mtime, stat.st_mtime))
+        return fd
+
+    def _flock(self, operation: str) -> None:
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, getattr(fcntl, operation))
+
+    def _started_at(self) -> float:
+        try:
+            return self._lock_path.stat().st_mtime
+        except FileNotFoundError:
+            return time.time()
+
+    def _reopen_if_rotated(self) -> None:
+        try:
+            current = os.stat(self.path).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self._fd).st_ino:
+            os.close(self._fd)
+            self._fd = self._open()
+
+    def _should_rotate(self, incoming: int) -> bool:
+        size = os.fstat(self._fd).st_size
+        if size == 0:
+            return False
+        if self.max_bytes and size + incoming > self.max_bytes:
+            return True
+        return bool(self.rotate_interval) and time.time() - self._started_at() >= self.rotate_interval
+
+    def _rotate(self) -> None:
+        """Move the full log aside and reopen; archiving it is left to the archiver thread.
+
+        Called with the shared lock held. Upgrading to exclusive waits for every other
+        writer's in-flight flush, and each later flush reopens before writing.
+        """
+        self._flock("LOCK_EX")
+        try:
+            # Another process may have rotated while we waited for the lock.
+            if os.stat(self.path).st_ino == os.fstat(self._fd).st_ino:
+                self.path.rename(f"{self.path}.{time.time_ns()}.rotated")
+        finally:
+            self._flock("LOCK_SH")
+        os.close(self._fd)
+        self._fd = self._open()
+        self._archiver.submit(self._archive)
+
+    def _archive(self) -> None:
+        """Turn every rotated-aside log (also ones left by crashed processes) into a backup."""
+        try:
+            with open(f"{self.path}.archive.lock", "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    # Names carry the rotation time in ns, so they sort oldest first.
+                    for rotated in sorted(self.path.parent.glob(f"{self.path.name}.*.rotated")):
+                        self._shift_backups(rotated)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock, fcntl.LOCK_UN)
+        except OSError:
+            logger.exception("audit archive failed")
+
+    def _shift_backups(self, rotated: Path) -> None:
+        suffix = ".gz" if self.compress else ""
+        if self.backups <= 0:
+            rotated.unlink()
+            return
+        Path(f"{self.path}.{self.backups}{suffix}").unlink(missing_ok=True)
+        for index in range(self.backups - 1, 0, -1):
+            source = Path(f"{self.path}.{index}{suffix}")
+            if source.exists():
+                source.rename(f"{self.path}.{index + 1}{suffix}")
+        first = Path(f"{self.path}.1{suffix}")
+        if self.compress:
+            with rotated.open("rb") as src, gzip.open(first, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        else:
+            rotated.rename(first)
 
 
 class Fingerprinter:
@@ -121,16 +641,6 @@ class Fingerprinter:
                 digest.update(chunk)
         return digest.hexdigest()
 
-    @staticmethod
-    def chunk_text(text: str, chunk_size: int = 800, chunk_overlap: int = 80) -> list[str]:
-        chunks: list[str] = []
-        start = 0
-        while start < len(text):
-            end = start + chunk_size
-            chunks.append(text[start:end])
-            start = end - chunk_overlap
-        return chunks
-
 
 class TempDir:
     def __enter__(self) -> Path:
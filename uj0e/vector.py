@@ -1,68 +1,608 @@
 from __future__ import annotations
 
+import json
 import logging
 import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable
+from typing import Any, Callable, Iterable
 
 import chromadb
 from chromadb.utils import embedding_functions
 
+from .cache import LRUCache
 from .config import settings
-from .tools import Fingerprinter
+from .lexical import LexicalIndex
+from .manifest import IngestManifest, ManifestEntry, orphaned_chunk_ids
+from .pipeline import IngestProgress, batched, changed_paths, iter_paths, manifest_key, prepare_files
+from .telemetry import track
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class _Batch:
+    ids: list[str] = field(default_factory=list)
+    documents: list[str] = field(default_factory=list)
+    metadatas: list[dict] = field(default_factory=list)
+    entries: list[ManifestEntry] = field(default_factory=list)
+
+
+class VectorRegistry:
+    """Process-wide owner of Chroma clients, embedding models and collection handles.
+
+    Each embedding model is loaded once, on first use, and shared by the API, the
+    orchestrator and the scripts. ``warm()`` forces loading ahead of the first request.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._clients: dict[str, Any] = {}
+        self._embedders: dict[str, Any] = {}
+        self._loading: dict[str, threading.Lock] = {}
+        self._collections: dict[str, Any] = {}
+        self._stores: dict[tuple[str, str], VectorStore] = {}
+
+    @property
+    def remote(self) -> bool:
+        return settings.chroma_mode == "http"
+
+    def client(self, persist_directory: str) -> Any:
+        """Embedded client for ``persist_directory``, or the shared HTTP client in ``http`` mode.
+
+        The HTTP client is created once per process and reused from every thread, so its
+        session keeps connections to the vector service alive across requests.
+        """
+        key = settings.chroma_url if self.remote else persist_directory
+        with self._lock:
+            if key not in self._clients:
+                if self.remote:
+                    client = chromadb.HttpClient(
+                        host=settings.chroma_host,
+                        port=settings.chroma_port,
+                        settings=chromadb.Settings(anonymized_telemetry=False),
+                    )
+                    _size_http_pool(client, settings.chroma_pool_size)
+                else:
+                    client = chromadb.PersistentClient(path=persist_directory, settings=chromadb.Settings())
+                self._clients[key] = client
+            return self._clients[key]
+
+    def open_collection(self, persist_directory: str, name: str) -> Any:
+        """Collection handle for the configured backend (``VECTOR_BACKEND``)."""
+        if settings.vector_backend == "numpy":
+            from .ann import NumpyCollection
+
+            key = str(Path(persist_directory) / "numpy" / name)
+            with self._lock:
+                if key not in self._collections:
+                    self._collections[key] = NumpyCollection(
+                        Path(persist_directory) / "numpy",
+                        name,
+                        quantize=settings.vector_quantize,
+                        nprobe=settings.vector_nprobe,
+                    )
+                return self._collections[key]
+        return self.client(persist_directory).get_or_create_collection(name=name, embedding_function=None)
+
+    def drop_collection(self, persist_directory: str, name: str) -> None:
+        if settings.vector_backend == "numpy":
+            collection = self.open_collection(persist_directory, name)
+            with self._lock:
+                self._collections.pop(str(Path(persist_directory) / "numpy" / name), None)
+            collection.drop()
+            return
+        self.client(persist_directory).delete_collection(name)
+
+    def heartbeat(self, persist_directory: str | None = None) -> dict[str, Any]:
+        """Round-trip the vector backend; used by /health."""
+        if settings.vector_backend == "numpy":
+            return {"ok": True, "mode": "numpy"}
+        start = time.perf_counter()
+        try:
+            self.client(persist_directory or str(Path("data/chroma").resolve())).heartbeat()
+        except Exception as exc:  # noqa: BLE001
+            return {"ok": False, "mode": settings.chroma_mode, "error": str(exc)}
+        return {"ok": True, "mode": settings.chroma_mode, "latency_ms": (time.perf_counter() - start) * 1000}
+
+    def embedder(self, model_name: str) -> Callable[[list[str]], Any]:
+        """Shared embedding function for ``model_name``, loaded on first use.
+
+        Loading holds a per-model lock rather than the registry lock, so clients, stores,
+        ``/health`` and ``/metrics`` are not held up while a model loads.
+        """
+        embedder = self._embedders.get(model_name)
+        if embedder is not None:
+            return embedder
+        with self._lock:
+            loading = self._loading.setdefault(model_name, threading.Lock())
+        with loading:
+            embedder = self._embedders.get(model_name)
+            if embedder is None:
+                logger.info("loading embedding model", extra={"model": model_name})
+                embedder = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=model_name)
+                with self._lock:
+                    self._embedders[model_name] = embedder
+        return embedder
+
+    def store(self, collection: str = "knowledge", persist_directory: str | None = None) -> VectorStore:
+        persist_directory = persist_directory or str(Path("data/chroma").resolve())
+        with self._lock:
+            key = (persist_directory, collection)
+            if key not in self._stores:
+                self._stores[key] = VectorStore(
+                    collection=collection, persist_directory=persist_directory, registry=self
+                )
+            return self._stores[key]
+
+    def warm(self, model_names: Iterable[str] | None = None) -> None:
+        for model_name in model_names or [settings.embedding_model]:
+            self.embedder(model_name)([""])
+
+    def footprint(self) -> dict[str, Any]:
+        """Loaded models with their parameter bytes, plus the process's resident memory."""
+        with self._lock:
+            embedders = dict(self._embedders)
+            stores = len(self._stores)
+        models = {name: _parameter_bytes(fn) for name, fn in embedders.items()}
+        return {"models": models, "stores": stores, "rss_bytes": _rss_bytes()}
+
+
+@dataclass
+class GcReport:
+    files_removed: int = 0
+    chunks_deleted: int = 0
+    bytes_reclaimed: int = 0
+
+
+class _ChunkBuffer:
+    """Accumulates chunks across files and releases manifest entries with the batch that completes them."""
+
+    def __init__(self) -> None:
+        self.pending = _Batch()
+        self.taken = 0
+        self._entries: list[tuple[int, ManifestEntry]] = []
+
+    def __len__(self) -> int:
+        return len(self.pending.ids)
+
+    def add(self, ids: list[str], documents: list[str], metadata: dict) -> None:
+        self.pending.ids.extend(ids)
+        self.pending.documents.extend(documents)
+        self.pending.metadatas.extend([metadata] * len(ids))
+
+    def track(self, entry: ManifestEntry) -> None:
+        self._entries.append((self.taken + len(self), entry))
+
+    def take(self, n: int) -> _Batch:
+        pending = self.pending
+        batch = _Batch(ids=pending.ids[:n], documents=pending.documents[:n], metadatas=pending.metadatas[:n])
+        del pending.ids[:n], pending.documents[:n], pending.metadatas[:n]
+        self.taken += len(batch.ids)
+        batch.entries = [entry for end, entry in self._entries if end <= self.taken]
+        self._entries = [(end, entry) for end, entry in self._entries if end > self.taken]
+        return batch
+
+
 class VectorStore:
-    def __init__(self, collection: str = "knowledge", persist_directory: str | None = None) -> None:
+    # Files per bulk fingerprint lookup against the collection.
+    _DEDUP_GROUP = 64
+    # Ids per paged get/delete call when scanning the collection.
+    _PAGE = 1000
+    # Reciprocal rank fusion constant; 60 is the usual choice and rarely worth tuning.
+    _RRF_K = 60
+
+    def __init__(
+        self,
+        collection: str = "knowledge",
+        persist_directory: str | None = None,
+        registry: VectorRegistry | None = None,
+    ) -> None:
+        """Open a collection handle; cheap, since the client and embedder come from ``registry``.
+
+        Embeddings are always computed client-side and passed to Chroma explicitly, so the
+        collection is opened without an embedding function of its own.
+        """
+        self.registry = registry or vector_registry
         self.persist_directory = persist_directory or str(Path("data/chroma").resolve())
-        self.client = chromadb.PersistentClient(path=self.persist_directory, settings=chromadb.Settings())
-        self.collection = self.client.get_or_create_collection(
-            name=collection,
-            embedding_function=embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="sentence-transformers/all-MiniLM-L6-v2"
-            ),
+        self.model_name = settings.embedding_model
+        self.collection = self.registry.open_collection(self.persist_directory, collection)
+        self.manifest = IngestManifest(self._manifest_path(collection))
+        self.lexical = LexicalIndex(self._lexical_path(collection))
+        self.embedding_cache: LRUCache[str, list[float]] = LRUCache(settings.retrieval_cache_size)
+        # The generation lives in the manifest, so cached results are only safe when every
+        # writer shares it: always in embedded mode, in HTTP mode only via INDEX_STATE_DIR.
+        shared_state = not self.registry.remote or bool(settings.index_state_dir)
+        result_entries = settings.retrieval_cache_size if shared_state else 0
+        self.result_cache: LRUCache[tuple, list[dict]] = LRUCache(result_entries)
+
+    @property
+    def embedder(self) -> Callable[[list[str]], Any]:
+        return self.registry.embedder(self.model_name)
+
+    def ingest_files(
+        self,
+        paths: Iterable[Path],
+        chunk_size: int | None = None,
+        chunk_overlap: int | None = None,
+        workers: int | None = None,
+        batch_size: int | None = None,
+        progress: Callable[[IngestProgress], None] | None = None,
+    ) -> int:
+        """Ingest files through a staged pipeline and return the number of chunks added.
+
+        Files whose size/mtime/inode match the manifest are skipped after a stat call.
+        Worker processes read, fingerprint and chunk the rest; fingerprints already in the
+        collection are found with one bulk lookup per group of files. New chunks from many
+        files are embedded together in batches of ``batch_size`` and handed to a writer
+        thread through a bounded queue, so embedding the next batch overlaps the previous
+        add. Manifest entries are recorded only once their chunks have been written, and
+        chunks superseded by a re-ingested file are deleted right after its new chunks land.
+        The writer also appends each batch to the BM25 index used for lexical retrieval.
+        """
+        workers = settings.ingest_workers if workers is None else workers
+        batch_size = batch_size or settings.ingest_batch_size
+        stats = IngestProgress()
+        writes: queue.Queue = queue.Queue(maxsize=2)
+        errors: list[BaseException] = []
+        writer = threading.Thread(target=self._write_batches, args=(writes, errors), daemon=True)
+        writer.start()
+
+        seen: set[str] = set()
+        buffer = _ChunkBuffer()
+        pending = changed_paths(paths, self.manifest.snapshot(), progress=stats)
+        prepared_files = prepare_files(pending, chunk_size, chunk_overlap, workers=workers, progress=stats)
+        try:
+            for group in batched(prepared_files, self._DEDUP_GROUP):
+                if errors:
+                    break
+                existing = self._ingested_fingerprints({p.fingerprint for p in group} - seen)
+                for prepared in group:
+                    chunk_ids = [f"{prepared.fingerprint}:{i}" for i in range(len(prepared.chunks))]
+                    entry = ManifestEntry(
+                        path=prepared.key,
+                        size=prepared.size,
+                        mtime_ns=prepared.mtime_ns,
+                        inode=prepared.inode,
+                        sha256=prepared.fingerprint,
+                        chunk_ids=chunk_ids,
+                    )
+                    if prepared.fingerprint in seen or prepared.fingerprint in existing:
+                        stats.skipped += 1
+                        buffer.track(entry)
+                        continue
+                    seen.add(prepared.fingerprint)
+                    metadata = {"source": str(prepared.path), "fingerprint": prepared.fingerprint}
+                    buffer.add(chunk_ids, prepared.chunks, metadata)
+                    buffer.track(entry)
+                    stats.files += 1
+                    stats.chunks += len(prepared.chunks)
+                    stats.bytes += prepared.size
+                    while len(buffer) >= batch_size:
+                        self._enqueue_batch(writes, buffer.take(batch_size))
+                if progress is not None:
+                    progress(stats)
+            if not errors:
+                self._enqueue_batch(writes, buffer.take(len(buffer)))
+        finally:
+            writes.put(None)
+            writer.join()
+        if errors:
+            raise errors[0]
+        if progress is not None:
+            progress(stats)
+        logger.info(
+            "ingested",
+            extra={"files": stats.files, "skipped": stats.skipped, "chunks": stats.chunks, "seconds": stats.elapsed},
         )
+        return stats.chunks
 
-    def ingest_files(self, paths: Iterable[Path], chunk_size: int = 800, chunk_overlap: int = 80) -> int:
-        added = 0
-        for path in paths:
-            text = path.read_text(encoding="utf-8", errors="ignore")
-            fingerprint = Fingerprinter.sha256(path)
-            metadata = {"source": str(path), "fingerprint": fingerprint}
-            if self._already_ingested(fingerprint):
-                continue
-            chunks = Fingerprinter.chunk_text(text, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-            ids = [f"{fingerprint}:{i}" for i in range(len(chunks))]
-            self.collection.add(documents=chunks, ids=ids, metadatas=[metadata] * len(chunks))
-            added += len(chunks)
-            logger.info("ingested", extra={"file": str(path), "chunks": len(chunks)})
-        return added
-
-    def query(self, text: str, k: int = 4) -> list[dict]:
-        results = self.collection.query(query_texts=[text], n_results=k)
-        docs = []
-        for doc, metadata in zip(results.get("documents", [[]])[0], results.get("metadatas", [[]])[0]):
-            docs.append({"text": doc, "metadata": metadata})
-        return docs
-
-    def _already_ingested(self, fingerprint: str) -> bool:
-        existing = self.collection.get(where={"fingerprint": fingerprint}, limit=1)
-        return bool(existing.get("ids"))
+    def _ingested_fingerprints(self, fingerprints: set[str]) -> set[str]:
+        """Bulk dedup: every ingested file with at least one chunk owns the id ``<sha256>:0``."""
+        if not fingerprints:
+            return set()
+        existing = self.collection.get(ids=[f"{fp}:0" for fp in fingerprints], include=[])
+        return {chunk_id.rsplit(":", 1)[0] for chunk_id in existing.get("ids", [])}
+
+    def _enqueue_batch(self, writes: queue.Queue, batch: _Batch) -> None:
+        if not batch.ids and not batch.entries:
+            return
+        with track("vector", "ingest_embed", chunks=len(batch.ids)):
+            embeddings = self.embedder(batch.documents) if batch.documents else []
+        writes.put((batch, embeddings))
+
+    def _write_batches(self, writes: queue.Queue, errors: list[BaseException]) -> None:
+        while (item := writes.get()) is not None:
+            if errors:
+                continue  # keep draining so the producer never blocks on a dead writer
+            batch, embeddings = item
+            try:
+                with track("vector", "ingest_write", chunks=len(batch.ids)):
+                    if batch.ids:
+                        self.collection.add(
+                            ids=batch.ids, documents=batch.documents, metadatas=batch.metadatas, embeddings=embeddings
+                        )
+                        self.lexical.add(batch.ids, batch.documents)
+                    self._record_entries(batch.entries)
+                    if batch.ids:
+                        self.manifest.bump_generation()
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("batch add failed")
+                errors.append(exc)
+
+    def query(self, text: str, k: int = 4, where: dict | None = None, mode: str | None = None) -> list[dict]:
+        """Search the collection, memoizing results until the collection next changes.
+
+        ``mode`` is ``vector``, ``lexical`` (BM25 only; never loads or calls the embedder)
+        or ``hybrid``, which fuses both rankings; it defaults to ``RETRIEVAL_MODE``.
+        Result keys include the manifest generation, which every write bumps (also from
+        other processes), so stale entries are never served and simply age out of the LRU.
+        In HTTP mode without ``INDEX_STATE_DIR`` the manifest is host-local and results are
+        not cached.
+        """
+        return self.query_many([text], k=k, where=where, mode=mode)[0]
+
+    def query_many(
+        self, texts: list[str], k: int = 4, where: dict | None = None, mode: str | None = None
+    ) -> list[list[dict]]:
+        """Answer several queries with one batched embed and one backend round trip for the misses."""
+        mode = mode or settings.retrieval_mode
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"unknown retrieval mode: {mode}")
+        with track("vector", "query", queries=len(texts), mode=mode):
+            generation = self.manifest.generation()
+            filters = json.dumps(where, sort_keys=True) if where else None
+            results: list[list[dict] | None] = []
+            missing: dict[str, list[int]] = {}
+            for index, text in enumerate(texts):
+                cached = self.result_cache.get((generation, self.collection.name, text, k, filters, mode))
+                results.append([dict(doc) for doc in cached] if cached is not None else None)
+                if cached is None:
+                    missing.setdefault(text, []).append(index)
+            if missing:
+                pending = list(missing)
+                # Fusion needs a deeper candidate list from each ranking than it returns.
+                depth = k if mode != "hybrid" else 2 * k
+                semantic = self._vector_search(pending, depth, where) if mode != "lexical" else {}
+                for text in pending:
+                    if mode == "vector":
+                        docs = semantic[text][:k]
+                    else:
+                        lexical = self._lexical_search(text, depth, where)
+                        docs = lexical[:k] if mode == "lexical" else self._fuse(semantic[text], lexical, k=k)
+                    self.result_cache.put((generation, self.collection.name, text, k, filters, mode), docs)
+                    for index in missing[text]:
+                        results[index] = [dict(doc) for doc in docs]
+            return [docs or [] for docs in results]
+
+    def _vector_search(self, texts: list[str], k: int, where: dict | None) -> dict[str, list[dict]]:
+        embeddings = self._embed_queries(texts)
+        found = self.collection.query(query_embeddings=embeddings, n_results=k, where=where)
+        return {
+            text: [
+                {"id": chunk_id, "text": doc, "metadata": metadata}
+                for chunk_id, doc, metadata in zip(
+                    found.get("ids", [])[row], found.get("documents", [])[row], found.get("metadatas", [])[row]
+                )
+            ]
+            for row, text in enumerate(texts)
+        }
+
+    def _lexical_search(self, text: str, k: int, where: dict | None) -> list[dict]:
+        """BM25 hits, hydrated (and filtered by ``where``) from the collection in rank order."""
+        # Over-fetch when filtering, since some hits may not match ``where``.
+        hits = [chunk_id for chunk_id, _score in self.lexical.search(text, k if where is None else 4 * k)]
+        if not hits:
+            return []
+        found = self.collection.get(ids=hits, where=where, include=["documents", "metadatas"])
+        rows = zip(found.get("ids", []), found.get("documents", []), found.get("metadatas", []))
+        by_id = {chunk_id: {"id": chunk_id, "text": doc, "metadata": metadata} for chunk_id, doc, metadata in rows}
+        return [by_id[chunk_id] for chunk_id in hits if chunk_id in by_id][:k]
+
+    def _fuse(self, *rankings: list[dict], k: int) -> list[dict]:
+        """Reciprocal rank fusion: rank-based, so BM25 and cosine scores need no calibration."""
+        scores: dict[str, float] = {}
+        docs: dict[str, dict] = {}
+        for ranking in rankings:
+            for rank, doc in enumerate(ranking):
+                scores[doc["id"]] = scores.get(doc["id"], 0.0) + 1.0 / (self._RRF_K + rank + 1)
+                docs.setdefault(doc["id"], doc)
+        return [docs[chunk_id] for chunk_id in sorted(scores, key=scores.__getitem__, reverse=True)[:k]]
+
+    def _embed_queries(self, texts: list[str]) -> list[list[float]]:
+        embeddings: dict[str, list[float]] = {}
+        pending = []
+        for text in texts:
+            cached = self.embedding_cache.get(text)
+            if cached is None:
+                pending.append(text)
+            else:
+                embeddings[text] = cached
+        if pending:
+            with track("vector", "embed_queries", queries=len(pending)):
+                vectors = self.embedder(pending)
+            for text, vector in zip(pending, vectors):
+                embeddings[text] = [float(x) for x in vector]
+                self.embedding_cache.put(text, embeddings[text])
+        return [embeddings[text] for text in texts]
+
+    def _record_entries(self, entries: list[ManifestEntry]) -> None:
+        """Record entries, then drop chunks of previous versions no other file still owns.
+
+        New chunks are already in the collection at this point, so a re-ingested file is
+        never missing from search results; it is briefly present in both versions instead.
+        """
+        previous: dict[str, list[str]] = {}
+        for entry in entries:
+            old = self.manifest.get(entry.path)
+            if old is not None and old.sha256 != entry.sha256:
+                previous[old.sha256] = old.chunk_ids
+        self.manifest.record_many(entries)
+        stale_shas = set(previous) - self.manifest.referenced(previous)
+        stale_ids = [chunk_id for sha in stale_shas for chunk_id in previous[sha]]
+        if self._delete_ids(stale_ids):
+            self.manifest.bump_generation()
+
+    def gc(self, root: str | Path | None = None) -> GcReport:
+        """Delete chunks of removed or superseded files without dropping the collection.
+
+        Files gone from disk (or, under ``root``, no longer matched by the walk) are
+        removed from the manifest along with chunks no surviving file shares; then the
+        collection is scanned for chunks the manifest does not account for.
+        """
+        report = GcReport()
+        live = {manifest_key(path) for path in iter_paths(root)} if root is not None else None
+        stale = self.manifest.stale(live=live, root=root)
+        self.manifest.remove(entry.path for entry in stale)
+        report.files_removed = len(stale)
+        kept = self.manifest.referenced(entry.sha256 for entry in stale)
+        doomed = [chunk_id for entry in stale if entry.sha256 not in kept for chunk_id in entry.chunk_ids]
+        report.chunks_deleted += self._delete_ids(doomed)
+
+        orphans = orphaned_chunk_ids(self._iter_chunks(), list(self.manifest.entries()))
+        report.chunks_deleted += self._delete_ids(orphans)
+        if report.chunks_deleted:
+            self.manifest.bump_generation()
+        logger.info("gc finished", extra={"files": report.files_removed, "chunks": report.chunks_deleted})
+        return report
+
+    def rebuild_lexical(self) -> int:
+        """Rebuild the BM25 index from the collection, e.g. for data ingested before it existed."""
+        self.lexical.clear()
+        offset = 0
+        while True:
+            page = self.collection.get(include=["documents"], limit=self._PAGE, offset=offset)
+            ids = page.get("ids", [])
+            if not ids:
+                break
+            self.lexical.add(ids, page.get("documents") or [""] * len(ids))
+            offset += len(ids)
+        self.lexical.optimize()
+        self.manifest.bump_generation()
+        return len(self.lexical)
+
+    def build_index(self, nlist: int | None = None) -> int:
+        """Train an IVF index where the backend supports one; returns the number of lists."""
+        if not hasattr(self.collection, "build_index"):
+            logger.info("backend manages its own index", extra={"backend": settings.vector_backend})
+            return 0
+        lists = self.collection.build_index(nlist=nlist)
+        self.manifest.bump_generation()
+        return lists
+
+    def compact(self) -> int:
+        """Compact the backend (VACUUM for Chroma, rewrite for numpy), the BM25 index and the manifest.
+
+        Returns bytes reclaimed on disk.
+        """
+        before = _directory_size(self.persist_directory)
+        chroma_db = Path(self.persist_directory) / "chroma.sqlite3"
+        if hasattr(self.collection, "compact"):
+            self.collection.compact()
+        elif self.registry.remote:
+            logger.info("skipping Chroma VACUUM: the store is owned by the remote vector service")
+        elif chroma_db.exists():
+            with closing(sqlite3.connect(str(chroma_db))) as conn:
+                conn.execute("VACUUM")
+        self.lexical.optimize()
+        self.manifest.vacuum()
+        reclaimed = max(before - _directory_size(self.persist_directory), 0)
+        logger.info("compacted", extra={"bytes": reclaimed})
+        return reclaimed
+
+    def _iter_chunks(self) -> Iterable[tuple[str, dict | None]]:
+        offset = 0
+        while True:
+            page = self.collection.get(include=["metadatas"], limit=self._PAGE, offset=offset)
+            ids = page.get("ids", [])
+            if not ids:
+                return
+            yield from zip(ids, page.get("metadatas") or [None] * len(ids))
+            offset += len(ids)
+
+    def _delete_ids(self, ids: list[str]) -> int:
+        for batch in batched(ids, self._PAGE):
+            self.collection.delete(ids=batch)
+            self.lexical.delete(batch)
+        return len(ids)
+
+    @property
+    def state_directory(self) -> Path:
+        """Where the manifest and BM25 index live: ``INDEX_STATE_DIR``, else next to the vectors."""
+        return Path(settings.index_state_dir or self.persist_directory)
+
+    def _manifest_path(self, collection: str) -> Path:
+        return self.state_directory / "manifests" / f"{collection}.sqlite"
+
+    def _lexical_path(self, collection: str) -> Path:
+        return self.state_directory / "lexical" / f"{collection}.sqlite"
 
     def cleanup(self, collection: str | None = None) -> None:
         target = collection or self.collection.name
         try:
-            self.client.delete_collection(target)
+            self.registry.drop_collection(self.persist_directory, target)
         except Exception:  # noqa: BLE001
             logger.warning("cleanup failed", exc_info=True)
+        if target == self.collection.name:
+            # Keep this (shared) handle usable for later ingests into a fresh collection.
+            self.collection = self.registry.open_collection(self.persist_directory, target)
+            manifest, lexical = self.manifest, self.lexical
+        else:
+            manifest, lexical = IngestManifest(self._manifest_path(target)), LexicalIndex(self._lexical_path(target))
+        lexical.clear()
+        manifest.clear()
+        manifest.bump_generation()
+
+
+def _directory_size(path: str | Path) -> int:
+    total = 0
+    for dirpath, _dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                continue
+    return total
+
+
+def _size_http_pool(client: Any, size: int) -> None:
+    """Best effort: widen the keep-alive pool of the client's HTTP session.
+
+    Chroma does not expose this, and its session type differs between releases
+    (``requests.Session`` or ``httpx.Client``); unknown layouts keep the defaults.
+    """
+    session = getattr(getattr(client, "_server", None), "_session", None)
+    if session is None or not hasattr(session, "mount"):
+        logger.debug("chroma http session not tunable; keeping default pool size")
+        return
+    from requests.adapters import HTTPAdapter
+
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+
+def _parameter_bytes(embedder: Any) -> int:
+    model = getattr(embedder, "_model", None)
+    if model is None or not hasattr(model, "parameters"):
+        return 0
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+
+        # Peak rather than current RSS; kilobytes on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
 
 
-def iter_paths(root: str | Path, allowed_exts: tuple[str, ...] = (".md", ".txt", ".pdf")) -> list[Path]:
-    root_path = Path(root)
-    results: list[Path] = []
-    for path in root_path.rglob("*"):
-        if path.is_file() and path.suffix.lower() in allowed_exts:
-            results.append(path)
-    return results
+vector_registry = VectorRegistry()